@@ -2,18 +2,55 @@
 
 from __future__ import annotations
 
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
-from typing import Iterable
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
 
+import numpy as np
 import pandas as pd
 
 
+logger = logging.getLogger(__name__)
+
+# Called with (fraction done in [0, 1], short stage label) during slow loads.
+ProgressCallback = Callable[[float, str], None]
+
 _REQUIRED_COLUMNS = ["wind", "solar", "hydro", "price", "load"]
+_FLOAT_COLUMNS = ("wind", "solar", "hydro", "price", "load", "risk", "revenue", "battery_energy", "npv")
+_TIME_COLUMNS = ("timestamp", "date", "time")
+_KNOWN_COLUMNS = (*_TIME_COLUMNS, *_FLOAT_COLUMNS, "scenario", "profit_label")
+# Columns whose maxima decide between capacity-factor and MW units.
+_UNIT_COLUMNS = ("wind", "solar", "hydro", "load")
+# Dropped by compact loads unless a consumer asks for them explicitly.
+_AUXILIARY_COLUMNS = ("revenue", "npv", "risk", "profit_label")
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_DATE_FORMAT = "%Y-%m-%d"
+
+# Bump whenever the on-disk cache layout or the parsing rules change so stale
+# sidecars are rebuilt instead of being trusted.
+_CACHE_VERSION = 6
+_MANIFEST_NAME = "manifest.json"
+_PARTITION_COLUMN = "scenario"
+_HASH_CHUNK_BYTES = 1 << 20
+_MAX_LISTED_GAPS = 100
 
 
 def _is_capacity_factor_data(df: pd.DataFrame) -> bool:
-    for column in ("wind", "solar", "hydro", "load"):
-        if column in df.columns and df[column].max() > 2.0:
+    return _capacity_factor_from_maxima({column: df[column].max() for column in _UNIT_COLUMNS if column in df.columns})
+
+
+def _capacity_factor_from_maxima(maxima: Dict[str, Any]) -> bool:
+    """Capacity-factor data stays within [0, ~1]; MW columns exceed 2."""
+    for column in _UNIT_COLUMNS:
+        if column in maxima and maxima[column] is not None and maxima[column] > 2.0:
             return False
     return True
 
@@ -32,41 +69,755 @@ def _convert_to_raw_mw(df: pd.DataFrame) -> pd.DataFrame:
     return result
 
 
-def load_energy_dataframe(path: Path, convert_to_raw_units: bool = True) -> pd.DataFrame:
-    """Load the energy CSV used by the environment without importing training CLI modules."""
-    if not path.is_file():
-        raise FileNotFoundError(f"Data file not found: {path}")
+# ------------------------------------------------------------------
+# Binary column cache
+# ------------------------------------------------------------------
+def cache_dir_for(path: Path) -> Path:
+    """Return the sidecar directory holding the column cache for ``path``."""
+    return path.with_name(f".{path.name}.cache")
+
+
+def content_hash(path: Path) -> str:
+    """Hash the file contents in fixed-size chunks (BLAKE2b, 128-bit digest)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(cache_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with (cache_dir / _MANIFEST_NAME).open("r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != _CACHE_VERSION:
+        return None
+    return manifest
+
+
+def _write_manifest(cache_dir: Path, manifest: Dict[str, Any]) -> None:
+    tmp = cache_dir / f".{_MANIFEST_NAME}.{uuid4().hex}"
+    with tmp.open("w", encoding="utf-8") as handle:
+        json.dump(manifest, handle)
+    os.replace(tmp, cache_dir / _MANIFEST_NAME)
+
+
+def _validate_cache(path: Path, cache_dir: Path) -> Optional[Dict[str, Any]]:
+    """Return the manifest if the sidecar still describes ``path``.
+
+    Size and mtime are checked first; the content hash is only recomputed when
+    the mtime moved (e.g. after a ``touch`` or a copy) so a warm open does not
+    have to read the CSV at all.
+    """
+    manifest = _read_manifest(cache_dir)
+    if manifest is None:
+        return None
+    source = manifest.get("source", {})
+    stat = path.stat()
+    if source.get("path") != str(path) or source.get("size") != stat.st_size:
+        return None
+    if source.get("mtime_ns") == stat.st_mtime_ns:
+        return manifest
+    if source.get("sha") != content_hash(path):
+        return None
+    source["mtime_ns"] = stat.st_mtime_ns
+    try:
+        _write_manifest(cache_dir, manifest)
+    except OSError:
+        pass
+    return manifest
+
+
+def dataset_fingerprint(path: Path) -> str:
+    """Return the content hash identifying ``path``.
+
+    Reuses the hash recorded in a valid sidecar manifest so fingerprinting a
+    cached dataset costs a ``stat`` call rather than a full read.
+    """
+    manifest = _validate_cache(path, cache_dir_for(path))
+    if manifest is not None:
+        return str(manifest["source"]["sha"])
+    return content_hash(path)
+
+
+def _build_partition_index(df: pd.DataFrame) -> Dict[str, List[List[int]]]:
+    """Map each ``scenario`` value to the ``[start, stop)`` row ranges it covers.
+
+    Scenarios are normally stored back to back, giving one range each; values
+    that reappear later in the file simply get several ranges.
+    """
+    if _PARTITION_COLUMN not in df.columns or len(df) == 0:
+        return {}
+    codes, uniques = pd.factorize(df[_PARTITION_COLUMN], use_na_sentinel=True)
+    starts = np.flatnonzero(np.diff(codes, prepend=codes[0] - 1))
+    stops = np.append(starts[1:], len(codes))
+    index: Dict[str, List[List[int]]] = {}
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        code = int(codes[start])
+        if code < 0:
+            continue
+        index.setdefault(str(uniques[code]), []).append([start, stop])
+    return index
+
+
+def partition_index(path: Path) -> Dict[str, List[List[int]]]:
+    """Return the scenario partition index of ``path`` (built once per file)."""
+    manifest = _validate_cache(path, cache_dir_for(path))
+    if manifest is None:
+        load_energy_dataframe(path, convert_to_raw_units=False, mmap=True)
+        manifest = _validate_cache(path, cache_dir_for(path))
+    if manifest is None:
+        # No writable cache: derive the index from a direct parse.
+        return _build_partition_index(read_energy_csv(path, ())[0])
+    return manifest.get("partitions", {})
+
+
+@dataclass
+class DatasetProfile:
+    """Facts about a dataset, computed once at ingest and kept in the cache manifest."""
+
+    rows: int
+    # Most common spacing between consecutive timestamps of one scenario.
+    step_seconds: Optional[float]
+    # Steps longer than ``step_seconds``; ``gaps`` lists the first few as
+    # ``[row, seconds since the previous row]``.
+    gap_count: int
+    gaps: List[List[int]]
+    duplicate_timestamps: int
+    out_of_order: int
+    # Per numeric column: ``min``, ``max`` and ``sum`` of the raw values.
+    columns: Dict[str, Dict[str, float]]
+    # "capacity_factor" (values in [0, 1]) or "mw".
+    unit: str
+
+    @property
+    def step_hours(self) -> Optional[float]:
+        return None if self.step_seconds is None else self.step_seconds / 3600.0
+
+    @property
+    def capacity_factor(self) -> bool:
+        return self.unit == "capacity_factor"
+
+
+def _build_profile(df: pd.DataFrame) -> DatasetProfile:
+    columns: Dict[str, Dict[str, float]] = {}
+    for name in df.columns:
+        if name in _FLOAT_COLUMNS:
+            values = df[name].to_numpy(dtype=np.float64)
+            finite = values[np.isfinite(values)]
+            columns[name] = {
+                "min": float(finite.min()) if finite.size else None,
+                "max": float(finite.max()) if finite.size else None,
+                "sum": float(finite.sum()),
+            }
+    unit = "capacity_factor" if _capacity_factor_from_maxima({k: v["max"] for k, v in columns.items()}) else "mw"
+
+    step_seconds: Optional[float] = None
+    gaps: List[List[int]] = []
+    gap_count = duplicates = out_of_order = 0
+    if "timestamp" in df.columns and pd.api.types.is_datetime64_any_dtype(df["timestamp"]) and len(df) > 1:
+        stamps = df["timestamp"].to_numpy().astype("datetime64[s]")
+        diffs = np.diff(stamps.astype(np.int64))
+        # Timestamps restart at scenario boundaries; those are not gaps.
+        within = ~np.isnat(stamps[1:]) & ~np.isnat(stamps[:-1])
+        if _PARTITION_COLUMN in df.columns:
+            codes, _ = pd.factorize(df[_PARTITION_COLUMN], use_na_sentinel=True)
+            within &= codes[1:] == codes[:-1]
+        diffs = diffs[within]
+        rows = np.flatnonzero(within) + 1
+        positive = diffs[diffs > 0]
+        if positive.size:
+            values, counts = np.unique(positive, return_counts=True)
+            step_seconds = float(values[np.argmax(counts)])
+            gap_mask = diffs > step_seconds
+            gap_count = int(gap_mask.sum())
+            gaps = [[int(row), int(seconds)] for row, seconds in zip(rows[gap_mask][:_MAX_LISTED_GAPS], diffs[gap_mask][:_MAX_LISTED_GAPS])]
+        duplicates = int((diffs == 0).sum())
+        out_of_order = int((diffs < 0).sum())
+
+    return DatasetProfile(
+        rows=int(len(df)),
+        step_seconds=step_seconds,
+        gap_count=gap_count,
+        gaps=gaps,
+        duplicate_timestamps=duplicates,
+        out_of_order=out_of_order,
+        columns=columns,
+        unit=unit,
+    )
+
+
+def _build_partition_profiles(
+    df: pd.DataFrame, partitions: Dict[str, List[List[int]]], unit: str
+) -> Dict[str, DatasetProfile]:
+    """Profile of each partition's rows.
+
+    ``unit`` stays the file's, which decides the conversion of every partition.
+    """
+    return {
+        name: replace(_build_profile(df.iloc[np.concatenate([np.arange(start, stop) for start, stop in ranges])]), unit=unit)
+        for name, ranges in partitions.items()
+    }
+
+
+def dataset_profile(path: Path, scenario_key: Optional[str] = None) -> DatasetProfile:
+    """Return the profile of ``path`` (computed once and read from the cache).
+
+    With ``scenario_key`` the profile describes that partition's rows only;
+    partition profiles are computed at ingest next to the file's.
+    """
+    manifest = _validate_cache(path, cache_dir_for(path))
+    if manifest is None:
+        load_energy_dataframe(path, convert_to_raw_units=False, mmap=True)
+        manifest = _validate_cache(path, cache_dir_for(path))
+    if manifest is None:
+        df = read_energy_csv(path, ())[0]
+        profile = _build_profile(df)
+        if scenario_key is None:
+            return profile
+        ranges = _partition_ranges({"partitions": _build_partition_index(df)}, scenario_key)
+        return _build_partition_profiles(df, {scenario_key: ranges}, profile.unit)[scenario_key]
+    if scenario_key is None:
+        return DatasetProfile(**manifest["profile"])
+    _partition_ranges(manifest, scenario_key)  # unknown keys are a caller error
+    return DatasetProfile(**manifest["partition_profiles"][scenario_key])
+
+
+def _write_cache(
+    path: Path,
+    df: pd.DataFrame,
+    stat: os.stat_result,
+    digest: str,
+    stats: Optional["IngestStats"] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> None:
+    """Persist ``df`` column by column as ``.npy`` files next to the source.
+
+    The cache is written into a private temporary directory and renamed into
+    place so concurrent workers never observe a half-written sidecar.
+    """
+    cache_dir = cache_dir_for(path)
+    tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp-{uuid4().hex}")
+    tmp_dir.mkdir(parents=True)
+    try:
+        columns = []
+        for index, name in enumerate(df.columns):
+            if progress is not None:
+                progress(0.7 + 0.3 * index / max(1, len(df.columns)), "writing column cache")
+            series = df[name]
+            entry: Dict[str, Any] = {"name": name, "file": f"c{index}.npy", "dtype": str(series.dtype)}
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+                values = series.to_numpy()
+                np.save(tmp_dir / entry["file"], values, allow_pickle=False)
+                entry["kind"] = "array"
+                if values.dtype == np.float64:
+                    entry["f32_error"] = _float32_error(values)
+            else:
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+                np.save(tmp_dir / entry["file"], codes.astype(np.int32), allow_pickle=False)
+                entry["kind"] = "codes"
+                entry["categories"] = [str(value) for value in uniques]
+            columns.append(entry)
+
+        partitions = _build_partition_index(df)
+        profile = _build_profile(df)
+        _write_manifest(
+            tmp_dir,
+            {
+                "version": _CACHE_VERSION,
+                "source": {
+                    "path": str(path),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha": digest,
+                },
+                "rows": int(len(df)),
+                "columns": columns,
+                "partitions": partitions,
+                "profile": asdict(profile),
+                "partition_profiles": {
+                    name: asdict(value) for name, value in _build_partition_profiles(df, partitions, profile.unit).items()
+                },
+                "ingest": asdict(stats) if stats is not None else None,
+            },
+        )
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.rename(tmp_dir, cache_dir)
+    finally:
+        # Either the rename succeeded or another worker won the race; in both
+        # cases the temporary directory is no longer needed.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _float32_error(values: np.ndarray) -> float:
+    """Largest float32 rounding error of ``values`` relative to their magnitude."""
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return 0.0
+    scale = float(np.max(np.abs(finite)))
+    if scale == 0.0:
+        return 0.0
+    with np.errstate(over="ignore"):
+        rounded = finite.astype(np.float32).astype(np.float64)
+    return float(np.max(np.abs(rounded - finite)) / scale)
+
+
+def _compact_columns(names: Iterable[str], columns: Optional[Iterable[str]]) -> List[str]:
+    """Columns kept by a compact load: the usual projection minus auxiliaries."""
+    requested = set(columns or ())
+    return [
+        name
+        for name in _ingest_columns(names, columns)
+        if name not in ("date", "time") and (name not in _AUXILIARY_COLUMNS or name in requested)
+    ]
+
+
+def _epoch_seconds(values: np.ndarray) -> np.ndarray:
+    return np.asarray(values).astype("datetime64[s]").astype(np.int64)
+
+
+def _downcast_int(values: np.ndarray) -> np.ndarray:
+    return pd.to_numeric(pd.Series(values, copy=False), downcast="integer").to_numpy()
+
+
+def _default_nbytes(df: pd.DataFrame, extra_columns: int = 0) -> int:
+    """Approximate size of ``df`` as a default (non-compact) load would hold it.
+
+    Every numeric and timestamp column takes 8 bytes per row; categoricals
+    are costed as Arrow-style strings (payload plus an 8-byte offset per row).
+    ``extra_columns`` accounts for 8-byte columns the compact load dropped.
+    """
+    rows = len(df)
+    total = extra_columns * rows * 8
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            lengths = np.array([len(str(label).encode()) for label in series.cat.categories], dtype=np.int64)
+            counts = np.bincount(codes[codes >= 0], minlength=len(lengths))
+            total += int(counts @ lengths) + rows * 8
+        else:
+            total += rows * 8
+    return total
+
 
-    df = pd.read_csv(path)
+def _float32_file(cache_dir: Path, entry: Dict[str, Any]) -> Path:
+    """Return the float32 twin of a float64 column, deriving it on first use.
 
+    The twin lives inside the sidecar directory, so it is discarded together
+    with the float64 columns whenever the source CSV changes.
+    """
+    target = cache_dir / entry["file"].replace(".npy", ".f32.npy")
+    if not target.exists():
+        source = np.load(cache_dir / entry["file"], mmap_mode="r", allow_pickle=False)
+        tmp = cache_dir / f".{target.name}.{uuid4().hex}"
+        with tmp.open("wb") as handle:
+            np.save(handle, np.asarray(source, dtype=np.float32), allow_pickle=False)
+        os.replace(tmp, target)
+    return target
+
+
+def _partition_ranges(manifest: Dict[str, Any], scenario_key: str) -> List[List[int]]:
+    partitions = manifest.get("partitions", {})
+    if scenario_key not in partitions:
+        names = sorted(partitions)
+        available = ", ".join(names[:5]) or "none"
+        if len(names) > 5:
+            available += ", ..."
+        raise ValueError(f"Unknown scenario_key {scenario_key!r} (available: {available})")
+    return partitions[scenario_key]
+
+
+def _take_ranges(values: np.ndarray, ranges: Optional[List[List[int]]]) -> np.ndarray:
+    if ranges is None:
+        return values
+    if len(ranges) == 1:
+        # A single contiguous partition stays a (memory-mapped) view.
+        start, stop = ranges[0]
+        return values[start:stop]
+    return np.concatenate([values[start:stop] for start, stop in ranges])
+
+
+def _read_cache(
+    cache_dir: Path,
+    manifest: Dict[str, Any],
+    mmap: bool = False,
+    float32: bool = False,
+    scenario_key: Optional[str] = None,
+    columns: Optional[Iterable[str]] = None,
+    compact: bool = False,
+    float32_budget: float = 0.0,
+) -> pd.DataFrame:
+    data: Dict[str, Any] = {}
+    names = [entry["name"] for entry in manifest["columns"]]
+    keep = set(_compact_columns(names, columns) if compact else _ingest_columns(names, columns))
+    mmap_mode = "r" if mmap else None
+    ranges = _partition_ranges(manifest, scenario_key) if scenario_key is not None else None
+    if ranges is not None and mmap_mode is None:
+        # Map first so only the partition's rows are read from disk.
+        mmap_mode = "r"
+    for entry in manifest["columns"]:
+        if entry["name"] not in keep:
+            continue
+        file = cache_dir / entry["file"]
+        if entry["kind"] == "array" and entry["dtype"] == "float64":
+            within_budget = compact and entry.get("f32_error", np.inf) <= float32_budget
+            if float32 or within_budget:
+                file = _float32_file(cache_dir, entry)
+        values = _take_ranges(np.load(file, mmap_mode=mmap_mode, allow_pickle=False), ranges)
+        if ranges is not None and not mmap:
+            values = np.array(values)
+        if compact and entry["kind"] == "codes":
+            data[entry["name"]] = pd.Categorical.from_codes(values, categories=entry["categories"])
+        elif compact and entry["dtype"].startswith("datetime64"):
+            data[entry["name"]] = _epoch_seconds(values)
+        elif compact and entry["dtype"].startswith("int"):
+            data[entry["name"]] = _downcast_int(values)
+        elif entry["kind"] == "codes":
+            labels = np.asarray(entry["categories"] + [None], dtype=object)
+            data[entry["name"]] = pd.Series(labels.take(values), dtype=entry["dtype"])
+        else:
+            data[entry["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+# ------------------------------------------------------------------
+# CSV ingest
+# ------------------------------------------------------------------
+@dataclass
+class IngestStats:
+    """Measurements taken while parsing a CSV into a DataFrame."""
+
+    engine: str
+    rows: int
+    seconds: float
+    frame_bytes: int
+    # Growth of the resident set above its level before the ingest; ``None``
+    # when the platform offers no way to reset the high-water mark.
+    peak_bytes: Optional[int] = None
+
+
+def _csv_engine() -> str:
+    """Prefer the multithreaded pyarrow parser when it is installed."""
+    try:
+        import pyarrow  # noqa: F401  # pylint: disable=unused-import
+    except ImportError:
+        return "c"
+    return "pyarrow"
+
+
+def _proc_status_bytes(field_name: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith(field_name + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def _reset_peak_rss() -> Optional[int]:
+    """Reset the kernel's RSS high-water mark and return the current RSS.
+
+    Linux only (``/proc/self/clear_refs``); returns ``None`` elsewhere.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as handle:
+            handle.write("5")
+    except OSError:
+        return None
+    return _proc_status_bytes("VmRSS")
+
+
+def _ingest_columns(header: Iterable[str], columns: Optional[Iterable[str]]) -> List[str]:
+    """Return the CSV columns to read, in file order."""
+    if columns is None:
+        wanted = set(_KNOWN_COLUMNS)
+    else:
+        wanted = set(_TIME_COLUMNS) | set(_REQUIRED_COLUMNS) | {_PARTITION_COLUMN} | set(columns)
+    return [name for name in header if name in wanted]
+
+
+def _parse_timestamps(values: pd.Series, fmt: str) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    if parsed.isna().sum() > values.isna().sum():
+        # The file does not follow the expected layout; let pandas infer it.
+        parsed = pd.to_datetime(values, errors="coerce")
+    return parsed
+
+
+def _combine_date_time(date: pd.Series, time: pd.Series) -> pd.Series:
+    """Add a parsed ``time`` offset to a parsed ``date`` without string concatenation."""
+    days = _parse_timestamps(date, _DATE_FORMAT)
+    offsets = pd.to_timedelta(time.astype(str), errors="coerce")
+    combined = days + offsets
+    if combined.isna().sum() > (date.isna() | time.isna()).sum():
+        combined = pd.to_datetime(date.astype(str) + " " + time.astype(str), errors="coerce")
+    return combined
+
+
+def _finish_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Parse timestamps, drop incomplete rows and restore string scenarios."""
     if "timestamp" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+        df["timestamp"] = _parse_timestamps(df["timestamp"], _TIMESTAMP_FORMAT)
     elif {"date", "time"}.issubset(df.columns):
-        df["timestamp"] = pd.to_datetime(df["date"].astype(str) + " " + df["time"].astype(str), errors="coerce")
+        df["timestamp"] = _combine_date_time(df["date"], df["time"])
+
+    df = df.dropna(subset=_REQUIRED_COLUMNS).reset_index(drop=True)
+    if _PARTITION_COLUMN in df.columns:
+        # Categorical only to keep ingest lean; callers still see strings.
+        df[_PARTITION_COLUMN] = df[_PARTITION_COLUMN].astype(str)
+    return df
+
 
-    missing = [col for col in _REQUIRED_COLUMNS if col not in df.columns]
+def read_energy_rows(data: bytes, header: Iterable[str]) -> pd.DataFrame:
+    """Parse headerless CSV rows (e.g. lines appended to a dataset) like ``read_energy_csv``.
+
+    ``header`` is the column list of the file the rows belong to; a copy of
+    the header line at the start of ``data`` is skipped.
+    """
+    names = list(header)
+    missing = [col for col in _REQUIRED_COLUMNS if col not in names]
     if missing:
         raise ValueError(f"Missing required columns: {missing}")
+    if data.startswith(",".join(names).encode()):
+        data = data.split(b"\n", 1)[1] if b"\n" in data else b""
+    usecols = _ingest_columns(names, None)
+    if not data.strip():
+        return _finish_frame(pd.DataFrame({name: pd.Series(dtype="float64" if name in _FLOAT_COLUMNS else object) for name in usecols}))
+    float_columns = [name for name in usecols if name in _FLOAT_COLUMNS]
+    engine = _csv_engine()  # same float parser as the initial ingest
+    # Appended chunks are small, so parse every column and project afterwards
+    # (pyarrow rejects ``usecols`` together with ``header=None``).
+    try:
+        df = pd.read_csv(
+            io.BytesIO(data),
+            header=None,
+            names=names,
+            dtype={name: "float64" for name in float_columns},
+            engine=engine,
+        )
+    except (ValueError, TypeError):
+        df = pd.read_csv(io.BytesIO(data), header=None, names=names, engine=engine)
+        for column in float_columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    return _finish_frame(df[usecols])
 
-    numeric_candidates = [
-        "wind",
-        "solar",
-        "hydro",
-        "price",
-        "load",
-        "risk",
-        "revenue",
-        "battery_energy",
-        "npv",
-    ]
 
-    for column in numeric_candidates:
-        if column in df.columns:
+def read_energy_csv(
+    path: Path,
+    columns: Optional[Iterable[str]] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> Tuple[pd.DataFrame, IngestStats]:
+    """Parse the energy CSV with a projection and pinned dtypes.
+
+    Only known columns (or the required ones plus ``columns``) are read.
+    Numeric columns are parsed straight to float64 by the CSV engine, falling
+    back to per-column coercion only when a file contains non-numeric junk.
+    """
+    started = time.perf_counter()
+    rss_before = _reset_peak_rss()
+    if progress is not None:
+        progress(0.0, "reading header")
+
+    header = pd.read_csv(path, nrows=0).columns
+    missing = [col for col in _REQUIRED_COLUMNS if col not in header]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    usecols = _ingest_columns(header, columns)
+    float_columns = [name for name in usecols if name in _FLOAT_COLUMNS]
+    dtype: Dict[str, Any] = {name: "float64" for name in float_columns}
+    if _PARTITION_COLUMN in usecols:
+        dtype[_PARTITION_COLUMN] = "category"
+    engine = _csv_engine()
+    if progress is not None:
+        progress(0.05, f"parsing CSV ({engine} engine)")
+
+    try:
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype, engine=engine)
+    except (ValueError, TypeError):
+        dtype = {name: kind for name, kind in dtype.items() if name not in float_columns}
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype, engine=engine)
+        for column in float_columns:
             df[column] = pd.to_numeric(df[column], errors="coerce")
 
-    df = df.dropna(subset=_REQUIRED_COLUMNS).reset_index(drop=True)
+    if progress is not None:
+        progress(0.6, "parsing timestamps")
+    df = _finish_frame(df)
+
+    peak_bytes = None
+    if rss_before is not None:
+        peak = _proc_status_bytes("VmHWM")
+        peak_bytes = None if peak is None else max(0, peak - rss_before)
+    stats = IngestStats(
+        engine=engine,
+        rows=int(len(df)),
+        seconds=time.perf_counter() - started,
+        frame_bytes=int(df.memory_usage(deep=True).sum()),
+        peak_bytes=peak_bytes,
+    )
+    logger.info(
+        "Ingested %s: %d rows in %.2fs (engine=%s, frame %.1f MB, peak +%s)",
+        path,
+        stats.rows,
+        stats.seconds,
+        stats.engine,
+        stats.frame_bytes / 1e6,
+        "n/a" if peak_bytes is None else f"{peak_bytes / 1e6:.1f} MB",
+    )
+    return df, stats
+
+
+# ------------------------------------------------------------------
+# Public loader
+# ------------------------------------------------------------------
+def _project(df: pd.DataFrame, columns: Optional[Iterable[str]]) -> pd.DataFrame:
+    if columns is None:
+        return df
+    keep = _ingest_columns(df.columns, columns)
+    return df[keep] if len(keep) != len(df.columns) else df
+
+
+def _compact_frame(df: pd.DataFrame, columns: Optional[Iterable[str]], float32_budget: float) -> pd.DataFrame:
+    """In-memory counterpart of a compact cache read."""
+    data: Dict[str, Any] = {}
+    for name in _compact_columns(df.columns, columns):
+        series = df[name]
+        if name == _PARTITION_COLUMN or not (
+            pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)
+        ):
+            data[name] = series.astype("category")
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            data[name] = _epoch_seconds(series.to_numpy())
+        elif series.dtype == np.float64 and _float32_error(series.to_numpy()) <= float32_budget:
+            data[name] = series.to_numpy().astype(np.float32)
+        elif pd.api.types.is_integer_dtype(series):
+            data[name] = _downcast_int(series.to_numpy())
+        else:
+            data[name] = series
+    return pd.DataFrame(data, copy=False)
+
+
+def load_energy_dataframe(
+    path: Path,
+    convert_to_raw_units: bool = True,
+    use_cache: bool = True,
+    mmap: bool = False,
+    float32: bool = False,
+    scenario_key: Optional[str] = None,
+    columns: Optional[Iterable[str]] = None,
+    compact: bool = False,
+    float32_budget: float = 1e-6,
+    progress: Optional[ProgressCallback] = None,
+) -> pd.DataFrame:
+    """Load the energy CSV used by the environment without importing training CLI modules.
+
+    Parsed columns are kept in a binary sidecar (``.<name>.cache/``) keyed by
+    the source path, size, mtime and content hash, so repeated loads of an
+    unchanged file skip CSV parsing entirely. Pass ``use_cache=False`` to
+    always parse the CSV.
+
+    With ``mmap=True`` the columns are memory-mapped read-only from the
+    sidecar, so every process mapping the same dataset shares one copy in the
+    OS page cache. ``float32=True`` serves float64 columns from float32 twins
+    at half the footprint. Both options require the cache; if it cannot be
+    written they fall back to an in-memory frame (converted to float32 when
+    requested). Unit conversion of capacity-factor data always materialises
+    private copies of the converted columns.
+
+    ``scenario_key`` restricts the result to one value of the ``scenario``
+    column. The cache stores a partition index (scenario -> row ranges), so
+    only that partition's rows are materialised.
+
+    ``columns`` names the optional columns a consumer needs; the timestamp,
+    ``scenario`` and required columns are always included. Without it every
+    known column is returned. Columns the loader does not know are not read.
+
+    ``compact=True`` trades convenience for memory: ``scenario`` becomes a
+    categorical, ``timestamp`` holds int64 epoch seconds (``date``/``time``
+    are dropped), float64 columns whose float32 rounding error relative to
+    the column's magnitude stays within ``float32_budget`` are stored as
+    float32, integer columns are downcast, and the auxiliary ``revenue``,
+    ``npv``, ``risk`` and ``profit_label`` columns are dropped unless listed
+    in ``columns``. The bytes saved are logged.
+
+    ``progress`` is called with ``(fraction, stage)`` while a CSV is parsed
+    and its cache written; warm loads report nothing.
+    """
+    if not path.is_file():
+        raise FileNotFoundError(f"Data file not found: {path}")
+
+    df: Optional[pd.DataFrame] = None
+    parsed: Optional[pd.DataFrame] = None
+    capacity_factor: Optional[bool] = None
+    if use_cache:
+        cache_dir = cache_dir_for(path)
+        manifest = _validate_cache(path, cache_dir)
+        if manifest is None:
+            stat = path.stat()
+            parsed, stats = read_energy_csv(path, progress=progress)
+            try:
+                _write_cache(path, parsed, stat, content_hash(path), stats, progress=progress)
+                manifest = _read_manifest(cache_dir)
+            except OSError:
+                # Read-only data directories simply run without a cache.
+                manifest = None
+        if manifest is not None:
+            if scenario_key is not None:
+                _partition_ranges(manifest, scenario_key)  # unknown keys are a caller error
+            try:
+                df = _read_cache(
+                    cache_dir,
+                    manifest,
+                    mmap=mmap,
+                    float32=float32,
+                    scenario_key=scenario_key,
+                    columns=columns,
+                    compact=compact,
+                    float32_budget=float32_budget,
+                )
+                if compact:
+                    dropped = len(_ingest_columns([e["name"] for e in manifest["columns"]], None)) - len(df.columns)
+                    default_bytes = _default_nbytes(df, extra_columns=dropped)
+                capacity_factor = manifest["profile"]["unit"] == "capacity_factor"
+            except (OSError, ValueError, KeyError):
+                df = None
+
+    if df is None:
+        if parsed is None:
+            parsed, _ = read_energy_csv(path, columns, progress=progress)
+        df = _project(parsed, columns)
+        if scenario_key is not None:
+            ranges = _partition_ranges({"partitions": _build_partition_index(df)}, scenario_key)
+            df = df.iloc[np.concatenate([np.arange(start, stop) for start, stop in ranges])].reset_index(drop=True)
+        if compact:
+            default_bytes = int(df.memory_usage(deep=True, index=False).sum())
+            df = _compact_frame(df, columns, float32_budget)
+        elif float32:
+            floats = df.select_dtypes(include="float64").columns
+            df = df.astype({column: np.float32 for column in floats})
+
+    if compact:
+        compact_bytes = int(df.memory_usage(deep=True, index=False).sum())
+        logger.info(
+            "Compact load of %s%s: %.1f MB -> %.1f MB (saved %.1f MB)",
+            path,
+            f" [{scenario_key}]" if scenario_key else "",
+            default_bytes / 1e6,
+            compact_bytes / 1e6,
+            (default_bytes - compact_bytes) / 1e6,
+        )
 
-    if convert_to_raw_units and _is_capacity_factor_data(df):
-        df = _convert_to_raw_mw(df)
+    if convert_to_raw_units:
+        if capacity_factor is None:
+            capacity_factor = _is_capacity_factor_data(df)
+        if capacity_factor:
+            df = _convert_to_raw_mw(df)
 
     return df
@@ -0,0 +1,206 @@
+"""Reference-counted registry of read-only datasets shared between sessions."""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import DatasetProfile, cache_dir_for, dataset_fingerprint, dataset_profile, load_energy_dataframe
+from .live import LiveDataset
+from .pyramid import PyramidHolder, TimePyramid
+
+DatasetKey = Tuple[str, bool, bool, Optional[str]]
+
+
+@dataclass
+class SharedDataset:
+    """A loaded dataset whose column arrays are immutable and shared."""
+
+    key: DatasetKey
+    path: Path
+    frame: pd.DataFrame
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)
+    refcount: int = 0
+    pyramids: Optional[PyramidHolder] = None
+    live: Optional[LiveDataset] = None
+    profile: Optional[DatasetProfile] = None
+
+    @property
+    def fingerprint(self) -> str:
+        return self.key[0]
+
+    @property
+    def nbytes(self) -> int:
+        columns = self.live.columns if self.live is not None else self.columns
+        return int(sum(values.nbytes for values in columns.values()))
+
+    @property
+    def rows(self) -> int:
+        return self.live.rows if self.live is not None else int(len(self.frame))
+
+    def pyramid(self) -> TimePyramid:
+        """Hourly/daily/monthly aggregates, built (or read from disk) on first use."""
+        if self.live is not None:
+            return self.live.pyramid()
+        if self.pyramids is None:
+            self.pyramids = PyramidHolder(self.frame, None, self.profile.step_seconds if self.profile else None)
+        return self.pyramids.get()
+
+
+def _pyramid_cache_file(path: Path, key: DatasetKey) -> Optional[Path]:
+    cache_dir = cache_dir_for(path)
+    if not cache_dir.is_dir():
+        return None
+    tag = hashlib.blake2b(repr(key[1:]).encode(), digest_size=6).hexdigest()
+    return cache_dir / f"pyramid-{tag}.npz"
+
+
+def _freeze_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, np.ndarray]]:
+    """Rebuild ``df`` on top of read-only numpy views of its columns.
+
+    Memory-mapped columns stay mapped; the views only drop write access.
+    Consumers that try to write into a borrowed column get a ``ValueError``
+    (numpy) or a private copy (pandas copy-on-write) instead of mutating the
+    data every other session is reading.
+    """
+    columns: Dict[str, np.ndarray] = {}
+    data: Dict[str, Any] = {}
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, np.dtype):
+            values = series.to_numpy(copy=False).view()
+            values.flags.writeable = False
+            columns[name] = values
+            data[name] = values
+        else:
+            # Extension dtypes (strings, categoricals) stay pandas-managed.
+            data[name] = series
+    return pd.DataFrame(data, copy=False), columns
+
+
+class DatasetRegistry:
+    """Process-wide cache of datasets keyed by content fingerprint.
+
+    ``acquire`` returns the shared entry (loading it on first use) and bumps
+    its reference count; ``release`` drops the count and frees the arrays once
+    the last borrowing session is gone. Columns are memory-mapped from the
+    loader's sidecar cache, so separate worker processes reading the same
+    dataset share its pages through the OS page cache.
+
+    ``live=True`` entries follow the file as it grows (see ``backend.live``);
+    they are keyed by path rather than content, since the content changes.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[DatasetKey, SharedDataset] = {}
+        # Keys being loaded; concurrent acquirers wait on the event.
+        self._loading: Dict[DatasetKey, threading.Event] = {}
+
+    def acquire(
+        self,
+        path: Path,
+        convert_to_raw_units: bool = True,
+        float32: bool = False,
+        scenario_key: Optional[str] = None,
+        live: bool = False,
+    ) -> SharedDataset:
+        """Borrow the dataset, loading it on first use.
+
+        The registry lock only guards the lookup: a cold load runs outside it,
+        so other datasets stay available meanwhile, and concurrent acquirers
+        of the same key wait for that one load instead of repeating it.
+        """
+        if not path.is_file():
+            raise FileNotFoundError(f"Data file not found: {path}")
+        if live:
+            key: DatasetKey = (f"live:{path}", bool(convert_to_raw_units), False, scenario_key)
+        else:
+            key = (dataset_fingerprint(path), bool(convert_to_raw_units), bool(float32), scenario_key)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refcount += 1
+                    return entry
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading this key; if it fails, try again here.
+            loading.wait()
+
+        try:
+            entry = self._load(key, path, convert_to_raw_units, float32, scenario_key, live)
+            with self._lock:
+                entry.refcount += 1
+                self._entries[key] = entry
+            return entry
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    @staticmethod
+    def _load(
+        key: DatasetKey,
+        path: Path,
+        convert_to_raw_units: bool,
+        float32: bool,
+        scenario_key: Optional[str],
+        live: bool,
+    ) -> SharedDataset:
+        if live:
+            source = LiveDataset(path, convert_to_raw_units=convert_to_raw_units, scenario_key=scenario_key)
+            return SharedDataset(key=key, path=path, frame=source.frame(), live=source, profile=source.profile)
+        df = load_energy_dataframe(
+            path,
+            convert_to_raw_units=convert_to_raw_units,
+            mmap=True,
+            float32=float32,
+            scenario_key=scenario_key,
+        )
+        frame, columns = _freeze_frame(df)
+        profile = dataset_profile(path, scenario_key)
+        entry = SharedDataset(key=key, path=path, frame=frame, columns=columns, profile=profile)
+        entry.pyramids = PyramidHolder(frame, _pyramid_cache_file(path, key), profile.step_seconds)
+        return entry
+
+    def release(self, key: DatasetKey) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refcount -= 1
+            if entry.refcount <= 0:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "datasets": len(self._entries),
+                "bytes": sum(entry.nbytes for entry in self._entries.values()),
+                "entries": [
+                    {
+                        "fingerprint": entry.fingerprint,
+                        "path": str(entry.path),
+                        "rows": entry.rows,
+                        "live": entry.live is not None,
+                        "float32": entry.key[2],
+                        "scenario_key": entry.key[3],
+                        "refcount": entry.refcount,
+                        "bytes": entry.nbytes,
+                    }
+                    for entry in self._entries.values()
+                ],
+            }
@@ -0,0 +1,80 @@
+"""Content-addressed storage and background conversion of uploaded datasets."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import AsyncIterator, Tuple
+from uuid import uuid4
+
+from .data_loader import load_energy_dataframe
+from .db import session_scope
+from .models import Dataset, DatasetStatus
+
+
+def dataset_path(dataset_dir: Path, dataset_id: str) -> Path:
+    """Return where the CSV of ``dataset_id`` is stored."""
+    return dataset_dir / f"{dataset_id}.csv"
+
+
+async def store_upload(chunks: AsyncIterator[bytes], dataset_dir: Path) -> Tuple[str, Path, int]:
+    """Stream ``chunks`` to disk while hashing them.
+
+    The file is written to a temporary name and then moved to its
+    content-addressed location. If identical content is already stored, the
+    upload is discarded. Returns ``(dataset_id, path, size_bytes)``. The id
+    is the same BLAKE2b digest the data loader uses as the dataset
+    fingerprint.
+    """
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    tmp = dataset_dir / f".upload-{uuid4().hex}.part"
+    digest = hashlib.blake2b(digest_size=16)
+    size = 0
+    try:
+        with tmp.open("wb") as handle:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                digest.update(chunk)
+                handle.write(chunk)
+                size += len(chunk)
+        if size == 0:
+            raise ValueError("Uploaded dataset is empty")
+        dataset_id = digest.hexdigest()
+        target = dataset_path(dataset_dir, dataset_id)
+        if not target.exists():
+            os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return dataset_id, target, size
+
+
+def _update(dataset_id: str, **fields) -> None:
+    with session_scope() as db:
+        row = db.get(Dataset, dataset_id)
+        if row is None:
+            return
+        for key, value in fields.items():
+            setattr(row, key, value)
+        db.add(row)
+
+
+def convert_dataset(dataset_id: str) -> None:
+    """Build the binary column cache for an uploaded dataset (background task)."""
+    with session_scope() as db:
+        row = db.get(Dataset, dataset_id)
+        if row is None:
+            return
+        path = Path(row.path)
+    _update(dataset_id, status=DatasetStatus.CONVERTING, progress=0.0, stage="starting", error=None)
+
+    def report(fraction: float, stage: str) -> None:
+        _update(dataset_id, progress=round(min(max(fraction, 0.0), 0.99), 3), stage=stage)
+
+    try:
+        df = load_energy_dataframe(path, convert_to_raw_units=False, mmap=True, progress=report)
+    except Exception as exc:  # surfaced to the client through GET /datasets/{id}
+        _update(dataset_id, status=DatasetStatus.FAILED, stage="failed", error=str(exc))
+        return
+    _update(dataset_id, status=DatasetStatus.READY, progress=1.0, stage="ready", rows=int(len(df)))
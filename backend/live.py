@@ -0,0 +1,208 @@
+"""Append-only datasets that follow a growing CSV (tail-follow mode).
+
+A :class:`LiveDataset` keeps its numeric columns in amortised-capacity
+buffers. New rows arrive either by polling the source file for appended
+lines or by being pushed directly (``append_frame``); sessions reading the
+dataset see the longer series on their next access. Derived state keyed on
+the old length (the time pyramid, the DataFrame snapshot) is extended or
+refreshed incrementally instead of being rebuilt from scratch.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import _convert_to_raw_mw, dataset_profile, load_energy_dataframe, read_energy_rows
+from .pyramid import PYRAMID_COLUMNS, TimePyramid, build_pyramid, epoch_seconds, extend_pyramid
+
+logger = logging.getLogger(__name__)
+
+LIVE_COLUMNS = ("wind", "solar", "hydro", "load", "price")
+
+
+class GrowableArray:
+    """A 1-D numpy buffer with amortised O(1) appends.
+
+    ``values`` is a read-only view of the filled prefix. Views handed out
+    before a reallocation keep pointing at the old buffer, so readers always
+    see a consistent snapshot.
+    """
+
+    def __init__(self, dtype, capacity: int = 1024, growth: float = 1.5) -> None:
+        self._buffer = np.empty(max(int(capacity), 1), dtype=dtype)
+        self._size = 0
+        self._growth = float(growth)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return int(self._buffer.shape[0])
+
+    @property
+    def values(self) -> np.ndarray:
+        view = self._buffer[: self._size]
+        view.flags.writeable = False
+        return view
+
+    def append(self, values) -> None:
+        values = np.asarray(values, dtype=self._buffer.dtype)
+        needed = self._size + values.shape[0]
+        if needed > self.capacity:
+            capacity = max(needed, int(self.capacity * self._growth) + 1)
+            buffer = np.empty(capacity, dtype=self._buffer.dtype)
+            buffer[: self._size] = self._buffer[: self._size]
+            self._buffer = buffer
+        self._buffer[self._size:needed] = values
+        self._size = needed
+
+
+class LiveDataset:
+    """A dataset that grows as rows are appended to its CSV or pushed to it."""
+
+    def __init__(
+        self,
+        path: Path,
+        convert_to_raw_units: bool = True,
+        scenario_key: Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self.scenario_key = scenario_key
+        self._lock = threading.RLock()
+        self.version = 0
+
+        size = path.stat().st_size
+        with path.open("rb") as handle:
+            self._header: List[str] = handle.readline().decode().strip().split(",")
+        df = load_energy_dataframe(path, convert_to_raw_units=False, mmap=True, scenario_key=scenario_key)
+        # Profile of the rows first loaded (one partition with ``scenario_key``);
+        # the initial and appended rows are scaled the same way.
+        self.profile = dataset_profile(path, scenario_key)
+        self._to_raw_units = bool(convert_to_raw_units and self.profile.capacity_factor)
+        if self._to_raw_units:
+            df = _convert_to_raw_mw(df)
+        self._offset = size
+        self._pending = b""
+
+        capacity = max(1024, int(len(df) * 1.25))
+        self._columns: Dict[str, GrowableArray] = {
+            name: GrowableArray(np.float64, capacity) for name in LIVE_COLUMNS
+        }
+        self._epoch = GrowableArray(np.int64, capacity)
+        self._scenario_codes = GrowableArray(np.int32, capacity)
+        self._scenarios: Dict[str, int] = {}
+        self._step_seconds = int(self.profile.step_seconds or 600)  # also the pyramid's step
+
+        self._frame: Optional[pd.DataFrame] = None
+        self._frame_version = -1
+        self._pyramid: Optional[TimePyramid] = None
+        self._append(df)
+
+    # ------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------
+    @property
+    def rows(self) -> int:
+        return len(self._epoch)
+
+    def column(self, name: str) -> np.ndarray:
+        array = self._columns.get(name)
+        return array.values if array is not None else np.zeros(self.rows)
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {name: array.values for name, array in self._columns.items()}
+
+    def frame(self) -> pd.DataFrame:
+        """Zero-copy DataFrame over the current rows (rebuilt only after appends)."""
+        with self._lock:
+            if self._frame is None or self._frame_version != self.version:
+                data = {"timestamp": self._epoch.values.view("datetime64[s]")}
+                data.update(self.columns)
+                if self._scenarios:
+                    names = np.asarray(list(self._scenarios), dtype=object)
+                    data["scenario"] = pd.Categorical.from_codes(self._scenario_codes.values, categories=names)
+                self._frame = pd.DataFrame(data, copy=False)
+                self._frame_version = self.version
+            return self._frame
+
+    def pyramid(self) -> TimePyramid:
+        """Time pyramid kept up to date by extending only the open buckets."""
+        with self._lock:
+            columns = {name: self.column(name) for name in PYRAMID_COLUMNS}
+            partitions = self._scenario_codes.values if self._scenarios else None
+            if self._pyramid is None:
+                self._pyramid = build_pyramid(self._epoch.values, columns, partitions, self._step_seconds)
+            elif self._pyramid.rows < self.rows:
+                self._pyramid = extend_pyramid(self._pyramid, self._epoch.values, columns, partitions)
+            return self._pyramid
+
+    # ------------------------------------------------------------------
+    # Growth
+    # ------------------------------------------------------------------
+    def poll(self) -> int:
+        """Read complete lines appended to the source file; return rows added."""
+        with self._lock:
+            try:
+                size = self.path.stat().st_size
+            except OSError:
+                return 0
+            if size < self._offset:
+                logger.warning("Live dataset %s shrank; ignoring until it grows past %d bytes", self.path, self._offset)
+                return 0
+            if size == self._offset:
+                return 0
+            with self.path.open("rb") as handle:
+                handle.seek(self._offset)
+                chunk = self._pending + handle.read(size - self._offset)
+            self._offset = size
+            complete, _, self._pending = chunk.rpartition(b"\n")
+            if not complete:
+                self._pending = chunk
+                return 0
+            return self.append_csv(complete + b"\n")
+
+    def append_csv(self, data: bytes) -> int:
+        """Append CSV rows laid out like the source file (header line optional)."""
+        return self.append_frame(read_energy_rows(data, self._header))
+
+    def append_frame(self, df: pd.DataFrame) -> int:
+        """Append parsed rows; raw values are converted like the initial load."""
+        with self._lock:
+            if self.scenario_key is not None and "scenario" in df.columns:
+                df = df[df["scenario"].astype(str) == self.scenario_key]
+            if self._to_raw_units:
+                df = _convert_to_raw_mw(df)
+            added = self._append(df)
+            if added:
+                self.version += 1
+            return added
+
+    def _append(self, df: pd.DataFrame) -> int:
+        n = len(df)
+        if n == 0:
+            return 0
+        if "timestamp" in df.columns:
+            epoch = epoch_seconds(df)
+        else:
+            # Continue the series at the native step when rows carry no timestamps.
+            step = self._step_seconds
+            last = int(self._epoch.values[-1]) if self.rows else -step
+            epoch = last + step * np.arange(1, n + 1, dtype=np.int64)
+        for name, array in self._columns.items():
+            array.append(df[name].to_numpy(dtype=np.float64) if name in df.columns else np.zeros(n))
+        if "scenario" in df.columns:
+            local, labels = pd.factorize(df["scenario"].astype(str))
+            lookup = np.array([self._scenarios.setdefault(label, len(self._scenarios)) for label in labels], dtype=np.int32)
+            self._scenario_codes.append(lookup[local])
+        else:
+            self._scenario_codes.append(np.zeros(n, dtype=np.int32))
+        self._epoch.append(epoch)
+        return n
@@ -6,7 +6,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Any, Dict
 
-from sqlalchemy import JSON, Column, DateTime, Enum as SqlEnum, ForeignKey, Integer, String, Text
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Enum as SqlEnum, Float, ForeignKey, Integer, String, Text
 from sqlalchemy.dialects.sqlite import JSON as SqliteJSON
 
 from .db import Base
@@ -75,6 +75,33 @@ class Scenario(Base):
         }
 
 
+class DatasetStatus(str, Enum):
+    """Conversion states of an uploaded dataset."""
+
+    PENDING = "pending"
+    CONVERTING = "converting"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class Dataset(Base):
+    """Uploaded CSV stored under its content hash and converted to the column cache."""
+
+    __tablename__ = "datasets"
+
+    id = Column(String(32), primary_key=True)  # BLAKE2b content hash of the CSV
+    filename = Column(String(255), nullable=True)
+    path = Column(Text, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    status = Column(SqlEnum(DatasetStatus), nullable=False, default=DatasetStatus.PENDING)
+    progress = Column(Float, nullable=False, default=0.0)
+    stage = Column(String(120), nullable=True)
+    rows = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class SimulationSnapshot(Base):
     """Timeseries storage for simulation state snapshots."""
 
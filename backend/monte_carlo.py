@@ -0,0 +1,189 @@
+"""Monte Carlo KPI distributions over the stochastic scenarios of a dataset.
+
+The training CSV stacks many stochastic realisations (values of its
+``scenario`` column) back to back. Here each realisation is dispatched on
+its own with one configuration, and the KPIs become distributions across
+realisations: mean, spread, percentiles and, for costs, the CVaR of the
+worst outcomes. Partitions are dispatched in a process pool whose workers
+memory-map one read-only copy of the PV, load and price arrays.
+
+Both engines report the cost KPIs of ``backend.lp_dispatch``: imports at
+the step price through the transformer, exports paid at
+``export_price_factor`` times the price after ``export_efficiency``. For
+the merit order they are a by-product of its (price-blind) dispatch.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .lp_dispatch import LPDispatchConfig, LPDispatchOptimizer
+from .optimizer import MeritOrderOptimizer
+
+ENGINES = ("merit", "lp")
+COST_KPI_NAMES = ("import_cost", "export_revenue", "net_cost")
+# Costs where high values are bad; these get a CVaR.
+_RISK_KPI_NAMES = ("import_cost", "net_cost")
+PERCENTILES = (5, 50, 95)
+CVAR_LEVEL = 0.95
+
+
+def cvar(values: np.ndarray, level: float = CVAR_LEVEL) -> float:
+    """Mean of the worst (highest) ``1 - level`` share of equally likely outcomes.
+
+    The tail boundary may split an outcome, which then counts with the
+    fraction inside the tail, so the value is defined for any sample size.
+    """
+    ordered = np.sort(np.asarray(values, dtype=np.float64))[::-1]
+    if ordered.size == 0:
+        return float("nan")
+    tail = max((1.0 - level) * ordered.size, 1e-12)
+    weights = np.clip(tail - np.arange(ordered.size), 0.0, 1.0)
+    return float(np.dot(weights, ordered) / tail)
+
+
+def kpi_distribution(kpis: np.ndarray, kpi_names: Sequence[str]) -> Dict[str, Dict[str, float]]:
+    """Summary statistics per KPI of a (partitions x KPIs) matrix."""
+    out: Dict[str, Dict[str, float]] = {}
+    for column, name in enumerate(kpi_names):
+        values = kpis[:, column]
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            continue
+        stats = {
+            "mean": float(np.mean(values)),
+            "std": float(np.std(values)),
+            "min": float(np.min(values)),
+            **{f"p{q}": float(v) for q, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+            "max": float(np.max(values)),
+        }
+        if name in _RISK_KPI_NAMES:
+            stats[f"cvar{int(round(CVAR_LEVEL * 100))}"] = cvar(values)
+        out[name] = stats
+    return out
+
+
+@dataclass
+class MonteCarloResult:
+    """Per-partition KPIs (partitions x ``kpi_names``) and their distributions."""
+
+    engine: str
+    partitions: List[str]
+    steps: List[int]
+    kpi_names: List[str]
+    kpis: np.ndarray
+    elapsed_s: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "engine": self.engine,
+            "partitions": self.partitions,
+            "steps": self.steps,
+            "kpi_names": self.kpi_names,
+            "per_partition": {name: self.kpis[:, i].tolist() for i, name in enumerate(self.kpi_names)},
+            "distribution": kpi_distribution(self.kpis, self.kpi_names),
+            "elapsed_s": round(self.elapsed_s, 3),
+        }
+
+
+# ----------------------------------------------------------------------
+# Worker side (runs in the pool processes)
+# ----------------------------------------------------------------------
+_WORKER_PROFILES: Dict[str, np.ndarray] = {}
+
+
+def _init_worker(paths: Dict[str, str]) -> None:
+    for name, path in paths.items():
+        _WORKER_PROFILES[name] = np.load(path, mmap_mode="r")
+
+
+def _take(values: np.ndarray, ranges: Sequence[Sequence[int]]) -> np.ndarray:
+    return np.concatenate([np.asarray(values[start:stop], dtype=np.float64) for start, stop in ranges])
+
+
+def dispatch_partition(
+    pv_mw: np.ndarray, load_mw: np.ndarray, price: np.ndarray, cfg: LPDispatchConfig, engine: str
+) -> Dict[str, float]:
+    """KPIs, including cost KPIs, of one partition with ``engine``."""
+    if engine == "lp":
+        return LPDispatchOptimizer(cfg).run(pv_mw, load_mw, price)["kpis"]
+    out = MeritOrderOptimizer(cfg).run(pv_mw, load_mw)
+    series = out["series_mwh"]
+    import_cost = float(np.dot(series["grid_import_mwh"], price) / max(cfg.transformer_efficiency, 1e-9))
+    export_revenue = float(
+        np.dot(series["pv_export_mwh"], price) * float(cfg.export_price_factor) * float(cfg.export_efficiency)
+    )
+    return {
+        **out["kpis"],
+        "import_cost": import_cost,
+        "export_revenue": export_revenue,
+        "net_cost": import_cost - export_revenue,
+    }
+
+
+def _run_partition(ranges: Sequence[Sequence[int]], cfg: Dict[str, Any], engine: str) -> Dict[str, float]:
+    profiles = [_take(_WORKER_PROFILES[name], ranges) for name in ("pv", "load", "price")]
+    return dispatch_partition(*profiles, LPDispatchConfig(**cfg), engine)
+
+
+# ----------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------
+def run_monte_carlo(
+    pv_mw: np.ndarray,
+    load_mw: np.ndarray,
+    price: np.ndarray,
+    partitions: Dict[str, List[List[int]]],
+    cfg: LPDispatchConfig,
+    engine: str = "merit",
+    max_workers: Optional[int] = None,
+) -> MonteCarloResult:
+    """Dispatch ``cfg`` over every partition (name -> ``[start, stop)`` row ranges).
+
+    Each partition is dispatched from empty stores, with DSM sized on its
+    own peak load. With one worker the partitions run in this process.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {', '.join(ENGINES)}")
+    if not (len(pv_mw) == len(load_mw) == len(price)):
+        raise ValueError("pv, load and price must have same length")
+    n = len(pv_mw)
+    clipped = {
+        name: [[start, min(stop, n)] for start, stop in ranges if start < min(stop, n)]
+        for name, ranges in partitions.items()
+    }
+    names = [name for name, ranges in clipped.items() if ranges]
+    if not names:
+        raise ValueError("no partition has any steps")
+    ranges = [clipped[name] for name in names]
+    started = time.time()
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(names)))
+
+    if workers == 1:
+        arrays = {"pv": pv_mw, "load": load_mw, "price": price}
+        rows = [
+            dispatch_partition(*(_take(arrays[key], parts) for key in ("pv", "load", "price")), cfg, engine)
+            for parts in ranges
+        ]
+    else:
+        with tempfile.TemporaryDirectory(prefix="monte-carlo-") as tmp:
+            paths: Dict[str, str] = {}
+            for key, values in (("pv", pv_mw), ("load", load_mw), ("price", price)):
+                paths[key] = str(Path(tmp) / f"{key}.npy")
+                np.save(paths[key], np.asarray(values, dtype=np.float64))
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(paths,)) as pool:
+                config = asdict(cfg)
+                rows = list(pool.map(_run_partition, ranges, [config] * len(ranges), [engine] * len(ranges)))
+
+    kpi_names = list(rows[0])
+    kpis = np.array([[row.get(name, np.nan) for name in kpi_names] for row in rows], dtype=np.float64)
+    steps = [int(sum(stop - start for start, stop in parts)) for parts in ranges]
+    return MonteCarloResult(engine, names, steps, kpi_names, kpis, time.time() - started)
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, Any, Optional
+from dataclasses import dataclass, field, fields, replace
+from typing import Dict, Any, Optional, Sequence, Tuple
 
 import numpy as np
 
+from .live import GrowableArray
+
 
 @dataclass
 class MeritOrderConfig:
@@ -17,6 +19,54 @@ class MeritOrderConfig:
     # DSM virtual store (lossless) parameters
     flexible_load_share: float = 0.0
     max_shift_hours: float = 3.0
+    # Multiplier on the PV series (installed-capacity sweeps)
+    pv_scale: float = 1.0
+    # Power-to-heat (paper scenario 4): PV-only heat pump feeding the heat
+    # load and a thermal store (TES); district heating (DH) covers the rest
+    hp_power_mw: float = 0.0  # electric input limit
+    hp_cop: float = 3.5
+    tes_energy_mwh: float = 0.0  # thermal
+    tes_c_rate: float = 0.25
+    tes_eta_charge: float = 0.95
+    tes_eta_discharge: float = 0.95
+    tes_loss_per_hour: float = 0.005  # standing loss, share of content
+    dh_emission_kg_per_mwh: float = 33.9
+    # Heat demand per MW of electric load when no heat series is given
+    heat_load_ratio: float = 1.0
+    # Grid connection (paper: 0.25 MW, transformer 0.94); None = unlimited.
+    # The import limit is on the grid side, so it delivers limit * efficiency.
+    grid_import_limit_mw: Optional[float] = None
+    grid_export_limit_mw: Optional[float] = None
+    transformer_efficiency: float = 0.94
+
+    @property
+    def thermal(self) -> bool:
+        """True when the heat pump stage takes part in the dispatch."""
+        return self.hp_power_mw > 0.0
+
+    @property
+    def grid_limited(self) -> bool:
+        """True when an import or export limit applies (adds curtailment/unserved series)."""
+        return self.grid_import_limit_mw is not None or self.grid_export_limit_mw is not None
+
+    def grid_steps(self) -> Tuple[float, float]:
+        """Load-side import and export limits per step (MWh; ``inf`` when unlimited)."""
+        dt = float(self.dt_hours)
+        imp = self.grid_import_limit_mw
+        exp = self.grid_export_limit_mw
+        return (
+            np.inf if imp is None else max(0.0, float(imp)) * dt * float(self.transformer_efficiency),
+            np.inf if exp is None else max(0.0, float(exp)) * dt,
+        )
+
+
+@dataclass
+class DispatchState:
+    """Storage levels carried from one dispatched step to the next."""
+
+    soc: float = 0.0  # battery, MWh
+    dsm_soc: float = 0.0  # DSM virtual store, MWh
+    tes_soc: float = 0.0  # thermal store, MWh_th
 
 
 class MeritOrderOptimizer:
@@ -25,15 +75,198 @@ class MeritOrderOptimizer:
     Order:
       PV -> Load  >  PV -> Battery  >  PV -> Export  >  Battery -> Load  >  Grid Import
     Battery discharge is never exported when export_only_from_pv=True (default).
+    Export beyond the grid export limit is curtailed; load beyond the import
+    limit is left unserved.
+
+    With a heat pump (or a given heat demand) a thermal stage runs in the
+    same pass (scenario 4):
+      PV -> HP -> Heat  >  PV -> Load  >  PV -> HP -> TES  >  PV -> Battery
+    with TES -> Heat next and district heating for any heat still missing.
     """
 
     def __init__(self, cfg: MeritOrderConfig):
         self.cfg = cfg
 
-    def run(self, pv_mw: np.ndarray, load_mw: np.ndarray) -> Dict[str, Any]:
+    @staticmethod
+    def _is_stateless(e_cap: float, p_cap: float, dsm_energy_cap: float, max_power_mw: float) -> bool:
+        """True when neither the battery nor the DSM store can ever hold energy."""
+        battery = e_cap > 1e-9 and p_cap > 1e-9
+        dsm = dsm_energy_cap > 1e-9 and max_power_mw > 1e-9
+        return not battery and not dsm
+
+    @staticmethod
+    def _dispatch_stateless(pv_mw: np.ndarray, load_mw: np.ndarray, dt: float, import_step: float, export_step: float):
+        """PV -> Load > Export / Grid for all steps at once.
+
+        Mirrors the loop's scalar ``max``/``min`` exactly (argument order,
+        ``-0.0`` and NaN handling), so the results are bit-identical.
+        """
+        pv_e = np.asarray(pv_mw, dtype=np.float64) * dt
+        load_e = np.asarray(load_mw, dtype=np.float64) * dt
+        pv_e = np.where(pv_e > 0.0, pv_e, 0.0)       # max(0.0, x)
+        load_e = np.where(load_e > 0.0, load_e, 0.0)
+        use = np.where(load_e < pv_e, load_e, pv_e)   # min(pv_e, load_e)
+        surplus = pv_e - use
+        residual = load_e - use
+        pv_export = np.where(surplus > 1e-12, surplus, 0.0)
+        grid_import = np.where(residual > 1e-12, residual, 0.0)
+        export = np.minimum(pv_export, export_step)
+        grid = np.minimum(grid_import, import_step)
+        return use, export, grid, pv_export - export, grid_import - grid
+
+    def run(
+        self,
+        pv_mw: np.ndarray,
+        load_mw: np.ndarray,
+        heat_mw: Optional[np.ndarray] = None,
+        return_series: bool = True,
+        series_dtype: Any = np.float64,
+        points: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Dispatch a whole series; see ``heat_demand`` for the thermal stage.
+
+        By default every series is returned at full length in float64. The
+        lean modes dispatch in chunks of ``LEAN_CHUNK_STEPS`` and keep only
+        what they return, so memory no longer scales with the horizon:
+
+        - ``return_series=False``: KPIs only, no series at all;
+        - ``series_dtype=np.float32``: series stored in single precision;
+        - ``points=N``: series reduced to at most ``N`` buckets of (nearly)
+          equal length, energies summed and storage levels averaged;
+          ``bucket_steps`` holds the number of steps in each bucket.
+
+        KPIs of the lean modes equal the default ones to rounding.
+        """
         if pv_mw.shape != load_mw.shape:
             raise ValueError("pv and load must have same length")
 
+        dt = float(self.cfg.dt_hours)
+        stats = GridStats()
+        state = DispatchState()
+        dtype = np.dtype(series_dtype)
+        result: Dict[str, Any] = {}
+        if return_series and points is None and dtype == np.float64:
+            pv_mw = self.scaled_pv(pv_mw)
+            heat_mw = self.heat_demand(load_mw, heat_mw)
+            series = self._dispatch(pv_mw, load_mw, state, heat_mw=heat_mw, stats=stats)
+            sums = {name: float(np.sum(values)) for name, values in series.items()}
+            result['series_mwh'] = series
+            totals = (
+                float(np.sum(pv_mw) * dt),
+                float(np.sum(load_mw) * dt),
+                float(np.sum(np.maximum(heat_mw, 0.0)) * dt) if heat_mw is not None else None,
+            )
+        else:
+            sums, totals = self._run_chunked(pv_mw, load_mw, heat_mw, state, stats, result, return_series, dtype, points)
+
+        result['kpis'] = merit_kpis(self.cfg, sums, *totals[:2], stats, totals[2])
+        result['dt_hours'] = dt
+        return result
+
+    def _run_chunked(
+        self,
+        pv_mw: np.ndarray,
+        load_mw: np.ndarray,
+        heat_mw: Optional[np.ndarray],
+        state: DispatchState,
+        stats: "GridStats",
+        result: Dict[str, Any],
+        return_series: bool,
+        dtype: np.dtype,
+        points: Optional[int],
+    ) -> Tuple[Dict[str, float], Tuple[float, float, Optional[float]]]:
+        """Lean ``run``: dispatch chunk by chunk, keeping sums and the requested series form.
+
+        PV scaling and the heat demand are derived per chunk too. Returns the
+        flow sums and the PV, load and heat demand totals (MWh).
+        """
+        n = len(pv_mw)
+        dt = float(self.cfg.dt_hours)
+        # The DSM limit must come from the whole series, not from each chunk.
+        peak = float(np.max(load_mw)) if n else 0.0
+        buckets = max(1, min(int(points), n)) if points is not None else n
+        edges = -(-np.arange(buckets + 1) * n // buckets) if points is not None else None
+        sums: Dict[str, float] = {}
+        series: Dict[str, np.ndarray] = {}
+        pv_total = load_total = heat_total = 0.0
+        for lo in range(0, n, LEAN_CHUNK_STEPS):
+            hi = min(lo + LEAN_CHUNK_STEPS, n)
+            pv = self.scaled_pv(pv_mw[lo:hi])
+            heat = self.heat_demand(load_mw[lo:hi], heat_mw[lo:hi] if heat_mw is not None else None)
+            pv_total += float(np.sum(pv))
+            load_total += float(np.sum(load_mw[lo:hi]))
+            if heat is not None:
+                heat_total += float(np.sum(np.maximum(heat, 0.0)))
+            part = self._dispatch(pv, load_mw[lo:hi], state, peak, heat, stats)
+            bucket = np.arange(lo, hi) * buckets // n if points is not None else None
+            for name, values in part.items():
+                sums[name] = sums.get(name, 0.0) + float(np.sum(values))
+                if not return_series:
+                    continue
+                if name not in series:
+                    series[name] = np.zeros(buckets, dtype=np.float64 if points is not None else dtype)
+                if points is None:
+                    series[name][lo:hi] = values
+                else:
+                    totals = np.bincount(bucket - bucket[0], weights=values)
+                    series[name][bucket[0]:bucket[0] + len(totals)] += totals
+        if return_series and points is not None:
+            counts = np.diff(edges)
+            for name, values in series.items():
+                if name.endswith('soc_mwh'):
+                    values /= np.maximum(counts, 1)
+                series[name] = values.astype(dtype, copy=False)
+            result['bucket_steps'] = counts
+        if return_series:
+            result['series_mwh'] = series
+        thermal = heat_mw is not None or self.cfg.thermal
+        return sums, (pv_total * dt, load_total * dt, heat_total * dt if thermal else None)
+
+    def scaled_pv(self, pv_mw: np.ndarray) -> np.ndarray:
+        """``pv_mw`` times ``cfg.pv_scale`` (the input itself when the scale is 1)."""
+        scale = float(self.cfg.pv_scale)
+        return pv_mw if scale == 1.0 else np.asarray(pv_mw, dtype=np.float64) * scale
+
+    def heat_demand(self, load_mw: np.ndarray, heat_mw: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Heat demand (MW) for the thermal stage, ``None`` when there is none.
+
+        A given ``heat_mw`` is used as is; otherwise a configuration with a
+        heat pump assumes ``heat_load_ratio`` times the electric load.
+        """
+        if heat_mw is not None:
+            return heat_mw
+        if not self.cfg.thermal:
+            return None
+        return np.asarray(load_mw, dtype=np.float64) * float(self.cfg.heat_load_ratio)
+
+    def dispatch(
+        self,
+        pv_mw: np.ndarray,
+        load_mw: np.ndarray,
+        state: DispatchState,
+        peak_load_mw: Optional[float] = None,
+        heat_mw: Optional[np.ndarray] = None,
+        stats: Optional["GridStats"] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Dispatch the given steps starting from ``state``, which is updated in place.
+
+        The DSM power limit is a share of ``peak_load_mw`` (default: the peak
+        of ``load_mw``); pass a fixed peak when dispatching a series in pieces.
+        With a heat demand (``heat_demand``) the thermal series are added.
+        ``stats`` accumulates grid peaks and quantiles across calls.
+        """
+        heat_mw = self.heat_demand(load_mw, heat_mw)
+        return self._dispatch(self.scaled_pv(pv_mw), load_mw, state, peak_load_mw, heat_mw, stats)
+
+    def _dispatch(
+        self,
+        pv_mw: np.ndarray,
+        load_mw: np.ndarray,
+        state: DispatchState,
+        peak_load_mw: Optional[float] = None,
+        heat_mw: Optional[np.ndarray] = None,
+        stats: Optional["GridStats"] = None,
+    ) -> Dict[str, np.ndarray]:
         n = len(pv_mw)
         dt = float(self.cfg.dt_hours)
         e_cap = float(max(0.0, self.cfg.battery_energy_mwh))
@@ -41,7 +274,7 @@ class MeritOrderOptimizer:
         eta_c = float(self.cfg.eta_charge)
         eta_d = float(self.cfg.eta_discharge)
 
-        soc = 0.0  # MWh
+        soc = state.soc  # MWh
 
         pv_to_load = np.zeros(n)
         pv_to_batt = np.zeros(n)
@@ -50,98 +283,864 @@ class MeritOrderOptimizer:
         grid_import = np.zeros(n)
         dsm_charge = np.zeros(n)    # increase demand now
         dsm_discharge = np.zeros(n) # reduce demand later
+        pv_curtail = np.zeros(n)
+        unserved = np.zeros(n)
+        import_step, export_step = self.cfg.grid_steps()
 
         # DSM capacities (simple approximation per paper narrative)
         flex = max(0.0, min(1.0, self.cfg.flexible_load_share))
-        max_power_mw = float(np.max(load_mw) * flex) if flex > 0 else 0.0
+        if flex > 0:
+            peak = np.max(load_mw) if peak_load_mw is None else peak_load_mw
+            max_power_mw = float(peak * flex)
+        else:
+            max_power_mw = 0.0
         dsm_energy_cap = max_power_mw * float(max(0.0, self.cfg.max_shift_hours))  # MWh
-        dsm_soc = 0.0
-
-        for t in range(n):
-            pv_e = max(0.0, float(pv_mw[t]) * dt)
-            load_e = max(0.0, float(load_mw[t]) * dt)
-
-            # 1) PV -> Load
-            use = min(pv_e, load_e)
-            pv_to_load[t] = use
-            pv_e -= use
-            load_e -= use
-
-            # DSM charge from PV surplus before export (so it offsets future grid)
-            if dsm_energy_cap > 1e-9 and pv_e > 1e-12 and max_power_mw > 1e-9:
-                charge_cap = min(max_power_mw * dt, pv_e, max(0.0, dsm_energy_cap - dsm_soc))
-                if charge_cap > 1e-12:
-                    dsm_charge[t] = charge_cap
-                    dsm_soc += charge_cap
-                    pv_e -= charge_cap
-
-            # 2) PV -> Battery (respect charge power and capacity)
-            if e_cap > 1e-9 and p_cap > 1e-9 and pv_e > 1e-12:
-                charge_input_max = min(p_cap * dt, pv_e)
-                cap_room = max(0.0, e_cap - soc)
-                # input limited by capacity increase / eta
-                charge_input = min(charge_input_max, cap_room / max(eta_c, 1e-9))
-                if charge_input > 1e-12:
-                    soc += charge_input * eta_c
-                    pv_to_batt[t] = charge_input
-                    pv_e -= charge_input
-
-            # 3) PV -> Export (remaining)
-            if pv_e > 1e-12:
-                pv_export[t] = pv_e
-                pv_e = 0.0
-
-            # 4) DSM dispatch to reduce remaining load (use stored flexible energy)
-            if load_e > 1e-12 and dsm_soc > 1e-12 and max_power_mw > 1e-9:
-                dispatch_cap = min(max_power_mw * dt, dsm_soc, load_e)
-                if dispatch_cap > 1e-12:
-                    dsm_discharge[t] = dispatch_cap
-                    dsm_soc -= dispatch_cap
-                    load_e -= dispatch_cap
-
-            # 5) Battery -> Load
-            if load_e > 1e-12 and soc > 1e-12 and p_cap > 1e-9:
-                # output limited by power and available energy after efficiency
-                max_output = min(load_e, p_cap * dt, soc * eta_d)
-                if max_output > 1e-12:
-                    batt_to_load[t] = max_output
-                    soc -= max_output / max(eta_d, 1e-9)
-                    load_e -= max_output
-
-            # 6) Grid Import for any residual load
-            if load_e > 1e-12:
-                grid_import[t] = load_e
+        dsm_soc = state.dsm_soc
+
+        thermal = heat_mw is not None
+        if thermal and len(heat_mw) != n:
+            raise ValueError("heat and pv must have same length")
+        hp_step, cop, tes_cap, tes_step, tes_keep = thermal_limits(self.cfg)
+        eta_tc = float(max(self.cfg.tes_eta_charge, 1e-9))
+        eta_td = float(max(self.cfg.tes_eta_discharge, 1e-9))
+        tes_soc = state.tes_soc
+        hp_el = 0.0
+        heat = {name: np.zeros(n) for name in THERMAL_SERIES_NAMES} if thermal else {}
+        if thermal:
+            pv_to_hp, hp_to_heat, hp_to_tes = heat['pv_to_hp_mwh'], heat['hp_to_heat_mwh'], heat['hp_to_tes_mwh']
+            tes_to_heat, tes_level, dh = heat['tes_to_heat_mwh'], heat['tes_soc_mwh'], heat['dh_mwh']
+
+        if not thermal and self._is_stateless(e_cap, p_cap, dsm_energy_cap, max_power_mw):
+            pv_to_load, pv_export, grid_import, pv_curtail, unserved = self._dispatch_stateless(
+                pv_mw, load_mw, dt, import_step, export_step
+            )
+        else:
+            for t in range(n):
+                pv_e = max(0.0, float(pv_mw[t]) * dt)
+                load_e = max(0.0, float(load_mw[t]) * dt)
+
+                if thermal:
+                    # 0) PV -> HP -> Heat, then TES -> Heat, then district heating
+                    heat_e = max(0.0, float(heat_mw[t]) * dt)
+                    tes_soc *= tes_keep
+                    hp_el = min(pv_e, hp_step, heat_e / cop)
+                    if hp_el > 1e-12:
+                        pv_to_hp[t] = hp_el
+                        hp_to_heat[t] = hp_el * cop
+                        pv_e -= hp_el
+                        heat_e -= hp_el * cop
+                    else:
+                        hp_el = 0.0
+                    if heat_e > 1e-12 and tes_soc > 1e-12 and tes_step > 1e-12:
+                        out = min(heat_e, tes_step, tes_soc * eta_td)
+                        if out > 1e-12:
+                            tes_to_heat[t] = out
+                            tes_soc -= out / eta_td
+                            heat_e -= out
+                    if heat_e > 1e-12:
+                        dh[t] = heat_e
+
+                # 1) PV -> Load
+                use = min(pv_e, load_e)
+                pv_to_load[t] = use
+                pv_e -= use
+                load_e -= use
+
+                # DSM charge from PV surplus before export (so it offsets future grid)
+                if dsm_energy_cap > 1e-9 and pv_e > 1e-12 and max_power_mw > 1e-9:
+                    charge_cap = min(max_power_mw * dt, pv_e, max(0.0, dsm_energy_cap - dsm_soc))
+                    if charge_cap > 1e-12:
+                        dsm_charge[t] = charge_cap
+                        dsm_soc += charge_cap
+                        pv_e -= charge_cap
+
+                # PV -> HP -> TES with the heat pump capacity left over
+                if thermal and tes_step > 1e-12 and pv_e > 1e-12:
+                    room = max(0.0, tes_cap - tes_soc)
+                    tes_in = min(pv_e, hp_step - hp_el, tes_step / cop, room / (cop * eta_tc))
+                    if tes_in > 1e-12:
+                        pv_to_hp[t] += tes_in
+                        hp_to_tes[t] = tes_in * cop
+                        tes_soc += tes_in * cop * eta_tc
+                        pv_e -= tes_in
+
+                # 2) PV -> Battery (respect charge power and capacity)
+                if e_cap > 1e-9 and p_cap > 1e-9 and pv_e > 1e-12:
+                    charge_input_max = min(p_cap * dt, pv_e)
+                    cap_room = max(0.0, e_cap - soc)
+                    # input limited by capacity increase / eta
+                    charge_input = min(charge_input_max, cap_room / max(eta_c, 1e-9))
+                    if charge_input > 1e-12:
+                        soc += charge_input * eta_c
+                        pv_to_batt[t] = charge_input
+                        pv_e -= charge_input
+
+                # 3) PV -> Export (remaining, up to the export limit; the rest is curtailed)
+                if pv_e > 1e-12:
+                    pv_export[t] = min(pv_e, export_step)
+                    pv_curtail[t] = pv_e - pv_export[t]
+                    pv_e = 0.0
+
+                # 4) DSM dispatch to reduce remaining load (use stored flexible energy)
+                if load_e > 1e-12 and dsm_soc > 1e-12 and max_power_mw > 1e-9:
+                    dispatch_cap = min(max_power_mw * dt, dsm_soc, load_e)
+                    if dispatch_cap > 1e-12:
+                        dsm_discharge[t] = dispatch_cap
+                        dsm_soc -= dispatch_cap
+                        load_e -= dispatch_cap
+
+                # 5) Battery -> Load
+                if load_e > 1e-12 and soc > 1e-12 and p_cap > 1e-9:
+                    # output limited by power and available energy after efficiency
+                    max_output = min(load_e, p_cap * dt, soc * eta_d)
+                    if max_output > 1e-12:
+                        batt_to_load[t] = max_output
+                        soc -= max_output / max(eta_d, 1e-9)
+                        load_e -= max_output
+
+                # 6) Grid Import for any residual load (up to the import limit)
+                if load_e > 1e-12:
+                    grid_import[t] = min(load_e, import_step)
+                    unserved[t] = load_e - grid_import[t]
+
+                if thermal:
+                    tes_level[t] = tes_soc
+
+        state.soc = soc
+        state.dsm_soc = dsm_soc
+        state.tes_soc = tes_soc
+        if stats is not None:
+            stats.update(grid_import / (dt * float(max(self.cfg.transformer_efficiency, 1e-9))), pv_export / dt)
+        limits = {'pv_curtail_mwh': pv_curtail, 'unserved_mwh': unserved} if self.cfg.grid_limited else {}
+        return {
+            'pv_to_load_mwh': pv_to_load,
+            'pv_to_batt_mwh': pv_to_batt,
+            'pv_export_mwh': pv_export,
+            'batt_to_load_mwh': batt_to_load,
+            'grid_import_mwh': grid_import,
+            'dsm_charge_mwh': dsm_charge,
+            'dsm_discharge_mwh': dsm_discharge,
+            **limits,
+            **heat,
+        }
+
+
+KPI_NAMES = (
+    'total_gen_mwh',
+    'total_demand_mwh',
+    'ped_absolute_mwh',
+    'ped_ratio',
+    'self_consumption_mwh',
+    'export_mwh',
+    'battery_throughput_mwh',
+    'grid_import_mwh',
+    # grid connection
+    'curtailed_mwh',
+    'unserved_mwh',
+    'grid_draw_mwh',
+    'self_sufficiency',
+    'peak_import_mw',
+    'peak_export_mw',
+    'import_p95_mw',
+    'import_p99_mw',
+)
+
+_SERIES_NAMES = (
+    'pv_to_load_mwh',
+    'pv_to_batt_mwh',
+    'pv_export_mwh',
+    'batt_to_load_mwh',
+    'grid_import_mwh',
+    'dsm_charge_mwh',
+    'dsm_discharge_mwh',
+)
+
+# Steps per dispatch call in the lean ``run`` modes (KPIs only, float32 or
+# downsampled series); bounds the temporary arrays to a few MB.
+LEAN_CHUNK_STEPS = 8192
+
+# Only produced when a grid limit is set.
+_GRID_SERIES_NAMES = ('pv_curtail_mwh', 'unserved_mwh')
+
+# Grid power histogram for quantiles: bin 0 holds idle steps, bin b >= 1
+# holds (_HIST_MIN_MW * r**(b - 1), _HIST_MIN_MW * r**b] with r = 1.005, up
+# to ~1.3 TW; values are reported at the bin's geometric centre (+-0.25%).
+_HIST_MIN_MW = np.float32(1e-6)
+_HIST_LOG_MIN = np.log(_HIST_MIN_MW)
+_HIST_LOG_RATIO = float(np.log(1.005))
+_HIST_BINS = 5600
+
+
+def _power_bins(mw: np.ndarray) -> np.ndarray:
+    """Histogram bin of each power value (any shape).
+
+    Works in float32, which is ample for 0.5% bins and halves the cost of
+    the logarithm on (configs x steps) blocks.
+    """
+    bins = np.maximum(mw, _HIST_MIN_MW, dtype=np.float32)
+    np.log(bins, out=bins)
+    bins -= _HIST_LOG_MIN
+    bins *= np.float32(1.0 / _HIST_LOG_RATIO)
+    np.ceil(bins, out=bins)
+    np.minimum(bins, _HIST_BINS - 1, out=bins)
+    return bins.astype(np.int64)
+
+
+def _hist_quantile(hist: np.ndarray, q: float) -> np.ndarray:
+    """``q`` quantile (nearest rank) of histogram rows; shape (..., _HIST_BINS) -> (...)."""
+    counts = np.cumsum(hist, axis=-1)
+    rank = np.maximum(np.ceil(q * counts[..., -1]), 1)
+    index = np.argmax(counts >= rank[..., None], axis=-1)
+    value = float(_HIST_MIN_MW) * np.exp((index - 0.5) * _HIST_LOG_RATIO)
+    return np.where((index == 0) | (counts[..., -1] == 0), 0.0, value)
+
+
+@dataclass(eq=False)
+class GridStats:
+    """Streaming grid power statistics (MW) over the steps dispatched so far.
+
+    Peaks are exact; quantiles come from a fixed log-spaced histogram, so the
+    memory does not grow with the number of steps. The batch engine fills
+    the fields with one entry (histogram row) per configuration.
+    """
+
+    steps: int = 0
+    peak_import_mw: float = 0.0
+    peak_export_mw: float = 0.0
+    import_hist: np.ndarray = field(default_factory=lambda: np.zeros(_HIST_BINS, dtype=np.int64))
+
+    def update(self, import_mw: np.ndarray, export_mw: np.ndarray, weight: int = 1) -> None:
+        """Add steps; ``weight`` counts each of them that many times (representative days)."""
+        if len(import_mw) == 0:
+            return
+        self.steps += len(import_mw) * weight
+        self.peak_import_mw = max(self.peak_import_mw, float(np.max(import_mw)))
+        self.peak_export_mw = max(self.peak_export_mw, float(np.max(export_mw)))
+        self.import_hist += np.bincount(_power_bins(import_mw), minlength=_HIST_BINS) * weight
+
+    def import_quantile(self, q: float) -> Any:
+        value = _hist_quantile(self.import_hist, q)
+        return float(value) if value.ndim == 0 else value
+
+
+def grid_kpis(
+    total_demand_mwh: float, grid_import_mwh: Any, sums: Dict[str, Any], stats: GridStats, transformer_efficiency: Any
+) -> Dict[str, Any]:
+    """Grid-connection KPIs (floats, or per-configuration arrays in the batch engine).
+
+    ``sums`` holds curtailment and unserved energy. Self-sufficiency is the
+    share of demand met on site; grid draw includes transformer losses.
+    """
+    unserved = sums['unserved_mwh']
+    draw = grid_import_mwh / np.maximum(transformer_efficiency, 1e-9)
+    sufficiency = 1.0 - (grid_import_mwh + unserved) / total_demand_mwh if total_demand_mwh > 1e-9 else 1.0
+    return {
+        'curtailed_mwh': sums['pv_curtail_mwh'],
+        'unserved_mwh': unserved,
+        'grid_draw_mwh': float(draw) if np.ndim(draw) == 0 else draw,
+        'self_sufficiency': sufficiency,
+        'peak_import_mw': stats.peak_import_mw,
+        'peak_export_mw': stats.peak_export_mw,
+        'import_p95_mw': stats.import_quantile(0.95),
+        'import_p99_mw': stats.import_quantile(0.99),
+    }
+
+# Thermal stage: HP electricity (MWh_e), heat flows and TES level (MWh_th).
+THERMAL_SERIES_NAMES = (
+    'pv_to_hp_mwh',
+    'hp_to_heat_mwh',
+    'hp_to_tes_mwh',
+    'tes_to_heat_mwh',
+    'tes_soc_mwh',
+    'dh_mwh',
+)
+
+THERMAL_KPI_NAMES = (
+    'heat_demand_mwh',
+    'hp_electricity_mwh',
+    'hp_heat_mwh',
+    'tes_discharge_mwh',
+    'dh_mwh',
+    'avoided_emissions_kg',
+)
+
+
+def thermal_limits(cfg: MeritOrderConfig) -> Tuple[float, float, float, float, float]:
+    """HP input per step (MWh_e), COP, TES capacity and power per step (MWh_th), TES keep factor per step."""
+    dt = float(cfg.dt_hours)
+    tes_cap = float(max(0.0, cfg.tes_energy_mwh))
+    loss = min(1.0, max(0.0, float(cfg.tes_loss_per_hour)))
+    return (
+        float(max(0.0, cfg.hp_power_mw)) * dt,
+        float(max(cfg.hp_cop, 1e-9)),
+        tes_cap,
+        tes_cap * float(max(0.0, cfg.tes_c_rate)) * dt,
+        (1.0 - loss) ** dt,
+    )
+
+
+def thermal_kpis(heat_demand_mwh: Any, sums: Dict[str, Any], dh_emission_kg_per_mwh: Any) -> Dict[str, Any]:
+    """Thermal KPIs from series sums (floats, or per-configuration arrays).
+
+    Heat delivered by the PV-driven HP chain displaces DH heat at zero
+    operating emissions, so it counts as avoided DH emissions (paper, scenario 4).
+    """
+    delivered = sums['hp_to_heat_mwh'] + sums['tes_to_heat_mwh']
+    return {
+        'heat_demand_mwh': heat_demand_mwh,
+        'hp_electricity_mwh': sums['pv_to_hp_mwh'],
+        'hp_heat_mwh': sums['hp_to_heat_mwh'] + sums['hp_to_tes_mwh'],
+        'tes_discharge_mwh': sums['tes_to_heat_mwh'],
+        'dh_mwh': sums['dh_mwh'],
+        'avoided_emissions_kg': delivered * dh_emission_kg_per_mwh,
+    }
+
+
+def merit_kpis(
+    cfg: MeritOrderConfig,
+    sums: Dict[str, float],
+    total_gen_mwh: float,
+    total_demand_mwh: float,
+    stats: GridStats,
+    heat_demand_mwh: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Merit-order KPIs from per-series sums (MWh) and the grid statistics."""
+    grid_import_mwh = sums['grid_import_mwh']
+    limits = {name: sums.get(name, 0.0) for name in _GRID_SERIES_NAMES}
+    thermal = {}
+    if heat_demand_mwh is not None:
+        thermal = thermal_kpis(heat_demand_mwh, sums, float(cfg.dh_emission_kg_per_mwh))
+    return {
+        'total_gen_mwh': total_gen_mwh,
+        'total_demand_mwh': total_demand_mwh,
+        'ped_absolute_mwh': total_gen_mwh - total_demand_mwh,
+        'ped_ratio': float(total_gen_mwh / (total_demand_mwh + 1e-9)),
+        'self_consumption_mwh': sums['pv_to_load_mwh'],
+        'export_mwh': sums['pv_export_mwh'],
+        'battery_throughput_mwh': sums['pv_to_batt_mwh'] + sums['batt_to_load_mwh'],
+        'grid_import_mwh': grid_import_mwh,
+        **grid_kpis(total_demand_mwh, grid_import_mwh, limits, stats, float(cfg.transformer_efficiency)),
+        **thermal,
+    }
+
+
+def downsample_series(series: Dict[str, np.ndarray], points: int) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Reduce each series to at most ``points`` buckets of (nearly) equal length.
+
+    Energies are summed per bucket and storage levels (``*soc_mwh``)
+    averaged, so totals are preserved. Returns the series and the number of
+    steps in each bucket.
+    """
+    n = len(next(iter(series.values()))) if series else 0
+    buckets = max(1, min(int(points), n))
+    starts = -(-np.arange(buckets) * n // buckets)
+    counts = np.diff(np.append(starts, n))
+    out = {}
+    for name, values in series.items():
+        sums = np.add.reduceat(np.asarray(values, dtype=np.float64), starts) if n else np.zeros(buckets)
+        if name.endswith('soc_mwh'):
+            sums /= np.maximum(counts, 1)
+        out[name] = sums.astype(np.asarray(values).dtype, copy=False)
+    return out, counts
+
+
+def _clamp_walk(start: np.ndarray, steps: np.ndarray, upper: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluate ``x <- clip(x + steps[:, r], 0, upper)`` over all ``r`` at once.
+
+    Each update is a clamp-shift map ``clip(x + a, lo, hi)``; such maps are
+    closed under composition, so a log-depth prefix scan over the run axis
+    replaces the sequential recurrence. Returns the state before every run
+    (K, R) and the final state (K,).
+    """
+    a = steps.copy()
+    lo = np.zeros_like(steps)
+    hi = np.repeat(upper[:, None], steps.shape[1], axis=1)
+    shift = 1
+    while shift < steps.shape[1]:
+        # Compose run r with the maps already folded into run r - shift.
+        ga, glo, ghi = a[:, shift:], lo[:, shift:], hi[:, shift:]
+        new_lo = np.minimum(np.maximum(lo[:, :-shift] + ga, glo), ghi)
+        new_hi = np.minimum(np.maximum(hi[:, :-shift] + ga, glo), ghi)
+        a[:, shift:] = a[:, :-shift] + ga
+        lo[:, shift:] = new_lo
+        hi[:, shift:] = new_hi
+        shift *= 2
+    after = np.minimum(np.maximum(start[:, None] + a, lo), hi)
+    before = np.concatenate((start[:, None], after[:, :-1]), axis=1)
+    return before, after[:, -1]
+
+
+def _decay_walk(start: np.ndarray, keep: np.ndarray, steps: np.ndarray, upper: np.ndarray, chunk: int = 32) -> np.ndarray:
+    """Evaluate ``x <- clip(keep * x + steps[:, t], 0, upper)`` over all ``t``.
+
+    The lossy-store form of :func:`_clamp_walk`: maps ``clip(m * x + a, lo, hi)``
+    are closed under composition too, but the standing loss couples every
+    step, so runs cannot be collapsed. Instead the steps are cut into chunks:
+    each chunk's map is composed step by step for all chunks at once, the
+    chunk maps are chained to get every chunk's start, and the chunks are
+    replayed from there. That is linear work with ``~3 * chunk`` vector
+    operations per call. Returns the state after every step (K, L).
+    """
+    k, n = steps.shape
+    count = -(-n // chunk)
+    padded = np.zeros((k, count * chunk))
+    padded[:, :n] = steps
+    padded = padded.reshape(k, count, chunk)
+    m = keep[:, None]
+    cap = upper[:, None]
+    # Map of each chunk (starting as the identity on [0, upper]).
+    a = np.zeros((k, count))
+    lo = np.zeros((k, count))
+    hi = np.repeat(cap, count, axis=1)
+    for j in range(chunk):
+        step = padded[:, :, j]
+        a = m * a + step
+        lo = np.minimum(np.maximum(m * lo + step, 0.0), cap)
+        hi = np.minimum(np.maximum(m * hi + step, 0.0), cap)
+    # State at the start of every chunk.
+    m_chunk = keep ** chunk
+    x = start.copy()
+    first = np.empty((k, count))
+    for c in range(count):
+        first[:, c] = x
+        x = np.minimum(np.maximum(m_chunk * x + a[:, c], lo[:, c]), hi[:, c])
+    # Replay each chunk from its start.
+    levels = np.empty_like(padded)
+    x = first
+    for j in range(chunk):
+        x = np.minimum(np.maximum(m * x + padded[:, :, j], 0.0), cap)
+        levels[:, :, j] = x
+    return levels.reshape(k, -1)[:, :n]
+
+
+def _fill(budget: np.ndarray, want: np.ndarray, starts: np.ndarray, run_id: np.ndarray) -> np.ndarray:
+    """Grant ``want`` step by step from a per-run ``budget`` until it runs out.
+
+    Equivalent to ``take_t = min(want_t, budget); budget -= take_t`` within
+    each run, written as a clamped prefix sum. Shapes: ``budget`` (K, R),
+    ``want`` (K, L); ``starts`` are run start columns, ``run_id`` maps each
+    column to its run.
+    """
+    before = np.cumsum(want, axis=1)
+    before -= want
+    take = (budget + before[:, starts])[:, run_id]
+    take -= before
+    np.maximum(take, 0.0, out=take)
+    return np.minimum(take, want, out=take)
+
+
+def _above(values: np.ndarray, eps: float = 1e-12) -> np.ndarray:
+    return np.where(values > eps, values, 0.0)
+
+
+class BatchMeritOrderOptimizer:
+    """Merit-order dispatch for many configurations in one pass.
+
+    Follows the same PV -> Load > DSM > Battery > Export / DSM > Battery >
+    Grid order as :class:`MeritOrderOptimizer`, vectorised across the
+    configuration axis. Time is still walked in order, but a run of
+    consecutive surplus (or deficit) steps only fills (or only drains) the
+    stores, so each store's state at run boundaries follows a clamped random
+    walk (solved by a prefix scan) and the per-step amounts within a run are
+    clamped prefix sums. Steps are processed in blocks of ``block_steps`` to
+    bound memory. Results match the scalar loop to rounding.
+
+    With a heat demand the thermal stage is included; the heat pump
+    (``hp_power_mw``, ``hp_cop``, ``heat_load_ratio``) must then be shared,
+    while the TES parameters may vary. The TES standing loss is handled by a
+    per-step scan. Grid limits cap export and import after the stores, so
+    they only split those flows into curtailment and unserved load.
+    """
+
+    def __init__(self, configs: Sequence[MeritOrderConfig], block_steps: Optional[int] = None):
+        if not configs:
+            raise ValueError("at least one configuration is required")
+        dts = {float(cfg.dt_hours) for cfg in configs}
+        if len(dts) != 1:
+            raise ValueError("all configurations must share dt_hours")
+        scales = {float(cfg.pv_scale) for cfg in configs}
+        if len(scales) != 1:
+            raise ValueError("all configurations must share pv_scale")
+        self.configs = list(configs)
+        self.dt = dts.pop()
+        self.pv_scale = scales.pop()
+        # Keep each (configs x steps) working array cache-sized (~64k cells).
+        self.block_steps = int(block_steps or max(1024, (1 << 16) // len(self.configs)))
+
+    @classmethod
+    def from_arrays(cls, dt_hours: float, **params: Any) -> "BatchMeritOrderOptimizer":
+        """Build configurations from broadcastable arrays of ``MeritOrderConfig`` fields.
+
+        Example: ``from_arrays(1/6, battery_energy_mwh=np.linspace(0, 50, 32))``.
+        """
+        known = {f.name for f in fields(MeritOrderConfig)} - {'dt_hours'}
+        unknown = set(params) - known
+        if unknown:
+            raise ValueError(f"unknown config fields: {sorted(unknown)}")
+        names = list(params)
+        columns = np.broadcast_arrays(*[np.atleast_1d(np.asarray(params[name])) for name in names]) if names else [np.zeros(1)]
+        configs = [
+            MeritOrderConfig(dt_hours=dt_hours, **{name: column.ravel()[i].item() for name, column in zip(names, columns)})
+            for i in range(columns[0].size)
+        ]
+        return cls(configs)
+
+    def _param(self, name: str) -> np.ndarray:
+        return np.array([float(getattr(cfg, name)) for cfg in self.configs])
+
+    def run(
+        self,
+        pv_mw: np.ndarray,
+        load_mw: np.ndarray,
+        return_series: bool = False,
+        peak_load_mw: Optional[float] = None,
+        heat_mw: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
+        """Dispatch every configuration over the same profiles.
+
+        Returns ``kpis`` as a (configs x len(KPI_NAMES)) matrix with column
+        names in ``kpi_names`` and, with ``return_series=True``, each series
+        of the scalar optimizer stacked to shape (configs x steps). DSM power
+        is sized from ``peak_load_mw`` (default: the peak of ``load_mw``).
+        A heat demand (``heat_mw``, or the configurations' heat pump, as in
+        ``MeritOrderOptimizer.heat_demand``) adds the thermal series and
+        ``THERMAL_KPI_NAMES`` columns.
+        """
+        pv_mw = np.asarray(pv_mw)
+        load_mw = np.asarray(load_mw)
+        if pv_mw.shape != load_mw.shape:
+            raise ValueError("pv and load must have same length")
+        if self.pv_scale != 1.0:
+            pv_mw = pv_mw.astype(np.float64) * self.pv_scale
+
+        n = len(pv_mw)
+        k = len(self.configs)
+        dt = self.dt
+        e_cap = np.maximum(0.0, self._param('battery_energy_mwh'))
+        p_cap = e_cap * np.maximum(0.0, self._param('battery_c_rate'))
+        eta_c = np.maximum(self._param('eta_charge'), 1e-9)[:, None]
+        eta_d = np.maximum(self._param('eta_discharge'), 1e-9)[:, None]
+        batt_step = np.where((e_cap > 1e-9) & (p_cap > 1e-9), p_cap * dt, 0.0)[:, None]
+
+        flex = np.clip(self._param('flexible_load_share'), 0.0, 1.0)
+        if peak_load_mw is None:
+            peak_load_mw = float(np.max(load_mw)) if n else 0.0
+        max_power = float(peak_load_mw) * flex
+        dsm_cap = max_power * np.maximum(0.0, self._param('max_shift_hours'))
+        dsm_step = np.where((dsm_cap > 1e-9) & (max_power > 1e-9), max_power * dt, 0.0)[:, None]
+
+        # PV -> Load does not depend on any store, so it is done for all steps at once.
+        pv_e = np.maximum(0.0, pv_mw.astype(np.float64) * dt)
+        load_e = np.maximum(0.0, load_mw.astype(np.float64) * dt)
+        thermal = heat_mw is not None or any(cfg.thermal for cfg in self.configs)
+        if thermal:
+            limits = [thermal_limits(cfg) for cfg in self.configs]
+            shared = {(hp, cop, float(cfg.heat_load_ratio)) for cfg, (hp, cop, *_) in zip(self.configs, limits)}
+            if len(shared) != 1:
+                raise ValueError("all configurations must share hp_power_mw, hp_cop and heat_load_ratio")
+            heat_mw = np.asarray(MeritOrderOptimizer(self.configs[0]).heat_demand(load_mw, heat_mw))
+            if heat_mw.shape != pv_mw.shape:
+                raise ValueError("heat and pv must have same length")
+            hp_step, cop = limits[0][:2]
+            tes_cap, tes_step, tes_keep = (np.array(column) for column in list(zip(*limits))[2:])
+            eta_tc = np.maximum(self._param('tes_eta_charge'), 1e-9)[:, None]
+            eta_td = np.maximum(self._param('tes_eta_discharge'), 1e-9)[:, None]
+            # PV -> HP -> Heat comes first and is the same for every configuration.
+            heat_e = np.maximum(0.0, heat_mw.astype(np.float64) * dt)
+            hp_el = _above(np.minimum(np.minimum(pv_e, hp_step), heat_e / cop))
+            pv_e = pv_e - hp_el
+            heat_rem = heat_e - hp_el * cop
+            hp_room = hp_step - hp_el
+            tes_soc = np.zeros(k)
+        use = np.minimum(pv_e, load_e)
+        charging = (pv_e - use) > 1e-12
+        # Energy each step offers to the stores: PV surplus, or unmet load.
+        residual = np.where(charging, pv_e - use, _above(load_e - use))
+
+        steps = [cfg.grid_steps() for cfg in self.configs]
+        import_step = np.array([imp for imp, _ in steps])[:, None]
+        export_step = np.array([exp for _, exp in steps])[:, None]
+        limited = any(cfg.grid_limited for cfg in self.configs)
+        eta_tr = np.maximum(self._param('transformer_efficiency'), 1e-9)
+        stats = GridStats(n, np.zeros(k), np.zeros(k), np.zeros((k, _HIST_BINS), dtype=np.int64))
+
+        soc = np.zeros(k)
+        dsm_soc = np.zeros(k)
+        totals = {
+            name: np.zeros(k)
+            for name in ('pv_to_batt_mwh', 'pv_export_mwh', 'batt_to_load_mwh', 'grid_import_mwh', *_GRID_SERIES_NAMES)
+        }
+        names = (*_SERIES_NAMES, *(_GRID_SERIES_NAMES if limited else ()), *(THERMAL_SERIES_NAMES if thermal else ()))
+        series = {name: np.zeros((k, n)) for name in names} if return_series else None
+        if series is not None:
+            series['pv_to_load_mwh'][:] = use
+        if thermal:
+            totals.update({name: np.zeros(k) for name in ('hp_to_tes_mwh', 'tes_to_heat_mwh', 'dh_mwh')})
+            if series is not None:
+                series['hp_to_heat_mwh'][:] = hp_el * cop
+
+        for lo in range(0, n, self.block_steps):
+            hi = min(lo + self.block_steps, n)
+            up = charging[lo:hi]
+            starts = np.flatnonzero(np.diff(up, prepend=not up[0]))
+            run_id = np.cumsum(np.diff(up, prepend=up[0]) != 0)
+            run_up = up[starts]
+
+            # DSM store: fills from surplus first, drains into unmet load first.
+            want = np.minimum(dsm_step, residual[lo:hi])
+            moved = np.add.reduceat(want, starts, axis=1)
+            before, dsm_soc = _clamp_walk(dsm_soc, np.where(run_up, moved, -moved), dsm_cap)
+            dsm = _fill(np.where(run_up, dsm_cap[:, None] - before, before), want, starts, run_id)
+            rest = residual[lo:hi] - dsm
+
+            if thermal:
+                # TES: fills through the HP capacity left from surplus PV, drains
+                # into the heat the HP could not cover (never both in one step).
+                tes_in = np.minimum(np.minimum(rest, hp_room[lo:hi]), (tes_step / cop)[:, None])
+                tes_in = np.where(up & (rest > 1e-12), tes_in, 0.0)
+                tes_want = np.minimum(_above(heat_rem[lo:hi]), tes_step[:, None])
+                level = _decay_walk(tes_soc, tes_keep, tes_in * cop * eta_tc - tes_want / eta_td, tes_cap)
+                change = level - tes_keep[:, None] * np.concatenate((tes_soc[:, None], level[:, :-1]), axis=1)
+                tes_soc = level[:, -1]
+                to_tes = _above(np.maximum(change, 0.0) / eta_tc)
+                from_tes = _above(np.maximum(-change, 0.0) * eta_td)
+                rest = rest - to_tes / cop
+                dh = _above(heat_rem[lo:hi] - from_tes)
+                totals['hp_to_tes_mwh'] += to_tes.sum(axis=1)
+                totals['tes_to_heat_mwh'] += from_tes.sum(axis=1)
+                totals['dh_mwh'] += dh.sum(axis=1)
+                if series is not None:
+                    series['pv_to_hp_mwh'][:, lo:hi] = hp_el[lo:hi] + to_tes / cop
+                    series['hp_to_tes_mwh'][:, lo:hi] = to_tes
+                    series['tes_to_heat_mwh'][:, lo:hi] = from_tes
+                    series['tes_soc_mwh'][:, lo:hi] = level
+                    series['dh_mwh'][:, lo:hi] = dh
+
+            # Battery: charges from what the DSM left, discharges after it.
+            want = np.where(rest > 1e-12, np.minimum(batt_step, rest), 0.0)
+            moved = np.add.reduceat(want, starts, axis=1)
+            eta_run_c = np.broadcast_to(eta_c, moved.shape)
+            eta_run_d = np.broadcast_to(eta_d, moved.shape)
+            before, soc = _clamp_walk(soc, np.where(run_up, moved * eta_run_c, -moved / eta_run_d), e_cap)
+            budget = np.where(run_up, (e_cap[:, None] - before) / eta_run_c, before * eta_run_d)
+            batt = _above(_fill(budget, want, starts, run_id))
+            dsm = _above(dsm)
+            rest = _above(rest - batt)
+
+            to_batt = np.where(up, batt, 0.0)
+            from_batt = batt - to_batt
+            export = np.where(up, rest, 0.0)
+            grid = rest - export
+            if limited:
+                capped = np.minimum(export, export_step)
+                curtail, export = export - capped, capped
+                capped = np.minimum(grid, import_step)
+                unserved, grid = grid - capped, capped
+                totals['pv_curtail_mwh'] += curtail.sum(axis=1)
+                totals['unserved_mwh'] += unserved.sum(axis=1)
+                if series is not None:
+                    series['pv_curtail_mwh'][:, lo:hi] = curtail
+                    series['unserved_mwh'][:, lo:hi] = unserved
+            import_mw = grid / (dt * eta_tr[:, None])
+            np.maximum(stats.peak_import_mw, import_mw.max(axis=1), out=stats.peak_import_mw)
+            np.maximum(stats.peak_export_mw, export.max(axis=1) / dt, out=stats.peak_export_mw)
+            bins = _power_bins(import_mw) + (np.arange(k) * _HIST_BINS)[:, None]
+            stats.import_hist += np.bincount(bins.ravel(), minlength=k * _HIST_BINS).reshape(k, _HIST_BINS)
+            totals['pv_to_batt_mwh'] += to_batt.sum(axis=1)
+            totals['batt_to_load_mwh'] += from_batt.sum(axis=1)
+            totals['pv_export_mwh'] += export.sum(axis=1)
+            totals['grid_import_mwh'] += grid.sum(axis=1)
+            if series is not None:
+                series['pv_to_batt_mwh'][:, lo:hi] = to_batt
+                series['batt_to_load_mwh'][:, lo:hi] = from_batt
+                series['pv_export_mwh'][:, lo:hi] = export
+                series['grid_import_mwh'][:, lo:hi] = grid
+                series['dsm_charge_mwh'][:, lo:hi] = np.where(up, dsm, 0.0)
+                series['dsm_discharge_mwh'][:, lo:hi] = np.where(up, 0.0, dsm)
 
         total_gen_mwh = float(np.sum(pv_mw) * dt)
         total_demand_mwh = float(np.sum(load_mw) * dt)
-        ped_abs = total_gen_mwh - total_demand_mwh
-        ped_ratio = float(total_gen_mwh / (total_demand_mwh + 1e-9))
+        ones = np.ones(k)
+        kpis = np.column_stack([
+            ones * total_gen_mwh,
+            ones * total_demand_mwh,
+            ones * (total_gen_mwh - total_demand_mwh),
+            ones * float(total_gen_mwh / (total_demand_mwh + 1e-9)),
+            ones * float(np.sum(use)),
+            totals['pv_export_mwh'],
+            totals['pv_to_batt_mwh'] + totals['batt_to_load_mwh'],
+            totals['grid_import_mwh'],
+        ])
+        grid = grid_kpis(total_demand_mwh, totals['grid_import_mwh'], totals, stats, eta_tr)
+        kpis = np.column_stack([kpis, *(ones * grid[name] for name in KPI_NAMES[kpis.shape[1]:])])
+        kpi_names = list(KPI_NAMES)
+        if thermal:
+            direct = float(np.sum(hp_el))
+            sums = {
+                'pv_to_hp_mwh': direct + totals['hp_to_tes_mwh'] / cop,
+                'hp_to_heat_mwh': ones * direct * cop,
+                **{name: totals[name] for name in ('hp_to_tes_mwh', 'tes_to_heat_mwh', 'dh_mwh')},
+            }
+            extra = thermal_kpis(ones * float(np.sum(heat_e)), sums, self._param('dh_emission_kg_per_mwh'))
+            kpis = np.column_stack([kpis, *(extra[name] for name in THERMAL_KPI_NAMES)])
+            kpi_names += THERMAL_KPI_NAMES
+        result: Dict[str, Any] = {'kpi_names': kpi_names, 'kpis': kpis, 'dt_hours': dt}
+        if series is not None:
+            result['series_mwh'] = series
+        return result
 
-        return {
-            'series_mwh': {
-                'pv_to_load_mwh': pv_to_load,
-                'pv_to_batt_mwh': pv_to_batt,
-                'pv_export_mwh': pv_export,
-                'batt_to_load_mwh': batt_to_load,
-                'grid_import_mwh': grid_import,
-                'dsm_charge_mwh': dsm_charge,
-                'dsm_discharge_mwh': dsm_discharge,
-            },
-            'kpis': {
-                'total_gen_mwh': total_gen_mwh,
-                'total_demand_mwh': total_demand_mwh,
-                'ped_absolute_mwh': ped_abs,
-                'ped_ratio': ped_ratio,
-                'self_consumption_mwh': float(np.sum(pv_to_load)),
-                'export_mwh': float(np.sum(pv_export)),
-                'battery_throughput_mwh': float(np.sum(pv_to_batt) + np.sum(batt_to_load)),
-                'grid_import_mwh': float(np.sum(grid_import)),
-            },
+
+class IncrementalMeritOrder:
+    """Resumable merit-order dispatch of a growing series.
+
+    Keeps the storage levels, the series produced so far (in amortised
+    buffers) and running KPI sums, so ``advance`` only dispatches steps that
+    were not seen before. The DSM power limit uses a fixed ``peak_load_mw``
+    (the peak of the whole series) so that dispatching in pieces gives the
+    same result as one pass. Use ``matches`` to detect when the
+    configuration or peak changed and the state must be rebuilt. A
+    configuration with a heat pump also dispatches the thermal stage. Grid
+    peaks and quantiles are kept as streaming :class:`GridStats`.
+    ``keep_series=False`` keeps only the storage levels and sums, so memory
+    does not grow with the steps dispatched (see ``backend.streaming``).
+    """
+
+    def __init__(self, cfg: MeritOrderConfig, peak_load_mw: float, keep_series: bool = True):
+        self.cfg = replace(cfg)
+        self.keep_series = keep_series
+        self.peak_load_mw = float(peak_load_mw)
+        self.thermal = self.cfg.thermal
+        self.steps = 0
+        self.state = DispatchState()
+        self.grid = GridStats()
+        self._optimizer = MeritOrderOptimizer(self.cfg)
+        names = (
+            *_SERIES_NAMES,
+            *(_GRID_SERIES_NAMES if self.cfg.grid_limited else ()),
+            *(THERMAL_SERIES_NAMES if self.thermal else ()),
+        )
+        self._series = {name: GrowableArray(np.float64) for name in names} if keep_series else {}
+        self._sums = {name: 0.0 for name in (*names, *_GRID_SERIES_NAMES, 'pv_mw', 'load_mw', 'heat_mw')}
+
+    def matches(self, cfg: MeritOrderConfig, peak_load_mw: float) -> bool:
+        return cfg == self.cfg and float(peak_load_mw) == self.peak_load_mw
+
+    def snapshot(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """``(arrays, meta)`` that ``restore`` turns back into this state."""
+        arrays = {name: array.values for name, array in self._series.items()}
+        arrays['grid_import_hist'] = self.grid.import_hist
+        meta = {
+            'steps': self.steps,
+            'soc': self.state.soc,
+            'dsm_soc': self.state.dsm_soc,
+            'tes_soc': self.state.tes_soc,
+            'peak_import_mw': self.grid.peak_import_mw,
+            'peak_export_mw': self.grid.peak_export_mw,
+            'sums': dict(self._sums),
+        }
+        return arrays, meta
+
+    @classmethod
+    def restore(
+        cls, cfg: MeritOrderConfig, peak_load_mw: float, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]
+    ) -> "IncrementalMeritOrder":
+        """Resume from a ``snapshot`` taken with the same config and peak."""
+        inc = cls(cfg, peak_load_mw)
+        for name, array in inc._series.items():
+            array.append(arrays[name])
+        inc._sums.update({name: float(value) for name, value in meta['sums'].items()})
+        inc.state = DispatchState(
+            soc=float(meta['soc']), dsm_soc=float(meta['dsm_soc']), tes_soc=float(meta.get('tes_soc', 0.0))
+        )
+        inc.steps = int(meta['steps'])
+        inc.grid = GridStats(
+            inc.steps,
+            float(meta['peak_import_mw']),
+            float(meta['peak_export_mw']),
+            np.array(arrays['grid_import_hist'], dtype=np.int64),
+        )
+        return inc
+
+    def advance(self, pv_mw: np.ndarray, load_mw: np.ndarray, heat_mw: Optional[np.ndarray] = None) -> int:
+        """Dispatch the steps that follow the ones already processed.
+
+        ``pv_mw``/``load_mw`` (and an explicit ``heat_mw`` for a thermal
+        configuration) hold only the new steps. Returns how many were added.
+        """
+        if pv_mw.shape != load_mw.shape:
+            raise ValueError("pv and load must have same length")
+        self.advance_chunk(pv_mw, load_mw, heat_mw)
+        return len(pv_mw)
+
+    def advance_chunk(
+        self, pv_mw: np.ndarray, load_mw: np.ndarray, heat_mw: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """Like ``advance``, but return the series (MWh) of the new steps."""
+        if pv_mw.shape != load_mw.shape:
+            raise ValueError("pv and load must have same length")
+        if heat_mw is not None and not self.thermal:
+            raise ValueError("heat_mw needs a configuration with a heat pump")
+        n = len(pv_mw)
+        if n == 0:
+            return {}
+        pv_mw = self._optimizer.scaled_pv(pv_mw)
+        heat_mw = self._optimizer.heat_demand(load_mw, heat_mw)
+        series = self._optimizer._dispatch(
+            pv_mw, load_mw, self.state, peak_load_mw=self.peak_load_mw, heat_mw=heat_mw, stats=self.grid
+        )
+        for name, values in series.items():
+            if self.keep_series:
+                self._series[name].append(values)
+            self._sums[name] += float(np.sum(values))
+        self._sums['pv_mw'] += float(np.sum(pv_mw, dtype=np.float64))
+        self._sums['load_mw'] += float(np.sum(load_mw, dtype=np.float64))
+        if heat_mw is not None:
+            self._sums['heat_mw'] += float(np.sum(np.maximum(heat_mw, 0.0), dtype=np.float64))
+        self.steps += n
+        return series
+
+    def result(self) -> Dict[str, Any]:
+        """Series (unless not kept) and KPIs for all steps so far, shaped like ``MeritOrderOptimizer.run``."""
+        dt = float(self.cfg.dt_hours)
+        heat_demand_mwh = self._sums['heat_mw'] * dt if self.thermal else None
+        result: Dict[str, Any] = {
+            'kpis': merit_kpis(
+                self.cfg, self._sums, self._sums['pv_mw'] * dt, self._sums['load_mw'] * dt, self.grid, heat_demand_mwh
+            ),
             'dt_hours': dt,
         }
+        if self.keep_series:
+            result['series_mwh'] = {name: array.values for name, array in self._series.items()}
+        return result
 
 
-def build_config_from_overrides(overrides: Optional[Dict[str, Any]], default_dt_hours: float) -> MeritOrderConfig:
+# Scenario override key -> MeritOrderConfig field (thermal stage, grid connection)
+_OVERRIDE_FIELDS = {
+    'hp_power_mw': 'hp_power_mw',
+    'hp_cop': 'hp_cop',
+    'tes_capacity_mwh': 'tes_energy_mwh',
+    'tes_power_c_rate': 'tes_c_rate',
+    'tes_eta_charge': 'tes_eta_charge',
+    'tes_eta_discharge': 'tes_eta_discharge',
+    'tes_loss_per_hour': 'tes_loss_per_hour',
+    'dh_emission_factor': 'dh_emission_kg_per_mwh',
+    'heat_load_ratio': 'heat_load_ratio',
+    'grid_import_limit_mw': 'grid_import_limit_mw',
+    'grid_export_limit_mw': 'grid_export_limit_mw',
+    'transformer_efficiency': 'transformer_efficiency',
+}
+
+
+def build_config_from_overrides(
+    overrides: Optional[Dict[str, Any]],
+    default_dt_hours: float,
+    solar_reference_mw: Optional[float] = None,
+) -> MeritOrderConfig:
+    """Map scenario overrides onto a dispatch configuration.
+
+    ``owned_solar_capacity_mw`` only rescales PV when ``solar_reference_mw``
+    (the installed capacity the PV series represents) is given.
+    """
     cfg = MeritOrderConfig(dt_hours=default_dt_hours)
     if not overrides:
         return cfg
@@ -156,4 +1155,9 @@ def build_config_from_overrides(overrides: Optional[Dict[str, Any]], default_dt_
         cfg.flexible_load_share = float(overrides['flexible_load_share'])
     if 'max_shift_hours' in overrides:
         cfg.max_shift_hours = float(overrides['max_shift_hours'])
+    for key, name in _OVERRIDE_FIELDS.items():
+        if key in overrides:
+            setattr(cfg, name, None if overrides[key] is None else float(overrides[key]))
+    if solar_reference_mw and 'owned_solar_capacity_mw' in overrides:
+        cfg.pv_scale = float(overrides['owned_solar_capacity_mw']) / float(solar_reference_mw)
     return cfg
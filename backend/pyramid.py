@@ -0,0 +1,320 @@
+"""Precomputed multi-resolution aggregates (time pyramids) for datasets.
+
+Each level groups consecutive rows into buckets (hour, day, month) and keeps
+``sum``, ``mean``, ``min`` and ``max`` per column, so chart and KPI endpoints
+can serve coarse resolutions without re-aggregating every raw row. Buckets
+never straddle a change of the ``scenario`` column, and each level is built
+from the one below it (10-min -> hourly -> daily -> monthly).
+
+Sums are in the column's unit times rows (MW-steps); multiply by the step
+length in hours to obtain MWh.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+
+RAW = "raw"
+RESOLUTIONS = (RAW, "hourly", "daily", "monthly")
+PYRAMID_COLUMNS = ("wind", "solar", "hydro", "load", "price")
+_STATS = ("sum", "mean", "min", "max")
+# Nominal bucket length, used as the step of dispatches run on a level.
+BUCKET_HOURS = {"hourly": 1.0, "daily": 24.0, "monthly": 730.5}
+_DEFAULT_STEP_SECONDS = 600
+
+
+@dataclass
+class PyramidLevel:
+    """Buckets of one resolution; bucket ``i`` covers rows ``offsets[i]:offsets[i + 1]``."""
+
+    name: str
+    offsets: np.ndarray
+    start: np.ndarray  # epoch seconds of each bucket's first row
+    count: np.ndarray
+    stats: Dict[str, Dict[str, np.ndarray]]
+    _prefix: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+
+    def __len__(self) -> int:
+        return int(len(self.count))
+
+    def complete_buckets(self, upto: int) -> int:
+        """Number of leading buckets whose rows all lie before row ``upto``."""
+        return int(np.searchsorted(self.offsets[1:], upto, side="right"))
+
+    def prefix_sum(self, column: str) -> np.ndarray:
+        """Cumulative bucket sums (with a leading zero), computed on first use."""
+        prefix = self._prefix.get(column)
+        if prefix is None:
+            prefix = np.concatenate(([0.0], np.cumsum(self.stats[column]["sum"])))
+            self._prefix[column] = prefix
+        return prefix
+
+
+@dataclass
+class TimePyramid:
+    """All aggregation levels of a dataset plus the native step length."""
+
+    step_seconds: float
+    rows: int
+    levels: Dict[str, PyramidLevel]
+
+    @property
+    def step_hours(self) -> float:
+        return self.step_seconds / 3600.0
+
+    def level(self, resolution: str) -> PyramidLevel:
+        if resolution not in self.levels:
+            raise ValueError(f"Unknown resolution {resolution!r}; expected one of {', '.join(RESOLUTIONS)}")
+        return self.levels[resolution]
+
+    def total(self, column: str, upto: int, raw: np.ndarray, resolution: str = "hourly") -> float:
+        """Sum of ``column`` over rows ``[0, upto)`` from prefix sums plus a raw remainder."""
+        level = self.level(resolution)
+        complete = level.complete_buckets(upto)
+        head = float(level.prefix_sum(column)[complete])
+        tail_start = int(level.offsets[complete])
+        return head + float(np.sum(raw[tail_start:upto], dtype=np.float64))
+
+
+def epoch_seconds(frame: pd.DataFrame) -> np.ndarray:
+    """Row timestamps as int64 epoch seconds (synthetic 10-min steps if absent)."""
+    if "timestamp" in frame.columns:
+        values = frame["timestamp"].to_numpy()
+        if np.issubdtype(values.dtype, np.datetime64):
+            return values.astype("datetime64[s]").astype(np.int64)
+        if np.issubdtype(values.dtype, np.integer):
+            return values.astype(np.int64, copy=False)
+    return np.arange(len(frame), dtype=np.int64) * _DEFAULT_STEP_SECONDS
+
+
+def _bucket_keys(name: str, epoch: np.ndarray) -> np.ndarray:
+    if name == "hourly":
+        return epoch // 3600
+    if name == "daily":
+        return epoch // 86400
+    months = epoch.astype("datetime64[s]").astype("datetime64[M]")
+    return months.astype(np.int64)
+
+
+def _boundaries(keys: np.ndarray, partitions: Optional[np.ndarray]) -> np.ndarray:
+    change = keys[1:] != keys[:-1]
+    if partitions is not None:
+        change |= partitions[1:] != partitions[:-1]
+    return np.concatenate(([0], np.flatnonzero(change) + 1))
+
+
+def _infer_step_seconds(epoch: np.ndarray) -> float:
+    if len(epoch) < 2:
+        return float(_DEFAULT_STEP_SECONDS)
+    diffs = np.diff(epoch)
+    diffs = diffs[diffs > 0]
+    return float(np.median(diffs)) if diffs.size else float(_DEFAULT_STEP_SECONDS)
+
+
+def build_pyramid(
+    epoch: np.ndarray,
+    columns: Dict[str, np.ndarray],
+    partitions: Optional[np.ndarray] = None,
+    step_seconds: Optional[float] = None,
+) -> TimePyramid:
+    """Aggregate ``columns`` into hourly, daily and monthly buckets.
+
+    ``step_seconds`` is the native step, normally the dataset profile's;
+    without it the median spacing of ``epoch`` is used.
+    """
+    n = len(epoch)
+    levels: Dict[str, PyramidLevel] = {}
+    previous: Optional[PyramidLevel] = None
+    for name in RESOLUTIONS[1:]:
+        starts = _boundaries(_bucket_keys(name, epoch), partitions) if n else np.zeros(0, dtype=np.int64)
+        offsets = np.append(starts, n).astype(np.int64)
+        stats: Dict[str, Dict[str, np.ndarray]] = {}
+        if previous is None:
+            count = np.diff(offsets)
+            for column, values in columns.items():
+                values = np.asarray(values)
+                stats[column] = {
+                    "sum": np.add.reduceat(values, starts, dtype=np.float64) if n else np.zeros(0),
+                    "min": np.minimum.reduceat(values, starts).astype(np.float64) if n else np.zeros(0),
+                    "max": np.maximum.reduceat(values, starts).astype(np.float64) if n else np.zeros(0),
+                }
+        else:
+            # Coarser boundaries are a subset of finer ones: reduce bucket-wise.
+            index = np.searchsorted(previous.offsets, starts)
+            count = np.add.reduceat(previous.count, index) if n else np.zeros(0, dtype=np.int64)
+            for column, lower in previous.stats.items():
+                stats[column] = {
+                    "sum": np.add.reduceat(lower["sum"], index) if n else np.zeros(0),
+                    "min": np.minimum.reduceat(lower["min"], index) if n else np.zeros(0),
+                    "max": np.maximum.reduceat(lower["max"], index) if n else np.zeros(0),
+                }
+        for column_stats in stats.values():
+            column_stats["mean"] = column_stats["sum"] / np.maximum(count, 1)
+        level = PyramidLevel(name=name, offsets=offsets, start=epoch[starts], count=count, stats=stats)
+        levels[name] = level
+        previous = level
+    if step_seconds is None:
+        step_seconds = _infer_step_seconds(epoch)
+    return TimePyramid(step_seconds=float(step_seconds), rows=n, levels=levels)
+
+
+def extend_pyramid(
+    pyramid: TimePyramid,
+    epoch: np.ndarray,
+    columns: Dict[str, np.ndarray],
+    partitions: Optional[np.ndarray] = None,
+) -> TimePyramid:
+    """Return ``pyramid`` updated for rows appended after ``pyramid.rows``.
+
+    ``epoch``, ``columns`` and ``partitions`` cover all rows, old and new.
+    Only the rows from the start of the last (possibly still open) coarsest
+    bucket onwards are re-aggregated; completed buckets and their prefix sums
+    are kept.
+    """
+    n = len(epoch)
+    if n <= pyramid.rows:
+        return pyramid
+    top = pyramid.levels[RESOLUTIONS[-1]]
+    if pyramid.rows == 0 or len(top) == 0:
+        return build_pyramid(epoch, columns, partitions, pyramid.step_seconds)
+    # Boundaries nest, so the last coarse bucket starts at a bucket boundary of every level.
+    origin = int(top.offsets[-2])
+    tail = build_pyramid(
+        epoch[origin:],
+        {name: values[origin:] for name, values in columns.items()},
+        None if partitions is None else partitions[origin:],
+        pyramid.step_seconds,
+    )
+    levels: Dict[str, PyramidLevel] = {}
+    for name, level in pyramid.levels.items():
+        keep = int(np.searchsorted(level.offsets, origin))
+        fresh = tail.levels[name]
+        stats = {
+            column: {
+                stat: np.concatenate((level.stats[column][stat][:keep], fresh.stats[column][stat]))
+                for stat in _STATS
+            }
+            for column in level.stats
+        }
+        prefix = {
+            column: np.concatenate((cached[: keep + 1], cached[keep] + np.cumsum(fresh.stats[column]["sum"])))
+            for column, cached in level._prefix.items()
+        }
+        levels[name] = PyramidLevel(
+            name=name,
+            offsets=np.concatenate((level.offsets[:keep], fresh.offsets + origin)),
+            start=np.concatenate((level.start[:keep], fresh.start)),
+            count=np.concatenate((level.count[:keep], fresh.count)),
+            stats=stats,
+            _prefix=prefix,
+        )
+    return TimePyramid(step_seconds=pyramid.step_seconds, rows=n, levels=levels)
+
+
+def pyramid_from_frame(
+    frame: pd.DataFrame, column_names: Iterable[str] = PYRAMID_COLUMNS, step_seconds: Optional[float] = None
+) -> TimePyramid:
+    columns = {name: frame[name].to_numpy() for name in column_names if name in frame.columns}
+    partitions = None
+    if "scenario" in frame.columns:
+        partitions, _ = pd.factorize(frame["scenario"], use_na_sentinel=True)
+    return build_pyramid(epoch_seconds(frame), columns, partitions, step_seconds)
+
+
+# ------------------------------------------------------------------
+# On-disk cache
+# ------------------------------------------------------------------
+def _flatten(pyramid: TimePyramid) -> Dict[str, np.ndarray]:
+    arrays: Dict[str, np.ndarray] = {
+        "meta": np.array([pyramid.step_seconds, pyramid.rows], dtype=np.float64),
+    }
+    for name, level in pyramid.levels.items():
+        arrays[f"{name}/offsets"] = level.offsets
+        arrays[f"{name}/start"] = level.start
+        arrays[f"{name}/count"] = level.count
+        for column, column_stats in level.stats.items():
+            for stat in _STATS:
+                arrays[f"{name}/{column}/{stat}"] = column_stats[stat]
+    return arrays
+
+
+def _unflatten(arrays: Dict[str, np.ndarray]) -> TimePyramid:
+    levels: Dict[str, PyramidLevel] = {}
+    for name in RESOLUTIONS[1:]:
+        stats: Dict[str, Dict[str, np.ndarray]] = {}
+        prefix = f"{name}/"
+        for key in arrays:
+            parts = key.split("/")
+            if key.startswith(prefix) and len(parts) == 3:
+                stats.setdefault(parts[1], {})[parts[2]] = arrays[key]
+        levels[name] = PyramidLevel(
+            name=name,
+            offsets=arrays[f"{name}/offsets"],
+            start=arrays[f"{name}/start"],
+            count=arrays[f"{name}/count"],
+            stats=stats,
+        )
+    step_seconds, rows = arrays["meta"].tolist()
+    return TimePyramid(step_seconds=float(step_seconds), rows=int(rows), levels=levels)
+
+
+def load_or_build_pyramid(
+    frame: pd.DataFrame, cache_file: Optional[Path], step_seconds: Optional[float] = None
+) -> TimePyramid:
+    """Return the pyramid for ``frame``, reusing ``cache_file`` when it matches."""
+    if cache_file is not None and cache_file.is_file():
+        try:
+            with np.load(cache_file, allow_pickle=False) as data:
+                pyramid = _unflatten({key: data[key] for key in data.files})
+            if pyramid.rows == len(frame) and (step_seconds is None or pyramid.step_seconds == step_seconds):
+                return pyramid
+        except (OSError, ValueError, KeyError):
+            pass
+    pyramid = pyramid_from_frame(frame, step_seconds=step_seconds)
+    if cache_file is not None:
+        tmp = cache_file.with_name(f".{cache_file.name}.{uuid4().hex}")
+        try:
+            with tmp.open("wb") as handle:
+                np.savez(handle, **_flatten(pyramid))
+            os.replace(tmp, cache_file)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+    return pyramid
+
+
+class PyramidHolder:
+    """Builds a dataset's pyramid once, on first request, thread-safely."""
+
+    def __init__(self, frame: pd.DataFrame, cache_file: Optional[Path], step_seconds: Optional[float] = None) -> None:
+        self._frame = frame
+        self._cache_file = cache_file
+        self._step_seconds = step_seconds
+        self._lock = threading.Lock()
+        self._pyramid: Optional[TimePyramid] = None
+
+    def get(self) -> TimePyramid:
+        with self._lock:
+            if self._pyramid is None:
+                self._pyramid = load_or_build_pyramid(self._frame, self._cache_file, self._step_seconds)
+            return self._pyramid
+
+
+def bucket_series(
+    pyramid: TimePyramid,
+    resolution: str,
+    upto: int,
+    columns: Tuple[str, ...],
+    stat: str = "mean",
+) -> Tuple[PyramidLevel, int, List[np.ndarray]]:
+    """Return ``stat`` of ``columns`` for the buckets completed before row ``upto``."""
+    level = pyramid.level(resolution)
+    complete = level.complete_buckets(upto)
+    return level, complete, [level.stats[column][stat][:complete] for column in columns]
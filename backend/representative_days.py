@@ -0,0 +1,186 @@
+"""Representative-day reduction for fast annual KPI estimates.
+
+The series is cut into days, and each day is described by its PV, load and
+price profiles (each normalised by its standard deviation). Days are
+grouped with k-means (k-means++ start, Lloyd iterations). Each cluster is
+represented by its medoid, the real day closest to the centroid, and
+weighted by the number of days it stands for. Dispatching the k medoid days
+(cyclic storage, see ``backend.segmented``) and weighting their flows gives
+annual KPI estimates at a fraction of the cost of the full series. The
+clustering only depends on the data, so callers cache it per dataset
+(``to_arrays``/``from_arrays`` round-trip through the result cache).
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .optimizer import GridStats, MeritOrderConfig, MeritOrderOptimizer, merit_kpis
+from .segmented import dispatch_segment
+
+DEFAULT_DAYS = 12
+_MAX_ITERATIONS = 100
+
+
+@dataclass(frozen=True)
+class DayClustering:
+    """Parameters of a reduction (also its cache identity)."""
+
+    days: int = DEFAULT_DAYS
+    steps_per_day: int = 144
+    seed: int = 0
+
+
+@dataclass
+class RepresentativeDays:
+    """Medoid days (rows of ``pv``/``load``/``price``) and what they stand for.
+
+    ``weights`` sum to the number of days in the whole series, including a
+    trailing partial day; ``counts`` are the whole days per cluster and
+    ``labels`` the cluster of every whole day.
+    """
+
+    spec: DayClustering
+    day_index: np.ndarray
+    weights: np.ndarray
+    counts: np.ndarray
+    labels: np.ndarray
+    pv: np.ndarray
+    load: np.ndarray
+    price: np.ndarray
+    inertia: float
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        arrays = {name: getattr(self, name) for name in ('day_index', 'weights', 'counts', 'labels', 'pv', 'load', 'price')}
+        return arrays, {'inertia': self.inertia}
+
+    @classmethod
+    def from_arrays(cls, spec: DayClustering, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> "RepresentativeDays":
+        return cls(spec=spec, inertia=float(meta['inertia']), **{name: np.asarray(values) for name, values in arrays.items()})
+
+
+def _kmeans(x: np.ndarray, k: int, seed: int) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Labels, centroids and inertia of k-means on the rows of ``x``."""
+    rng = np.random.default_rng(seed)
+    n = len(x)
+    centers = np.empty((k, x.shape[1]))
+    centers[0] = x[rng.integers(n)]
+    dist = np.sum((x - centers[0]) ** 2, axis=1)
+    for j in range(1, k):
+        total = float(np.sum(dist))
+        pick = rng.choice(n, p=dist / total) if total > 0 else rng.integers(n)
+        centers[j] = x[pick]
+        dist = np.minimum(dist, np.sum((x - centers[j]) ** 2, axis=1))
+
+    labels = np.full(n, -1)
+    sq_norms = np.sum(x * x, axis=1)
+    for _ in range(_MAX_ITERATIONS):
+        dist = sq_norms[:, None] - 2.0 * x @ centers.T + np.sum(centers * centers, axis=1)[None, :]
+        new_labels = np.argmin(dist, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        for j in np.flatnonzero(counts == 0):
+            # Re-seed an empty cluster with the day farthest from its centre.
+            far = int(np.argmax(dist[np.arange(n), labels]))
+            labels[far] = j
+            counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, x)
+        centers = sums / counts[:, None]
+    inertia = float(np.sum((x - centers[labels]) ** 2))
+    return labels, centers, inertia
+
+
+def cluster_days(
+    pv_mw: np.ndarray,
+    load_mw: np.ndarray,
+    price: np.ndarray,
+    dt_hours: float,
+    days: int = DEFAULT_DAYS,
+    seed: int = 0,
+) -> RepresentativeDays:
+    """Reduce the series to ``days`` weighted medoid days."""
+    steps_per_day = int(round(24.0 / float(dt_hours)))
+    if steps_per_day < 1:
+        raise ValueError("representative days need a step of at most one day")
+    n = len(load_mw)
+    whole = n // steps_per_day
+    if whole < 1:
+        raise ValueError("the series is shorter than one day")
+    k = max(1, min(int(days), whole))
+    profiles = [
+        np.asarray(values[:whole * steps_per_day], dtype=np.float64).reshape(whole, steps_per_day)
+        for values in (pv_mw, load_mw, price)
+    ]
+    scales = [max(float(np.std(values)), 1e-9) for values in profiles]
+    features = np.hstack([values / scale for values, scale in zip(profiles, scales)])
+    labels, centers, inertia = _kmeans(features, k, seed)
+
+    day_index = np.empty(k, dtype=np.int64)
+    for j in range(k):
+        members = np.flatnonzero(labels == j)
+        day_index[j] = members[np.argmin(np.sum((features[members] - centers[j]) ** 2, axis=1))]
+    counts = np.bincount(labels, minlength=k)
+    weights = counts * (n / (whole * steps_per_day))
+    spec = DayClustering(days=int(days), steps_per_day=steps_per_day, seed=int(seed))
+    return RepresentativeDays(
+        spec, day_index, weights, counts, labels, *(values[day_index] for values in profiles), inertia=inertia
+    )
+
+
+def estimate_kpis(rep: RepresentativeDays, cfg: MeritOrderConfig, peak_load_mw: Optional[float] = None) -> Dict[str, Any]:
+    """Annual KPIs from the weighted representative days (cyclic storage per day).
+
+    Energies are weighted sums; grid peaks are those of the medoid days and
+    percentiles come from their histograms counted ``counts`` times.
+    """
+    started = time.perf_counter()
+    optimizer = MeritOrderOptimizer(cfg)
+    dt = float(cfg.dt_hours)
+    eta_tr = float(max(cfg.transformer_efficiency, 1e-9))
+    if peak_load_mw is None:
+        peak_load_mw = float(np.max(rep.load))
+    sums: Dict[str, float] = {}
+    stats = GridStats()
+    total_gen = total_demand = heat_demand = 0.0
+    for pv, load, weight, count in zip(rep.pv, rep.load, rep.weights, rep.counts):
+        series, _ = dispatch_segment(optimizer, pv, load, peak_load_mw, "cyclic")
+        for name, values in series.items():
+            sums[name] = sums.get(name, 0.0) + weight * float(np.sum(values))
+        stats.update(series['grid_import_mwh'] / (dt * eta_tr), series['pv_export_mwh'] / dt, weight=int(count))
+        total_gen += weight * float(np.sum(optimizer.scaled_pv(pv))) * dt
+        total_demand += weight * float(np.sum(load)) * dt
+        heat = optimizer.heat_demand(load)
+        if heat is not None:
+            heat_demand += weight * float(np.sum(np.maximum(heat, 0.0))) * dt
+    kpis = merit_kpis(cfg, sums, total_gen, total_demand, stats, heat_demand if cfg.thermal else None)
+    return {
+        'kpis': kpis,
+        'dt_hours': dt,
+        'days': len(rep.day_index),
+        'day_index': rep.day_index.tolist(),
+        'weights': rep.weights.tolist(),
+        'elapsed_s': time.perf_counter() - started,
+    }
+
+
+def kpi_error(estimate: Dict[str, Any], exact: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Absolute and relative error of estimated KPIs against an exact run."""
+    out = {}
+    for name, value in exact.items():
+        if name not in estimate:
+            continue
+        diff = float(estimate[name]) - float(value)
+        out[name] = {
+            'exact': float(value),
+            'estimate': float(estimate[name]),
+            'abs': diff,
+            'rel': diff / abs(value) if abs(value) > 1e-9 else 0.0,
+        }
+    return out
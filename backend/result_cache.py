@@ -0,0 +1,217 @@
+"""Content-addressed LRU cache for optimizer results.
+
+Results are keyed by a digest of everything that determines them: the
+dataset identity (content fingerprint plus load options), the canonicalised
+``MeritOrderConfig`` and the dispatched range. Entries live in memory up to a
+byte budget, least recently used first out. With ``disk_dir`` set, entries are
+also written there as ``.npz`` files so they survive restarts; a memory miss
+that finds the file promotes it back into memory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_META_KEY = "__meta__"
+
+
+def canonical_config(cfg: Any) -> Dict[str, Any]:
+    """Dataclass fields as plain JSON values; numbers become floats (``1`` == ``1.0``)."""
+    out: Dict[str, Any] = {}
+    for name, value in sorted(asdict(cfg).items()):
+        if isinstance(value, (bool, np.bool_)):
+            out[name] = bool(value)
+        elif isinstance(value, (int, float, np.integer, np.floating)):
+            out[name] = float(value)
+        else:
+            out[name] = value
+    return out
+
+
+def result_key(dataset: Any, cfg: Any, start: int, stop: int, **extra: Any) -> str:
+    """Digest of ``dataset`` identity, canonical ``cfg``, ``[start, stop)`` and ``extra``."""
+    payload = {
+        "dataset": repr(dataset),
+        "config": canonical_config(cfg),
+        "range": [int(start), int(stop)],
+        "extra": {name: extra[name] for name in sorted(extra)},
+    }
+    text = json.dumps(payload, sort_keys=True, default=repr)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class CachedResult:
+    """Arrays plus JSON-serialisable metadata. Arrays are read-only."""
+
+    arrays: Dict[str, np.ndarray]
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(values.nbytes for values in self.arrays.values())) + 256
+
+
+class ResultCache:
+    """Thread-safe LRU with a memory budget and an optional disk tier."""
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 2**20,
+        disk_dir: Optional[Path] = None,
+        max_disk_bytes: int = 2 * 2**30,
+    ) -> None:
+        self.max_bytes = int(max_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self.max_disk_bytes = int(max_disk_bytes)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    def put(self, key: str, arrays: Dict[str, np.ndarray], meta: Optional[Dict[str, Any]] = None) -> CachedResult:
+        """Store copies of ``arrays`` (callers may keep mutating theirs)."""
+        frozen: Dict[str, np.ndarray] = {}
+        for name, values in arrays.items():
+            values = np.array(values, copy=True)
+            values.flags.writeable = False
+            frozen[name] = values
+        entry = CachedResult(frozen, dict(meta or {}))
+        with self._lock:
+            self._insert(key, entry)
+        self._write_disk(key, entry)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            stats: Dict[str, Any] = {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+        if self.disk_dir is not None:
+            files = self._disk_files()
+            stats["disk"] = {
+                "dir": str(self.disk_dir),
+                "entries": len(files),
+                "bytes": sum(size for _, size, _ in files),
+                "max_bytes": self.max_disk_bytes,
+            }
+        return stats
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+    def _insert(self, key: str, entry: CachedResult) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        if entry.nbytes > self.max_bytes:
+            return  # larger than the whole budget; disk tier only
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+    def _disk_path(self, key: str) -> Optional[Path]:
+        return self.disk_dir / f"{key}.npz" if self.disk_dir is not None else None
+
+    def _read_disk(self, key: str) -> Optional[CachedResult]:
+        path = self._disk_path(key)
+        if path is None or not path.is_file():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files if name != _META_KEY}
+                meta = json.loads(data[_META_KEY].tobytes().decode()) if _META_KEY in data.files else {}
+            os.utime(path)  # recency for disk eviction
+        except Exception as exc:  # corrupt or partial file: drop it
+            logger.warning("Discarding unreadable result cache file %s: %s", path, exc)
+            path.unlink(missing_ok=True)
+            return None
+        for values in arrays.values():
+            values.flags.writeable = False
+        return CachedResult(arrays, meta)
+
+    def _write_disk(self, key: str, entry: CachedResult) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{key}-{uuid4().hex}.part")
+            meta = np.frombuffer(json.dumps(entry.meta).encode(), dtype=np.uint8)
+            with tmp.open("wb") as handle:
+                np.savez(handle, **entry.arrays, **{_META_KEY: meta})
+            os.replace(tmp, path)
+        except OSError as exc:
+            logger.warning("Could not write result cache file %s: %s", path, exc)
+            return
+        self._trim_disk()
+
+    def _disk_files(self):
+        if self.disk_dir is None or not self.disk_dir.is_dir():
+            return []
+        files = []
+        for item in os.scandir(self.disk_dir):
+            if item.name.endswith(".npz") and item.is_file():
+                info = item.stat()
+                files.append((Path(item.path), info.st_size, info.st_mtime))
+        return files
+
+    def _trim_disk(self) -> None:
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -2,15 +2,30 @@
 
 from __future__ import annotations
 
-from typing import List
+import base64
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import List, Optional
 from uuid import uuid4
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, status
 
+from .data_loader import dataset_profile, partition_index
+from .datasets import convert_dataset, store_upload
 from .db import session_scope
-from .models import SimulationRun, SimulationSnapshot, SimulationStatus, Scenario
-from .optimizer import MeritOrderOptimizer, build_config_from_overrides
+from .lp_dispatch import LPDispatchOptimizer, lp_config_from_merit
+from .models import Dataset, DatasetStatus, SimulationRun, SimulationSnapshot, SimulationStatus, Scenario
+from .monte_carlo import run_monte_carlo
+from .optimizer import IncrementalMeritOrder, MeritOrderOptimizer, build_config_from_overrides, downsample_series
+from .pyramid import BUCKET_HOURS, RAW, RESOLUTIONS, bucket_series
+from .representative_days import DayClustering, RepresentativeDays, cluster_days, estimate_kpis, kpi_error
+from .result_cache import result_key
+from .segmented import segmented_dispatch
+from .sensitivity import grid_configs, pv_reference_mw, sweep_axes
+from .sizing import size_battery
+from .surrogate import SURROGATE_AXES, default_axes
 from .schemas import (
+    DatasetRead,
     SimulationRunCreate,
     SimulationRunRead,
     SimulationState,
@@ -18,11 +33,20 @@ from .schemas import (
     ScenarioCreate,
     ScenarioRead,
     ScenarioUpdate,
+    MonteCarloRequest,
+    SegmentedDispatchRequest,
+    SensitivityRequest,
+    SizingRequest,
+    SurrogateRequest,
+    SweepRange,
 )
 from .simulation_manager import SimulationManager
 
 router = APIRouter()
 
+# Series encodings of the /optimize response (see ``_series_payload``).
+_SERIES_FORMATS = ("json", "f32", "none")
+
 
 @router.get("/health", tags=["system"])
 async def health_check() -> dict[str, str]:
@@ -33,8 +57,12 @@ async def health_check() -> dict[str, str]:
 def _serialize_config(settings) -> dict:
     return {
         "data_path": str(settings.data_path),
+        "dataset_id": settings.dataset_id,
         "investment_freq": settings.investment_freq,
         "enable_forecasts": settings.enable_forecasts,
+        "float32_columns": settings.float32_columns,
+        "scenario_key": settings.scenario_key,
+        "live": settings.live,
         "model_dir": str(settings.model_dir),
         "scaler_dir": str(settings.scaler_dir),
     }
@@ -47,6 +75,93 @@ def _get_run_or_404(db, run_id: str) -> SimulationRun:
     return run
 
 
+def _dataset_to_read_dict(row: Dataset) -> dict:
+    return {
+        "id": row.id,
+        "filename": row.filename,
+        "size_bytes": int(row.size_bytes or 0),
+        "status": getattr(row.status, "value", None) or str(row.status or ""),
+        "progress": float(row.progress or 0.0),
+        "stage": row.stage,
+        "rows": row.rows,
+        "error": row.error,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+    }
+
+
+def _ready_dataset_path(db, dataset_id: str) -> Path:
+    """Return the stored CSV of a converted dataset or raise an HTTP error."""
+    row = db.get(Dataset, dataset_id)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    if row.status != DatasetStatus.READY:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Dataset is {row.status.value} (progress {row.progress:.0%})",
+        )
+    return Path(row.path)
+
+
+def _session_pyramid(session, resolution: str):
+    """Return the dataset pyramid for a non-raw ``resolution`` (``None`` for raw)."""
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown resolution '{resolution}'; expected one of {', '.join(RESOLUTIONS)}",
+        )
+    if resolution == RAW:
+        return None
+    if session.dataset is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Session has no dataset to aggregate")
+    return session.dataset.pyramid()
+
+
+def _step_hours(session) -> float:
+    """Native step length from the dataset profile (10 minutes if unknown)."""
+    profile = session.dataset.profile if session.dataset is not None else None
+    if profile is not None and profile.step_hours:
+        return profile.step_hours
+    return 10.0 / 60.0
+
+
+def _optimizer_profiles(session, pyramid, resolution: str):
+    """PV and load (MW) the optimizer dispatches, with step hours and pyramid level.
+
+    Raw series come from the environment; coarse ones are the pyramid bucket
+    energies expressed as power over the nominal bucket length.
+    """
+    env = session.wrapper or session.env
+    pv = getattr(env, '_solar', None)
+    load = getattr(env, '_load', None)
+    if pv is None or load is None:
+        raise AttributeError('solar or load arrays not found')
+    # timestep from the dataset profile (computed once at ingest)
+    dt_hours = _step_hours(session)
+    if pyramid is None:
+        return pv, load, dt_hours, None
+    level = pyramid.level(resolution)
+    scale = dt_hours / BUCKET_HOURS[resolution]
+    return level.stats['solar']['sum'] * scale, level.stats['load']['sum'] * scale, BUCKET_HOURS[resolution], level
+
+
+def _optimizer_prices(session, pyramid, resolution: str):
+    """Grid price per step matching ``_optimizer_profiles`` (bucket means when coarse)."""
+    if pyramid is not None:
+        return pyramid.level(resolution).stats['price']['mean']
+    env = session.wrapper or session.env
+    price = getattr(env, '_price', None)
+    if price is None:
+        raise AttributeError('price array not found')
+    return price
+
+
+def _epoch_to_iso(values) -> List[str]:
+    import numpy as np
+
+    return [str(x) for x in np.asarray(values, dtype=np.int64).astype("datetime64[s]")]
+
+
 def _refresh_run_status_if_needed(db, run: SimulationRun) -> SimulationRun:
     """If a run references a non-existing session (e.g., after server restart),
     mark it as COMPLETED and clear the session_id so the UI shows it correctly.
@@ -81,10 +196,19 @@ def _run_to_read_dict(run: SimulationRun) -> dict:
     }
 
 
+@router.get("/optimizer/cache", tags=["system"])
+async def optimizer_cache_stats() -> dict:
+    """Hit/miss counters and occupancy of the optimizer result cache."""
+    return SimulationManager.get_global().results.stats()
+
+
 @router.post("/runs", response_model=SimulationRunRead, status_code=status.HTTP_201_CREATED, tags=["runs"])
 async def create_run(payload: SimulationRunCreate) -> SimulationRunRead:
     """Persist a simulation run record and optionally spin up an environment session."""
     settings = payload.config.to_settings()
+    if settings.dataset_id:
+        with session_scope() as db:
+            settings.data_path = _ready_dataset_path(db, settings.dataset_id)
     config_dict = _serialize_config(settings)
 
     manager = SimulationManager.get_global()
@@ -218,7 +342,13 @@ async def get_run_history(run_id: str, limit: int = 100) -> List[dict]:
 # ------------------ PED computation ------------------
 
 @router.get("/runs/{run_id}/ped", tags=["runs"])
-async def get_run_ped(run_id: str) -> dict:
+async def get_run_ped(run_id: str, resolution: str = RAW) -> dict:
+    """Aggregate PED metrics up to the current step.
+
+    With a non-raw ``resolution`` (hourly, daily, monthly) the totals come from
+    the dataset's precomputed pyramid and a ``buckets`` breakdown of completed
+    periods is included.
+    """
     manager = SimulationManager.get_global()
     with session_scope() as db:
         run = _get_run_or_404(db, run_id)
@@ -230,6 +360,7 @@ async def get_run_ped(run_id: str) -> dict:
     except KeyError:
         raise HTTPException(status_code=status.HTTP_410_GONE, detail="Simulation session expired")
 
+    pyramid = _session_pyramid(session, resolution)
     env = session.wrapper or session.env
     try:
         t = int(getattr(env, 't', 0))
@@ -243,15 +374,22 @@ async def get_run_ped(run_id: str) -> dict:
 
         import numpy as np  # local import
         upto = max(1, min(t, len(load)))
-        gen = np.array(wind[:upto]) + np.array(solar[:upto]) + np.array(hydro[:upto])
-        demand = np.array(load[:upto])
-        # Assume values are MW at 10-minute intervals → convert to MWh: MW * (10/60) h
-        step_hours = 10.0 / 60.0
-        total_gen_mwh = float(gen.sum() * step_hours)
-        total_demand_mwh = float(demand.sum() * step_hours)
+        # Values are MW per step → convert to MWh with the profiled step length
+        step_hours = _step_hours(session)
+        if pyramid is None:
+            # Sum the (possibly float32, memory-mapped) columns in place with a
+            # float64 accumulator instead of materialising copies.
+            gen_sum = sum(float(np.sum(col[:upto], dtype=np.float64)) for col in (wind, solar, hydro))
+            demand_sum = float(np.sum(load[:upto], dtype=np.float64))
+        else:
+            # Prefix sums over completed buckets plus the raw partial bucket.
+            gen_sum = sum(pyramid.total(name, upto, col, resolution) for name, col in (('wind', wind), ('solar', solar), ('hydro', hydro)))
+            demand_sum = pyramid.total('load', upto, load, resolution)
+        total_gen_mwh = float(gen_sum * step_hours)
+        total_demand_mwh = float(demand_sum * step_hours)
         ped_abs = total_gen_mwh - total_demand_mwh
         ped_ratio = float(total_gen_mwh / (total_demand_mwh + 1e-9))
-        return {
+        result = {
             'steps': upto,
             'period_hours': upto * step_hours,
             'total_gen_mwh': total_gen_mwh,
@@ -259,15 +397,30 @@ async def get_run_ped(run_id: str) -> dict:
             'ped_absolute_mwh': ped_abs,
             'ped_ratio': ped_ratio,
         }
+        if pyramid is not None:
+            level, complete, (w, s, h, d) = bucket_series(pyramid, resolution, upto, ('wind', 'solar', 'hydro', 'load'), stat='sum')
+            gen_b = (w + s + h) * step_hours
+            demand_b = d * step_hours
+            result['resolution'] = resolution
+            result['buckets'] = {
+                'timestamps': _epoch_to_iso(level.start[:complete]),
+                'gen_mwh': gen_b.tolist(),
+                'demand_mwh': demand_b.tolist(),
+                'ped_ratio': (gen_b / (demand_b + 1e-9)).tolist(),
+            }
+        return result
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"PED calculation failed: {exc}")
 
 
 @router.get("/runs/{run_id}/energy_series", tags=["runs"])
-async def get_energy_series(run_id: str, limit: int = 2000) -> dict:
+async def get_energy_series(run_id: str, limit: int = 2000, resolution: str = RAW) -> dict:
     """Return generation and load series up to the current step.
 
     Values are in MW per step; include optional timestamps if present in env.data.
+    With a non-raw ``resolution`` the series holds bucket means (MW) of the
+    completed hours/days/months, served from the dataset pyramid, and
+    ``limit`` counts buckets.
     """
     manager = SimulationManager.get_global()
     with session_scope() as db:
@@ -281,7 +434,22 @@ async def get_energy_series(run_id: str, limit: int = 2000) -> dict:
     except KeyError:
         raise HTTPException(status_code=status.HTTP_410_GONE, detail="Simulation session expired")
 
+    pyramid = _session_pyramid(session, resolution)
     env = session.wrapper or session.env
+    if pyramid is not None:
+        level, complete, (w, s, h, d) = bucket_series(
+            pyramid, resolution, max(1, int(getattr(env, 't', 0))), ('wind', 'solar', 'hydro', 'load')
+        )
+        first = max(0, complete - int(max(1, min(limit, 50000))))
+        return {
+            'start': int(level.offsets[first]),
+            'end': int(level.offsets[complete]),
+            'resolution': resolution,
+            'steps': level.offsets[first:complete].tolist(),
+            'timestamps': _epoch_to_iso(level.start[first:complete]),
+            'gen_mw': (w + s + h)[first:].tolist(),
+            'load_mw': d[first:].tolist(),
+        }
     try:
         t = int(getattr(env, 't', 0))
         upto = max(1, t)
@@ -292,8 +460,10 @@ async def get_energy_series(run_id: str, limit: int = 2000) -> dict:
         load = getattr(env, '_load')[start:upto]
 
         import numpy as np
-        gen = (np.array(wind) + np.array(solar) + np.array(hydro)).tolist()
-        demand = np.array(load).tolist()
+        gen = np.add(wind, solar, dtype=np.float64)
+        gen += hydro
+        gen = gen.tolist()
+        demand = np.asarray(load, dtype=np.float64).tolist()
 
         timestamps = None
         try:
@@ -316,11 +486,51 @@ async def get_energy_series(run_id: str, limit: int = 2000) -> dict:
 
 
 @router.get("/runs/{run_id}/optimize", tags=["runs"])
-async def optimize_run_merit_order(run_id: str) -> dict:
+async def optimize_run_merit_order(
+    run_id: str,
+    resolution: str = RAW,
+    engine: str = "merit",
+    series: str = "json",
+    points: Optional[int] = None,
+) -> dict:
     """Run a deterministic merit‑order dispatcher consistent with paper.txt.
 
-    Returns series (MWh per step) and KPIs including PED.
+    Returns series (MWh per step) and KPIs including PED. With a non-raw
+    ``resolution`` the dispatch runs on the completed buckets of the dataset
+    pyramid (energy-preserving bucket averages), e.g. hourly as in the paper.
+
+    Dispatch is incremental: the session keeps the storage levels, series and
+    KPI sums per resolution and only dispatches the steps added since the
+    previous call. The state is rebuilt when the scenario overrides (or the
+    series peak that sizes DSM) change, or when the run was reset. A rebuild
+    first looks in the manager's result cache (keyed by dataset, config and
+    range), so re-optimizing a range another run already dispatched is free.
+
+    ``engine=lp`` instead minimises operating cost against the dataset's
+    price with the rolling-horizon LP (``backend.lp_dispatch``), adding
+    curtailment, storage levels and cost KPIs. LP results are not
+    incremental, but are served from the result cache when the range repeats.
+
+    Scenarios with a heat pump (``hp_power_mw`` override, optionally
+    ``tes_capacity_mwh`` and other ``tes_*`` keys) add the power-to-heat
+    stage of paper scenario 4 to the merit order: HP, TES and DH series and
+    heat KPIs including avoided DH emissions. Datasets have no heat column,
+    so heat demand is ``heat_load_ratio`` (default 1) times the electric load.
+
+    ``series`` selects the series payload: ``json`` (lists in MWh and MW),
+    ``f32`` (base64 little-endian float32 arrays in MWh, like the sensitivity
+    surface) or ``none`` (KPIs only). ``points`` downsamples the series to at
+    most that many buckets (energies summed, storage levels averaged;
+    ``bucket_steps`` gives the steps per bucket).
     """
+    if engine not in ("merit", "lp"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="engine must be 'merit' or 'lp'")
+    if series not in _SERIES_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"series must be one of {', '.join(_SERIES_FORMATS)}"
+        )
+    if points is not None and points < 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="points must be positive")
     manager = SimulationManager.get_global()
     with session_scope() as db:
         run = _get_run_or_404(db, run_id)
@@ -338,36 +548,22 @@ async def optimize_run_merit_order(run_id: str) -> dict:
     if session is None:
         raise HTTPException(status_code=410, detail="Simulation session expired")
 
+    pyramid = _session_pyramid(session, resolution)
     env = session.wrapper or session.env
     try:
-        # get arrays
-        pv = getattr(env, '_solar', None)
-        load = getattr(env, '_load', None)
-        if pv is None or load is None:
-            raise AttributeError('solar or load arrays not found')
-
         import numpy as np
-        pv = np.asarray(pv, dtype=float)
-        load = np.asarray(load, dtype=float)
+        pv, load, dt_hours, level = _optimizer_profiles(session, pyramid, resolution)
         t = int(getattr(env, 't', len(load)))
-        pv = pv[:t]
-        load = load[:t]
-
-        # timestep inference: prefer timestamp spacing, else assume 10‑min
-        dt_hours = 1.0 / 6.0
-        try:
-            df = getattr(env, 'data', None)
-            if df is not None and 'timestamp' in df.columns and t > 1:
-                ts = df['timestamp'].iloc[:t]
-                delta = (ts.iloc[1] - ts.iloc[0]).total_seconds() / 3600.0
-                if delta > 0:
-                    dt_hours = float(delta)
-        except Exception:
-            pass
+        upto = level.complete_buckets(t) if level is not None else min(t, len(load))
 
         cfg = build_config_from_overrides(scenario_overrides, dt_hours)
-        opt = MeritOrderOptimizer(cfg)
-        out = opt.run(pv_mw=pv, load_mw=load)
+        peak_load = float(np.max(load)) if len(load) else 0.0
+        if engine == "lp":
+            cfg = lp_config_from_merit(cfg, scenario_overrides)
+            price = _optimizer_prices(session, pyramid, resolution)
+            out = _lp_dispatch(manager, session, cfg, pv[:upto], load[:upto], price[:upto], resolution, peak_load)
+        else:
+            out = _merit_dispatch(manager, session, cfg, pv, load, upto, resolution, peak_load)
 
         # Persist a snapshot for charting convenience
         try:
@@ -376,7 +572,7 @@ async def optimize_run_merit_order(run_id: str) -> dict:
                     run_id=run_id,
                     timestep=int(getattr(env, 't', 0)),
                     payload={
-                        'type': 'optimizer_merit_order',
+                        'type': 'optimizer_lp' if engine == 'lp' else 'optimizer_merit_order',
                         'config': cfg.__dict__,
                         'kpis': out['kpis'],
                     },
@@ -385,20 +581,553 @@ async def optimize_run_merit_order(run_id: str) -> dict:
         except Exception:
             pass
 
-        series_mwh = {k: v.tolist() for k, v in out['series_mwh'].items()}
         dt_h = float(out.get('dt_hours', dt_hours))
-        series_mw = {k.replace('_mwh', '_mw'): (np.array(v) / max(dt_h, 1e-9)).tolist() for k, v in series_mwh.items()}
         return {
             'config': cfg.__dict__,
             'kpis': out['kpis'],
-            'series_mwh': series_mwh,
-            'series_mw': series_mw,
+            **_series_payload(out['series_mwh'], dt_h, series, points),
             'dt_hours': dt_h,
+            'resolution': resolution,
+            'engine': engine,
         }
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Optimization failed: {exc}")
 
 
+def _series_payload(series_mwh: dict, dt_hours: float, fmt: str, points: Optional[int]) -> dict:
+    """Series part of the ``/optimize`` response in the requested format."""
+    import numpy as np
+
+    if fmt == "none":
+        return {}
+    out = {}
+    steps = 1
+    if points is not None:
+        series_mwh, steps = downsample_series(series_mwh, points)
+        out['bucket_steps'] = steps.tolist()
+    if fmt == "f32":
+        out['series_mwh'] = {
+            k: {
+                'shape': [len(v)],
+                'dtype': '<f4',
+                'data': base64.b64encode(np.ascontiguousarray(v, dtype='<f4').tobytes()).decode('ascii'),
+            }
+            for k, v in series_mwh.items()
+        }
+        return out
+    hours = np.maximum(steps * dt_hours, 1e-9)
+    out['series_mwh'] = {k: v.tolist() for k, v in series_mwh.items()}
+    # Storage levels are energies, not flows, so they have no MW form.
+    out['series_mw'] = {
+        k.replace('_mwh', '_mw'): (v / hours).tolist() for k, v in series_mwh.items() if not k.endswith('soc_mwh')
+    }
+    return out
+
+
+def _merit_dispatch(manager, session, cfg, pv, load, upto: int, resolution: str, peak_load: float) -> dict:
+    """Advance the session's incremental merit-order state to ``upto`` steps."""
+    import numpy as np
+
+    dispatch = session.dispatch.get(resolution)
+    cache_key = None
+    if dispatch is None or not dispatch.matches(cfg, peak_load) or dispatch.steps > upto:
+        # Cold start: another run may already have dispatched this range.
+        dataset = session.dataset
+        if dataset is not None and dataset.live is None:
+            cache_key = result_key(dataset.key, cfg, 0, upto, resolution=resolution, peak_load_mw=peak_load)
+            cached = manager.results.get(cache_key)
+        else:
+            cached = None
+        if cached is not None:
+            dispatch = IncrementalMeritOrder.restore(cfg, peak_load, cached.arrays, cached.meta)
+            cache_key = None
+        else:
+            dispatch = IncrementalMeritOrder(cfg, peak_load)
+        session.dispatch[resolution] = dispatch
+    start = dispatch.steps
+    dispatch.advance(np.asarray(pv[start:upto], dtype=float), np.asarray(load[start:upto], dtype=float))
+    if cache_key is not None:
+        manager.results.put(cache_key, *dispatch.snapshot())
+    return dispatch.result()
+
+
+def _lp_dispatch(manager, session, cfg, pv, load, price, resolution: str, peak_load: float) -> dict:
+    """Rolling-horizon LP over the given steps, through the result cache."""
+    dataset = session.dataset
+    cache_key = None
+    if dataset is not None and dataset.live is None:
+        cache_key = result_key(
+            dataset.key, cfg, 0, len(pv), resolution=resolution, peak_load_mw=peak_load, engine='lp'
+        )
+        cached = manager.results.get(cache_key)
+        if cached is not None:
+            return {'series_mwh': dict(cached.arrays), **cached.meta}
+    out = LPDispatchOptimizer(cfg).run(pv, load, price, peak_load_mw=peak_load)
+    if cache_key is not None:
+        manager.results.put(cache_key, out['series_mwh'], {k: v for k, v in out.items() if k != 'series_mwh'})
+    return out
+
+
+@router.post("/runs/{run_id}/ingest", tags=["runs"])
+async def ingest_run_rows(run_id: str, request: Request) -> dict:
+    """Append CSV rows to a live run's dataset.
+
+    The body uses the dataset's column layout (header line optional). Rows
+    are added in memory for every session following the same file; they are
+    not written back to the CSV.
+    """
+    manager = SimulationManager.get_global()
+    with session_scope() as db:
+        run = _get_run_or_404(db, run_id)
+        if not run.session_id:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Run has no active session")
+        session_id = run.session_id
+    try:
+        session = manager.get_session(session_id)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Simulation session expired")
+    if session.dataset is None or session.dataset.live is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Run was not started with live=true")
+
+    body = await request.body()
+    try:
+        added = session.dataset.live.append_csv(body)
+    except (ValueError, KeyError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not parse rows: {exc}")
+    return {"rows_added": added, "rows": session.dataset.rows}
+
+
+def _whole_series_inputs(run_id: str, resolution: str, steps: Optional[int]) -> dict:
+    """Scenario overrides and profiles for analyses over a run's whole series.
+
+    Used by sensitivity sweeps and battery sizing, which look at the first
+    ``steps`` steps (default: all of them) rather than the run's position.
+    Peaks (DSM sizing, PV reference capacity) are those of the full series;
+    ``solar_reference_mw`` is the scenario's own PV capacity when it has one
+    (``pv_reference_mw``).
+    """
+    import numpy as np
+
+    manager = SimulationManager.get_global()
+    with session_scope() as db:
+        run = _get_run_or_404(db, run_id)
+        scenario_overrides = None
+        if run.scenario_id:
+            sc = db.get(Scenario, run.scenario_id)
+            if sc is not None:
+                scenario_overrides = sc.config_overrides
+        session_id = run.session_id
+    try:
+        session = manager.get_session(session_id) if session_id else None
+    except KeyError:
+        session = None
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Simulation session expired")
+
+    pyramid = _session_pyramid(session, resolution)
+    try:
+        pv, load, dt_hours, level = _optimizer_profiles(session, pyramid, resolution)
+    except AttributeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    n = level.complete_buckets(session.dataset.rows) if level is not None else len(load)
+    if steps:
+        n = min(n, steps)
+    return {
+        'session': session,
+        'overrides': scenario_overrides,
+        'pv': pv[:n],
+        'load': load[:n],
+        'dt_hours': dt_hours,
+        'peak_load_mw': float(np.max(load)) if len(load) else 0.0,
+        'solar_reference_mw': pv_reference_mw(scenario_overrides, float(np.max(pv)) if len(pv) else 0.0),
+    }
+
+
+@router.post("/runs/{run_id}/sensitivity", status_code=status.HTTP_202_ACCEPTED, tags=["runs"])
+async def start_sensitivity(run_id: str, payload: SensitivityRequest) -> dict:
+    """Dispatch a grid of scenario parameter values in the background.
+
+    Each grid point applies its values on top of the run's scenario
+    overrides and is dispatched over the run's series (whole series unless
+    ``steps`` is given). Sweeping ``owned_solar_capacity_mw`` rescales the
+    PV series by value / the scenario's own capacity (the series peak when
+    it has none), so the scenario's own point matches ``/optimize``. Poll ``GET /sensitivity/{job_id}`` for progress and the KPI
+    surface; ``DELETE`` cancels.
+    """
+    try:
+        axes = sweep_axes({
+            name: spec.model_dump() if isinstance(spec, SweepRange) else spec
+            for name, spec in payload.parameters.items()
+        })
+    except (ValueError, KeyError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    inputs = _whole_series_inputs(run_id, payload.resolution, payload.steps)
+    configs = grid_configs(axes, inputs['overrides'], inputs['dt_hours'], inputs['solar_reference_mw'])
+    job = SimulationManager.get_global().sensitivity.submit(
+        inputs['pv'], inputs['load'], configs, axes, peak_load_mw=inputs['peak_load_mw']
+    )
+    return job.to_dict(include_result=False)
+
+
+@router.post("/runs/{run_id}/size_battery", tags=["runs"])
+async def size_run_battery(run_id: str, payload: SizingRequest) -> dict:
+    """Smallest battery (MWh) that meets a KPI target for the run's scenario.
+
+    Other parameters (C-rate, efficiencies, DSM) come from the scenario
+    overrides. Uses bracketing plus bisection on the monotone KPI, so it
+    costs a handful of dispatches; ``evaluations`` lists them.
+    """
+    inputs = _whole_series_inputs(run_id, payload.resolution, payload.steps)
+    base = build_config_from_overrides(inputs['overrides'], inputs['dt_hours'])
+    try:
+        result = size_battery(
+            inputs['pv'],
+            inputs['load'],
+            base,
+            payload.target,
+            payload.value,
+            tolerance_mwh=payload.tolerance_mwh,
+            max_battery_mwh=payload.max_battery_mwh,
+            peak_load_mw=inputs['peak_load_mw'],
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return {**asdict(result), 'config': asdict(base)}
+
+
+# Plain def: FastAPI runs it in its threadpool, so the dispatch does not block the event loop.
+@router.post("/runs/{run_id}/monte_carlo", tags=["runs"])
+def run_monte_carlo_kpis(run_id: str, payload: MonteCarloRequest) -> dict:
+    """KPI distributions across the stochastic scenarios of the run's dataset.
+
+    The run's scenario configuration is dispatched separately over each
+    value of the dataset's ``scenario`` column (raw resolution, all rows),
+    in a process pool. Returns the KPIs per partition and, per KPI, mean,
+    std, min/max, P5/P50/P95 and, for costs, the CVaR of the worst 5%.
+    """
+    inputs = _whole_series_inputs(run_id, RAW, None)
+    session = inputs['session']
+    dataset = session.dataset
+    if dataset is None or dataset.live is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Monte Carlo needs a static dataset")
+    scenario_key = dataset.key[3]
+    if scenario_key is not None:
+        partitions = {scenario_key: [[0, len(inputs['load'])]]}
+    else:
+        partitions = partition_index(dataset.path)
+    if payload.partitions is not None:
+        unknown = sorted(set(payload.partitions) - set(partitions))
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown partitions: {', '.join(unknown)}")
+        partitions = {name: partitions[name] for name in payload.partitions}
+    try:
+        price = _optimizer_prices(session, None, RAW)
+    except AttributeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    cfg = lp_config_from_merit(build_config_from_overrides(inputs['overrides'], inputs['dt_hours']), inputs['overrides'])
+    try:
+        result = run_monte_carlo(
+            inputs['pv'], inputs['load'], price, partitions, cfg, payload.engine, max_workers=payload.max_workers
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return {**result.to_dict(), 'config': asdict(cfg)}
+
+
+# Plain def (threadpool), like /monte_carlo.
+@router.post("/runs/{run_id}/segmented", tags=["runs"])
+def run_segmented_dispatch(run_id: str, payload: SegmentedDispatchRequest) -> dict:
+    """Merit-order dispatch in independent segments, in parallel.
+
+    The run's series is cut into ``segment``-long pieces that each start
+    from the ``boundary`` storage level (``empty``, ``neutral`` at
+    ``initial_soc``, or ``cyclic``: ending where they start) and are
+    dispatched across a process pool, then stitched. With ``compare`` the
+    response includes the KPI and series ``deviation`` from one sequential
+    pass. Series are left out unless ``series`` asks for them.
+    """
+    if payload.series not in _SERIES_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"series must be one of {', '.join(_SERIES_FORMATS)}"
+        )
+    inputs = _whole_series_inputs(run_id, payload.resolution, payload.steps)
+    cfg = build_config_from_overrides(inputs['overrides'], inputs['dt_hours'])
+    try:
+        out = segmented_dispatch(
+            inputs['pv'],
+            inputs['load'],
+            cfg,
+            segment=payload.segment,
+            policy=payload.boundary,
+            initial_soc=payload.initial_soc,
+            peak_load_mw=inputs['peak_load_mw'],
+            max_workers=payload.max_workers,
+            compare=payload.compare,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    series = out.pop('series_mwh')
+    return {**out, **_series_payload(series, out['dt_hours'], payload.series, payload.points), 'config': asdict(cfg)}
+
+
+# Plain def (threadpool), like /monte_carlo.
+@router.get("/runs/{run_id}/annual_kpis", tags=["runs"])
+def annual_kpis(
+    run_id: str,
+    mode: str = "fast",
+    days: int = 12,
+    compare: bool = False,
+    resolution: str = RAW,
+    steps: Optional[int] = None,
+) -> dict:
+    """KPIs of the run's scenario over its whole series, exact or estimated.
+
+    ``mode=exact`` dispatches every step (KPIs only). ``mode=fast`` dispatches
+    ``days`` representative days (k-means medoids of the daily PV, load and
+    price profiles, cached per dataset) and weights their flows; with
+    ``compare`` it also runs the exact dispatch and reports the ``error``
+    of every KPI.
+    """
+    import numpy as np
+
+    if mode not in ("fast", "exact"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="mode must be 'fast' or 'exact'")
+    if days < 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="days must be positive")
+    inputs = _whole_series_inputs(run_id, resolution, steps)
+    cfg = build_config_from_overrides(inputs['overrides'], inputs['dt_hours'])
+    pv, load = np.asarray(inputs['pv'], dtype=float), np.asarray(inputs['load'], dtype=float)
+    if mode == "exact":
+        exact = MeritOrderOptimizer(cfg).run(pv, load, return_series=False)
+        return {'mode': mode, 'kpis': exact['kpis'], 'dt_hours': exact['dt_hours'], 'config': asdict(cfg)}
+
+    session = inputs['session']
+    try:
+        price = _optimizer_prices(session, _session_pyramid(session, resolution), resolution)[:len(load)]
+        rep = _representative_days(session, pv, load, price, inputs['dt_hours'], days, resolution)
+    except AttributeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    out = {'mode': mode, **estimate_kpis(rep, cfg, inputs['peak_load_mw']), 'config': asdict(cfg)}
+    if compare:
+        exact = MeritOrderOptimizer(cfg).run(pv, load, return_series=False)
+        out['error'] = kpi_error(out['kpis'], exact['kpis'])
+    return out
+
+
+def _representative_days(session, pv, load, price, dt_hours: float, days: int, resolution: str) -> RepresentativeDays:
+    """Day clustering of the given series, through the result cache for static datasets."""
+    manager = SimulationManager.get_global()
+    dataset = session.dataset
+    spec = DayClustering(days=days, steps_per_day=int(round(24.0 / dt_hours)))
+    cache_key = None
+    if dataset is not None and dataset.live is None:
+        cache_key = result_key(dataset.key, spec, 0, len(load), resolution=resolution, kind='representative_days')
+        cached = manager.results.get(cache_key)
+        if cached is not None:
+            return RepresentativeDays.from_arrays(spec, cached.arrays, cached.meta)
+    rep = cluster_days(pv, load, price, dt_hours, days=days, seed=spec.seed)
+    if cache_key is not None:
+        manager.results.put(cache_key, *rep.to_arrays())
+    return rep
+
+
+def _surrogate_for(
+    run_id: str, resolution: str, steps: Optional[int], parameters: Optional[dict] = None, tolerance: Optional[float] = None
+):
+    """The run's KPI surrogate (built on first use) and the scenario's own slider values.
+
+    ``parameters`` (axis name -> values, missing axes at their defaults)
+    extends the grid; ``tolerance`` replaces the refinement tolerance.
+    """
+    inputs = _whole_series_inputs(run_id, resolution, steps)
+    overrides = inputs['overrides'] or {}
+    base = {name: value for name, value in overrides.items() if name not in SURROGATE_AXES}
+    dataset = inputs['session'].dataset
+    key = result_key(
+        dataset.key if dataset is not None else run_id,
+        build_config_from_overrides(base, inputs['dt_hours']),
+        0,
+        len(inputs['load']),
+        resolution=resolution,
+        solar_reference_mw=inputs['solar_reference_mw'],
+        kind='surrogate',
+    )
+    defaults = default_axes(overrides, inputs['load'], inputs['dt_hours'], inputs['solar_reference_mw'])
+    axes = None
+    if parameters:
+        axes = tuple(parameters.get(name, default) for name, default in zip(SURROGATE_AXES, defaults))
+    engine = SimulationManager.get_global().surrogates
+    surrogate = engine.get(key)
+    if surrogate is None or surrogate.status == 'failed' or axes is not None or tolerance is not None:
+        surrogate = engine.ensure(
+            key,
+            inputs['pv'],
+            inputs['load'],
+            base,
+            inputs['dt_hours'],
+            inputs['solar_reference_mw'],
+            inputs['peak_load_mw'],
+            axes=axes,
+            tolerance=tolerance,
+            initial_axes=defaults,
+        )
+    current = (
+        float(overrides.get('owned_battery_capacity_mwh') or 0.0),
+        inputs['solar_reference_mw'],
+    )
+    return surrogate, current
+
+
+@router.post("/runs/{run_id}/surrogate", status_code=status.HTTP_202_ACCEPTED, tags=["runs"])
+async def build_surrogate(run_id: str, payload: SurrogateRequest) -> dict:
+    """Precompute the KPI surface behind ``GET /runs/{id}/surrogate`` in the background.
+
+    The surface covers battery size x PV capacity (the other scenario
+    overrides stay fixed) and is dispatched with the batched engine. Grid
+    values given here are merged into an existing surface.
+    """
+    try:
+        parameters = sweep_axes({
+            name: value.model_dump() if isinstance(value, SweepRange) else value
+            for name, value in payload.parameters.items()
+        }) if payload.parameters else None
+        unknown = set(parameters or ()) - set(SURROGATE_AXES)
+        if unknown:
+            raise ValueError(f"surrogate axes are {', '.join(SURROGATE_AXES)}; got {', '.join(sorted(unknown))}")
+        surrogate, _ = _surrogate_for(run_id, payload.resolution, payload.steps, parameters, payload.tolerance)
+    except (ValueError, KeyError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return surrogate.to_dict()
+
+
+@router.get("/runs/{run_id}/surrogate", tags=["runs"])
+async def query_surrogate(
+    run_id: str,
+    response: Response,
+    owned_battery_capacity_mwh: Optional[float] = None,
+    owned_solar_capacity_mw: Optional[float] = None,
+    resolution: str = RAW,
+    steps: Optional[int] = None,
+) -> dict:
+    """Interpolated KPIs for a battery size and PV capacity, without dispatching.
+
+    Missing values default to the scenario's own. The first query starts
+    building the surface and answers 202 with its status until it is ready.
+    Queries outside the grid, or where the cell's ``error_estimate``
+    exceeds the tolerance, are answered from the current surface
+    (``in_grid`` false means clamped to its edge) and trigger a background
+    refinement (``refining``).
+    """
+    surrogate, current = _surrogate_for(run_id, resolution, steps)
+    point = (
+        current[0] if owned_battery_capacity_mwh is None else owned_battery_capacity_mwh,
+        current[1] if owned_solar_capacity_mw is None else owned_solar_capacity_mw,
+    )
+    try:
+        answer = surrogate.query(*point)
+    except LookupError:
+        if surrogate.status == 'failed':
+            raise HTTPException(status_code=500, detail=f"Surrogate failed: {surrogate.error}")
+        response.status_code = status.HTTP_202_ACCEPTED
+        return surrogate.to_dict()
+    return {**answer, 'parameters': dict(zip(SURROGATE_AXES, point))}
+
+
+@router.get("/sensitivity/{job_id}", tags=["sensitivity"])
+async def get_sensitivity(job_id: str) -> dict:
+    """Progress of a sweep; once completed, the KPI surface as a base64 array.
+
+    ``kpis.data`` decodes to little-endian float64 values of shape
+    ``kpis.shape`` (one axis per parameter, in ``parameters`` order, then
+    ``kpi_names``).
+    """
+    try:
+        job = SimulationManager.get_global().sensitivity.get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sensitivity job not found")
+    return job.to_dict()
+
+
+@router.delete("/sensitivity/{job_id}", tags=["sensitivity"])
+async def cancel_sensitivity(job_id: str) -> dict:
+    """Cancel a sweep: queued chunks are dropped, running ones finish."""
+    try:
+        job = SimulationManager.get_global().sensitivity.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sensitivity job not found")
+    return job.to_dict(include_result=False)
+
+
+# ------------------ Datasets ------------------
+
+@router.post('/datasets', response_model=DatasetRead, status_code=status.HTTP_202_ACCEPTED, tags=['datasets'])
+async def upload_dataset(
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    filename: Optional[str] = None,
+) -> DatasetRead:
+    """Stream a CSV request body to disk and convert it in the background.
+
+    Send the raw file as the body (``curl --data-binary @data.csv``). The
+    returned ``id`` can be used as ``dataset_id`` in run configs and in
+    ``/scenarios/{id}/run``. Uploading content that is already stored is a
+    no-op that returns the existing dataset with status 200.
+    """
+    manager = SimulationManager.get_global()
+    try:
+        dataset_id, path, size = await store_upload(request.stream(), manager.settings.dataset_dir)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+    with session_scope() as db:
+        row = db.get(Dataset, dataset_id)
+        if row is not None and row.status != DatasetStatus.FAILED:
+            response.status_code = status.HTTP_200_OK
+            return DatasetRead.model_validate(_dataset_to_read_dict(row))
+        if row is None:
+            row = Dataset(id=dataset_id, filename=filename, path=str(path), size_bytes=size)
+        row.status = DatasetStatus.PENDING
+        row.progress = 0.0
+        row.stage = "queued"
+        row.error = None
+        db.add(row)
+        db.flush()
+        db.refresh(row)
+        result = DatasetRead.model_validate(_dataset_to_read_dict(row))
+
+    background_tasks.add_task(convert_dataset, dataset_id)
+    return result
+
+
+@router.get('/datasets', response_model=List[DatasetRead], tags=['datasets'])
+async def list_datasets() -> List[DatasetRead]:
+    with session_scope() as db:
+        rows = db.query(Dataset).order_by(Dataset.created_at.desc()).all()
+        return [DatasetRead.model_validate(_dataset_to_read_dict(r)) for r in rows]
+
+
+@router.get('/datasets/{dataset_id}', response_model=DatasetRead, tags=['datasets'])
+async def get_dataset(dataset_id: str) -> DatasetRead:
+    """Return a dataset including its conversion progress."""
+    with session_scope() as db:
+        row = db.get(Dataset, dataset_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail='Dataset not found')
+        return DatasetRead.model_validate(_dataset_to_read_dict(row))
+
+
+@router.get('/datasets/{dataset_id}/profile', tags=['datasets'])
+async def get_dataset_profile(dataset_id: str) -> dict:
+    """Return the ingest-time profile: step, gaps, duplicates, column ranges and unit."""
+    with session_scope() as db:
+        path = _ready_dataset_path(db, dataset_id)
+    profile = dataset_profile(path)
+    return {**asdict(profile), 'step_hours': profile.step_hours}
+
+
 # ------------------ Scenarios ------------------
 
 @router.post('/scenarios', response_model=ScenarioRead, tags=['scenarios'])
@@ -451,15 +1180,18 @@ async def update_scenario(scenario_id: str, payload: ScenarioUpdate) -> Scenario
 
 
 @router.post('/scenarios/{scenario_id}/run', response_model=SimulationRunRead, tags=['scenarios'])
-async def run_scenario(scenario_id: str) -> SimulationRunRead:
+async def run_scenario(scenario_id: str, dataset_id: Optional[str] = None) -> SimulationRunRead:
     manager = SimulationManager.get_global()
     with session_scope() as db:
         sc = db.get(Scenario, scenario_id)
         if sc is None:
             raise HTTPException(status_code=404, detail='Scenario not found')
+        settings = manager.settings
+        if dataset_id:
+            settings = replace(settings, data_path=_ready_dataset_path(db, dataset_id), dataset_id=dataset_id)
         # Build session using scenario overrides
         try:
-            sim_session = manager.create_session(config_overrides=sc.config_overrides)
+            sim_session = manager.create_session(settings, config_overrides=sc.config_overrides)
         except Exception as exc:
             raise HTTPException(status_code=400, detail=str(exc))
 
@@ -467,13 +1199,7 @@ async def run_scenario(scenario_id: str) -> SimulationRunRead:
             id=str(uuid4()),
             name=f"Run of {sc.name}",
             notes=None,
-            config={
-                'data_path': str(manager.settings.data_path),
-                'investment_freq': manager.settings.investment_freq,
-                'enable_forecasts': manager.settings.enable_forecasts,
-                'model_dir': str(manager.settings.model_dir),
-                'scaler_dir': str(manager.settings.scaler_dir),
-            },
+            config=_serialize_config(settings),
             status=SimulationStatus.RUNNING,
             session_id=sim_session.session_id,
             scenario_id=sc.id,
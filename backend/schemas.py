@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -15,16 +15,24 @@ class SimulationConfig(BaseModel):
     """Configuration payload supplied when launching a run."""
 
     data_path: Optional[Path] = Field(None, description="Path to time-series CSV input")
+    dataset_id: Optional[str] = Field(None, description="Uploaded dataset to use instead of data_path (see POST /datasets)")
     investment_freq: int = Field(12, ge=1, description="Environment investment frequency in steps")
     enable_forecasts: bool = Field(False, description="Whether to attach the forecasting wrapper")
+    float32_columns: bool = Field(False, description="Map numeric columns as float32 to halve their memory footprint")
+    scenario_key: Optional[str] = Field(None, description="Load only this value of the CSV `scenario` column (e.g. scenario_000)")
+    live: bool = Field(False, description="Follow rows appended to the CSV (or pushed via /runs/{id}/ingest)")
     model_dir: Optional[Path] = Field(None, description="Directory containing TensorFlow forecast models")
     scaler_dir: Optional[Path] = Field(None, description="Directory with scaler artifacts")
 
     def to_settings(self) -> SimulationSettings:
         settings = SimulationSettings(
             data_path=self.data_path or SimulationSettings().data_path,
+            dataset_id=self.dataset_id,
             investment_freq=self.investment_freq,
             enable_forecasts=self.enable_forecasts,
+            float32_columns=self.float32_columns,
+            scenario_key=self.scenario_key,
+            live=self.live,
             model_dir=self.model_dir or SimulationSettings().model_dir,
             scaler_dir=self.scaler_dir or SimulationSettings().scaler_dir,
         )
@@ -73,6 +81,91 @@ class SimulationState(BaseModel):
     metrics: Dict[str, Any]
 
 
+class SweepRange(BaseModel):
+    """Evenly spaced values from ``start`` to ``stop`` (inclusive)."""
+
+    start: float
+    stop: float
+    num: int = Field(5, ge=1, le=1000)
+
+
+class SensitivityRequest(BaseModel):
+    """Parameter grid for POST /runs/{id}/sensitivity."""
+
+    parameters: Dict[str, Union[List[float], SweepRange]] = Field(
+        ...,
+        description="Scenario override key -> explicit values or a start/stop/num range; the grid is their Cartesian product",
+    )
+    resolution: str = Field("raw", description="raw|hourly|daily|monthly, as for /optimize")
+    steps: Optional[int] = Field(None, ge=1, description="Dispatch only the first N steps (default: the whole series)")
+
+
+class SizingRequest(BaseModel):
+    """Target for POST /runs/{id}/size_battery."""
+
+    target: str = Field(..., description="self_sufficiency (share of demand, 0..1), grid_import_mwh or export_mwh")
+    value: float = Field(..., description="Reach at least this self-sufficiency, or at most this many MWh")
+    tolerance_mwh: Optional[float] = Field(None, gt=0, description="Battery size resolution (default: 0.1% of the answer)")
+    max_battery_mwh: Optional[float] = Field(None, ge=0, description="Largest battery to consider")
+    resolution: str = Field("raw", description="raw|hourly|daily|monthly, as for /optimize")
+    steps: Optional[int] = Field(None, ge=1, description="Dispatch only the first N steps (default: the whole series)")
+
+
+class MonteCarloRequest(BaseModel):
+    """Options for POST /runs/{id}/monte_carlo."""
+
+    engine: str = Field("merit", description="merit|lp, as for /optimize")
+    partitions: Optional[List[str]] = Field(
+        None, description="Values of the dataset's scenario column to include (default: all of them)"
+    )
+    max_workers: Optional[int] = Field(None, ge=1, description="Process pool size (default: CPU count)")
+
+
+class SegmentedDispatchRequest(BaseModel):
+    """Options for POST /runs/{id}/segmented."""
+
+    segment: str = Field("day", description="day|week|month|year")
+    boundary: str = Field("cyclic", description="Start level of every segment: empty|neutral|cyclic")
+    initial_soc: float = Field(0.5, ge=0, le=1, description="Storage share at segment starts for boundary=neutral")
+    compare: bool = Field(True, description="Also run sequentially and report the deviation")
+    max_workers: Optional[int] = Field(None, ge=1, description="Process pool size (default: CPU count)")
+    series: str = Field("none", description="json|f32|none, as for /optimize")
+    points: Optional[int] = Field(None, ge=1, description="Downsample series to at most N buckets")
+    resolution: str = Field("raw", description="raw|hourly|daily|monthly, as for /optimize")
+    steps: Optional[int] = Field(None, ge=1, description="Dispatch only the first N steps (default: the whole series)")
+
+
+class SurrogateRequest(BaseModel):
+    """Grid for POST /runs/{id}/surrogate."""
+
+    parameters: Optional[Dict[str, Union[List[float], SweepRange]]] = Field(
+        None,
+        description="owned_battery_capacity_mwh / owned_solar_capacity_mw -> values or a start/stop/num range (default: 9 points each around the scenario)",
+    )
+    tolerance: Optional[float] = Field(None, gt=0, description="Interpolation error (share of each KPI's range) that triggers refinement (default 0.01)")
+    resolution: str = Field("raw", description="raw|hourly|daily|monthly, as for /optimize")
+    steps: Optional[int] = Field(None, ge=1, description="Dispatch only the first N steps (default: the whole series)")
+
+
+# -------- Dataset Schemas --------
+
+class DatasetRead(BaseModel):
+    """Upload and conversion state of a content-addressed dataset."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    filename: Optional[str]
+    size_bytes: int
+    status: str
+    progress: float
+    stage: Optional[str]
+    rows: Optional[int]
+    error: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+
+
 # -------- Scenario Schemas --------
 
 class ScenarioCreate(BaseModel):
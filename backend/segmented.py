@@ -0,0 +1,245 @@
+"""Segmented merit-order dispatch in parallel, with boundary storage policies.
+
+The horizon is cut into segments of a nominal length (day, week, month of
+730.5 h, year of 8766 h). Storage levels are not carried from one segment
+to the next; each segment starts from a level set by the boundary policy,
+so the segments are independent and are dispatched across a process pool:
+
+- ``empty``: battery, DSM and thermal store start empty;
+- ``neutral``: battery and thermal store start at ``initial_soc`` (share of
+  capacity), no DSM backlog;
+- ``cyclic``: each segment ends where it started. The start level is found
+  by fixed-point iteration (start empty, restart from the end level) until
+  the levels move less than ``tolerance_mwh``, usually a few passes.
+
+The stitched series and their KPIs can be compared with one sequential
+pass; ``deviation`` reports the differences per KPI and series.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .optimizer import DispatchState, GridStats, IncrementalMeritOrder, MeritOrderConfig, MeritOrderOptimizer, merit_kpis
+
+SEGMENT_HOURS = {"day": 24.0, "week": 168.0, "month": 730.5, "year": 8766.0}
+BOUNDARY_POLICIES = ("empty", "neutral", "cyclic")
+MAX_CYCLIC_PASSES = 20
+# Segments per pool task, so short segments do not drown in IPC.
+_TASKS_PER_WORKER = 4
+
+
+def segment_starts(steps: int, dt_hours: float, segment: str) -> np.ndarray:
+    """First step of every segment (``segment`` from ``SEGMENT_HOURS``)."""
+    if segment not in SEGMENT_HOURS:
+        raise ValueError(f"segment must be one of {', '.join(SEGMENT_HOURS)}")
+    length = max(1, int(round(SEGMENT_HOURS[segment] / float(dt_hours))))
+    return np.arange(0, steps, length)
+
+
+def _start_state(cfg: MeritOrderConfig, policy: str, initial_soc: float) -> DispatchState:
+    if policy == "neutral":
+        share = min(max(float(initial_soc), 0.0), 1.0)
+        return DispatchState(
+            soc=share * max(0.0, float(cfg.battery_energy_mwh)),
+            tes_soc=share * max(0.0, float(cfg.tes_energy_mwh)) if cfg.thermal else 0.0,
+        )
+    return DispatchState()
+
+
+def _levels(state: DispatchState) -> np.ndarray:
+    return np.array([state.soc, state.dsm_soc, state.tes_soc])
+
+
+def dispatch_segment(
+    optimizer: MeritOrderOptimizer,
+    pv_mw: np.ndarray,
+    load_mw: np.ndarray,
+    peak_load_mw: float,
+    policy: str,
+    initial_soc: float = 0.5,
+    tolerance_mwh: float = 1e-6,
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Series of one segment and its boundary info (start/end levels, passes)."""
+    start = _start_state(optimizer.cfg, policy, initial_soc)
+    passes = 0
+    while True:
+        state = DispatchState(start.soc, start.dsm_soc, start.tes_soc)
+        series = optimizer.dispatch(pv_mw, load_mw, state, peak_load_mw)
+        passes += 1
+        gap = float(np.max(np.abs(_levels(state) - _levels(start))))
+        if policy != "cyclic" or gap <= tolerance_mwh or passes >= MAX_CYCLIC_PASSES:
+            break
+        start = state
+    info = {
+        "start": asdict(start),
+        "end": asdict(state),
+        "passes": passes,
+        "cyclic_gap_mwh": gap,
+    }
+    return series, info
+
+
+def _dispatch_segments(
+    pv_mw: np.ndarray,
+    load_mw: np.ndarray,
+    bounds: List[Tuple[int, int]],
+    cfg: Dict[str, Any],
+    peak_load_mw: float,
+    policy: str,
+    initial_soc: float,
+    tolerance_mwh: float,
+) -> List[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+    optimizer = MeritOrderOptimizer(MeritOrderConfig(**cfg))
+    return [
+        dispatch_segment(
+            optimizer,
+            np.asarray(pv_mw[lo:hi], dtype=np.float64),
+            np.asarray(load_mw[lo:hi], dtype=np.float64),
+            peak_load_mw,
+            policy,
+            initial_soc,
+            tolerance_mwh,
+        )
+        for lo, hi in bounds
+    ]
+
+
+# ----------------------------------------------------------------------
+# Worker side (runs in the pool processes)
+# ----------------------------------------------------------------------
+_WORKER_PROFILES: Dict[str, np.ndarray] = {}
+
+
+def _init_worker(pv_path: str, load_path: str) -> None:
+    _WORKER_PROFILES["pv"] = np.load(pv_path, mmap_mode="r")
+    _WORKER_PROFILES["load"] = np.load(load_path, mmap_mode="r")
+
+
+def _run_task(bounds: List[Tuple[int, int]], *args: Any) -> List[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+    return _dispatch_segments(_WORKER_PROFILES["pv"], _WORKER_PROFILES["load"], bounds, *args)
+
+
+# ----------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------
+def segmented_dispatch(
+    pv_mw: np.ndarray,
+    load_mw: np.ndarray,
+    cfg: MeritOrderConfig,
+    segment: str = "day",
+    policy: str = "cyclic",
+    initial_soc: float = 0.5,
+    peak_load_mw: Optional[float] = None,
+    max_workers: Optional[int] = None,
+    compare: bool = True,
+    tolerance_mwh: float = 1e-6,
+) -> Dict[str, Any]:
+    """Dispatch ``cfg`` segment by segment in parallel and stitch the results.
+
+    Returns ``series_mwh``, ``kpis`` and ``dt_hours`` like
+    ``MeritOrderOptimizer.run``, plus per-segment ``boundaries`` and, with
+    ``compare``, the ``deviation`` from a sequential pass. The DSM limit is
+    sized on ``peak_load_mw`` (default: the series peak) in both.
+    """
+    if policy not in BOUNDARY_POLICIES:
+        raise ValueError(f"boundary policy must be one of {', '.join(BOUNDARY_POLICIES)}")
+    pv_mw = np.asarray(pv_mw, dtype=np.float64)
+    load_mw = np.asarray(load_mw, dtype=np.float64)
+    if pv_mw.shape != load_mw.shape:
+        raise ValueError("pv and load must have same length")
+    n = len(pv_mw)
+    if n == 0:
+        raise ValueError("no steps to dispatch")
+    dt = float(cfg.dt_hours)
+    if peak_load_mw is None:
+        peak_load_mw = float(np.max(load_mw))
+    starts = segment_starts(n, dt, segment)
+    bounds = list(zip(starts.tolist(), [*starts[1:].tolist(), n]))
+    args = (asdict(cfg), float(peak_load_mw), policy, float(initial_soc), float(tolerance_mwh))
+
+    started = time.perf_counter()
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(bounds)))
+    if workers == 1:
+        parts = _dispatch_segments(pv_mw, load_mw, bounds, *args)
+    else:
+        per_task = max(1, -(-len(bounds) // (workers * _TASKS_PER_WORKER)))
+        tasks = [bounds[i:i + per_task] for i in range(0, len(bounds), per_task)]
+        with tempfile.TemporaryDirectory(prefix="segmented-") as tmp:
+            pv_path, load_path = Path(tmp) / "pv.npy", Path(tmp) / "load.npy"
+            np.save(pv_path, pv_mw)
+            np.save(load_path, load_mw)
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(str(pv_path), str(load_path))) as pool:
+                parts = [part for done in pool.map(_run_task, tasks, *([arg] * len(tasks) for arg in args)) for part in done]
+    elapsed = time.perf_counter() - started
+
+    optimizer = MeritOrderOptimizer(cfg)
+    series = {name: np.concatenate([part[0][name] for part in parts]) for name in parts[0][0]}
+    stats = GridStats()
+    eta_tr = float(max(cfg.transformer_efficiency, 1e-9))
+    stats.update(series["grid_import_mwh"] / (dt * eta_tr), series["pv_export_mwh"] / dt)
+    pv_scaled = optimizer.scaled_pv(pv_mw)
+    heat_mw = optimizer.heat_demand(load_mw)
+    heat_demand_mwh = float(np.sum(np.maximum(heat_mw, 0.0)) * dt) if heat_mw is not None else None
+    kpis = merit_kpis(
+        cfg,
+        {name: float(np.sum(values)) for name, values in series.items()},
+        float(np.sum(pv_scaled) * dt),
+        float(np.sum(load_mw) * dt),
+        stats,
+        heat_demand_mwh,
+    )
+    result: Dict[str, Any] = {
+        "series_mwh": series,
+        "kpis": kpis,
+        "dt_hours": dt,
+        "segment": segment,
+        "policy": policy,
+        "segments": len(bounds),
+        "workers": workers,
+        "elapsed_s": elapsed,
+        "boundaries": [{"start_step": lo, "steps": hi - lo, **part[1]} for (lo, hi), part in zip(bounds, parts)],
+    }
+    if compare:
+        started = time.perf_counter()
+        sequential = IncrementalMeritOrder(cfg, peak_load_mw)
+        sequential.advance(pv_mw, load_mw)
+        reference = sequential.result()
+        result["sequential_elapsed_s"] = time.perf_counter() - started
+        result["deviation"] = dispatch_deviation(reference, result)
+    return result
+
+
+def dispatch_deviation(reference: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Differences of ``result`` from a ``reference`` run, per KPI and per series."""
+    kpis = {}
+    for name, ref in reference["kpis"].items():
+        value = result["kpis"].get(name)
+        if value is None:
+            continue
+        diff = float(value) - float(ref)
+        kpis[name] = {
+            "sequential": float(ref),
+            "segmented": float(value),
+            "abs": diff,
+            "rel": diff / abs(ref) if abs(ref) > 1e-9 else 0.0,
+        }
+    series = {}
+    for name, ref in reference["series_mwh"].items():
+        values = result["series_mwh"].get(name)
+        if values is None or len(values) != len(ref):
+            continue
+        delta = np.abs(values - ref)
+        series[name] = {
+            "max_abs_mwh": float(np.max(delta)) if len(delta) else 0.0,
+            "sum_abs_mwh": float(np.sum(delta)),
+        }
+    return {"kpis": kpis, "series": series}
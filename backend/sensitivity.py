@@ -0,0 +1,281 @@
+"""Sensitivity sweeps of the merit-order dispatch over scenario parameters.
+
+A sweep is the Cartesian grid of value lists for some scenario override
+keys (PV capacity, battery size, C-rate, efficiencies, DSM share, TES size
+when the scenario has a heat pump). Grid
+points become ``MeritOrderConfig`` objects, are grouped into chunks that
+share a PV scale and are dispatched with ``BatchMeritOrderOptimizer`` in a
+process pool. The PV and load profiles are written once to ``.npy`` files
+that every worker memory-maps read-only, so the pool shares one copy of the
+data. Jobs run in a background thread and report progress per chunk; a
+cancelled job drops its queued chunks and stops after the running ones.
+"""
+
+from __future__ import annotations
+
+import base64
+import itertools
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+import numpy as np
+
+from .optimizer import KPI_NAMES, THERMAL_KPI_NAMES, BatchMeritOrderOptimizer, MeritOrderConfig, build_config_from_overrides
+
+logger = logging.getLogger(__name__)
+
+SWEEP_PARAMETERS = (
+    "owned_solar_capacity_mw",
+    "owned_battery_capacity_mwh",
+    "batt_power_c_rate",
+    "batt_eta_charge",
+    "batt_eta_discharge",
+    "flexible_load_share",
+    "max_shift_hours",
+    "tes_capacity_mwh",
+)
+MAX_POINTS = 10_000
+CHUNK_CONFIGS = 32
+
+
+def sweep_axes(parameters: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Value list per parameter from ``[v, ...]`` or ``{"start", "stop", "num"}`` specs."""
+    if not parameters:
+        raise ValueError("at least one parameter range is required")
+    axes: Dict[str, np.ndarray] = {}
+    for name, spec in parameters.items():
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError(f"cannot sweep '{name}'; expected one of {', '.join(SWEEP_PARAMETERS)}")
+        if isinstance(spec, dict):
+            values = np.linspace(float(spec["start"]), float(spec["stop"]), int(spec.get("num", 5)))
+        else:
+            values = np.asarray(spec, dtype=np.float64).ravel()
+        if values.size == 0 or not np.all(np.isfinite(values)):
+            raise ValueError(f"'{name}' needs at least one finite value")
+        axes[name] = values
+    points = int(np.prod([values.size for values in axes.values()]))
+    if points > MAX_POINTS:
+        raise ValueError(f"grid has {points} points; the limit is {MAX_POINTS}")
+    return axes
+
+
+def grid_configs(
+    axes: Dict[str, np.ndarray],
+    base_overrides: Optional[Dict[str, Any]],
+    dt_hours: float,
+    solar_reference_mw: Optional[float],
+) -> List[MeritOrderConfig]:
+    """One configuration per grid point, in C order of ``axes``.
+
+    PV is only rescaled when ``owned_solar_capacity_mw`` is a swept axis:
+    each value over ``solar_reference_mw``, the capacity the unscaled series
+    stands for (see ``pv_reference_mw``). Otherwise the series is used as
+    is, as ``/optimize`` and the other engines do, whatever the scenario's
+    own ``owned_solar_capacity_mw``.
+    """
+    names = list(axes)
+    reference = solar_reference_mw if "owned_solar_capacity_mw" in axes else None
+    return [
+        build_config_from_overrides({**(base_overrides or {}), **dict(zip(names, point))}, dt_hours, reference)
+        for point in itertools.product(*(values.tolist() for values in axes.values()))
+    ]
+
+
+def pv_reference_mw(overrides: Optional[Dict[str, Any]], series_peak_mw: float) -> float:
+    """Installed PV capacity (MW) the unscaled PV series stands for.
+
+    The scenario's own ``owned_solar_capacity_mw`` when it has one, so that
+    sweeping through that value dispatches the series unscaled (as
+    ``/optimize`` does); otherwise the series peak.
+    """
+    own = float((overrides or {}).get("owned_solar_capacity_mw") or 0.0)
+    return own if own > 0.0 else float(series_peak_mw)
+
+
+@dataclass
+class SensitivityJob:
+    """State of one sweep; ``kpis`` has shape (*axis lengths, len(kpi_names))."""
+
+    job_id: str
+    axes: Dict[str, np.ndarray]
+    steps: int
+    total: int
+    done: int = 0
+    status: str = "pending"  # pending | running | completed | cancelled | failed
+    error: Optional[str] = None
+    kpis: Optional[np.ndarray] = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    kpi_names: Sequence[str] = KPI_NAMES
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 1.0
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "points_done": self.done,
+            "points": self.total,
+            "steps": self.steps,
+            "error": self.error,
+            "elapsed_s": round((self.finished_at or time.time()) - self.started_at, 3),
+            "parameters": list(self.axes),
+            "axes": {name: values.tolist() for name, values in self.axes.items()},
+            "kpi_names": list(self.kpi_names),
+        }
+        if include_result and self.kpis is not None and self.status == "completed":
+            values = np.ascontiguousarray(self.kpis, dtype="<f8")
+            out["kpis"] = {
+                "shape": list(values.shape),
+                "dtype": "<f8",
+                "order": "C",
+                "data": base64.b64encode(values.tobytes()).decode("ascii"),
+            }
+        return out
+
+
+# ----------------------------------------------------------------------
+# Worker side (runs in the pool processes)
+# ----------------------------------------------------------------------
+_WORKER_PROFILES: Dict[str, np.ndarray] = {}
+
+
+def _init_worker(pv_path: str, load_path: str) -> None:
+    _WORKER_PROFILES["pv"] = np.load(pv_path, mmap_mode="r")
+    _WORKER_PROFILES["load"] = np.load(load_path, mmap_mode="r")
+
+
+def _run_chunk(indices: Sequence[int], configs: Sequence[Dict[str, Any]], peak_load_mw: float) -> Tuple[Sequence[int], np.ndarray]:
+    batch = BatchMeritOrderOptimizer([MeritOrderConfig(**cfg) for cfg in configs])
+    result = batch.run(_WORKER_PROFILES["pv"], _WORKER_PROFILES["load"], peak_load_mw=peak_load_mw)
+    return indices, result["kpis"]
+
+
+# ----------------------------------------------------------------------
+# Engine
+# ----------------------------------------------------------------------
+class SensitivityEngine:
+    """Runs sweeps in a process pool and keeps their state for polling."""
+
+    def __init__(self, max_workers: Optional[int] = None, keep_jobs: int = 32) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.keep_jobs = keep_jobs
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, SensitivityJob] = {}
+
+    def submit(
+        self,
+        pv_mw: np.ndarray,
+        load_mw: np.ndarray,
+        configs: Sequence[MeritOrderConfig],
+        axes: Dict[str, np.ndarray],
+        peak_load_mw: Optional[float] = None,
+    ) -> SensitivityJob:
+        """Start a sweep of ``configs`` (one per grid point of ``axes``) in the background."""
+        job = SensitivityJob(job_id=uuid4().hex, axes=axes, steps=len(pv_mw), total=len(configs))
+        if configs and configs[0].thermal:
+            job.kpi_names = (*KPI_NAMES, *THERMAL_KPI_NAMES)
+        if peak_load_mw is None:
+            peak_load_mw = float(np.max(load_mw)) if len(load_mw) else 0.0
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        thread = threading.Thread(
+            target=self._execute,
+            args=(job, np.asarray(pv_mw, dtype=np.float64), np.asarray(load_mw, dtype=np.float64), list(configs), float(peak_load_mw)),
+            name=f"sensitivity-{job.job_id[:8]}",
+            daemon=True,
+        )
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> SensitivityJob:
+        with self._lock:
+            if job_id not in self._jobs:
+                raise KeyError(f"Unknown sensitivity job: {job_id}")
+            return self._jobs[job_id]
+
+    def cancel(self, job_id: str) -> SensitivityJob:
+        job = self.get(job_id)
+        job.cancel()
+        return job
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+
+    def _prune(self) -> None:
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in sorted(finished, key=lambda item: item.finished_at or 0.0)[: max(0, len(self._jobs) - self.keep_jobs)]:
+            del self._jobs[job.job_id]
+
+    def _execute(
+        self,
+        job: SensitivityJob,
+        pv_mw: np.ndarray,
+        load_mw: np.ndarray,
+        configs: List[MeritOrderConfig],
+        peak_load_mw: float,
+    ) -> None:
+        job.status = "running"
+        kpis = np.full((len(configs), len(job.kpi_names)), np.nan)
+        try:
+            with tempfile.TemporaryDirectory(prefix="sensitivity-") as tmp:
+                pv_path, load_path = Path(tmp) / "pv.npy", Path(tmp) / "load.npy"
+                np.save(pv_path, pv_mw)
+                np.save(load_path, load_mw)
+                chunks = self._chunks(configs)
+                workers = max(1, min(self.max_workers, len(chunks)))
+                with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(str(pv_path), str(load_path))) as pool:
+                    pending = {
+                        pool.submit(_run_chunk, indices, [asdict(configs[i]) for i in indices], peak_load_mw)
+                        for indices in chunks
+                    }
+                    while pending:
+                        finished, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            indices, values = future.result()
+                            kpis[list(indices)] = values
+                            job.done += len(indices)
+                        if job._cancel.is_set():
+                            for future in pending:
+                                future.cancel()
+                            pool.shutdown(wait=True, cancel_futures=True)
+                            job.status = "cancelled"
+                            return
+            job.kpis = kpis.reshape(*(values.size for values in job.axes.values()), len(job.kpi_names))
+            job.status = "completed"
+        except Exception as exc:
+            logger.exception("Sensitivity job %s failed", job.job_id)
+            job.status = "failed"
+            job.error = str(exc)
+        finally:
+            job.finished_at = time.time()
+
+    @staticmethod
+    def _chunks(configs: Sequence[MeritOrderConfig]) -> List[List[int]]:
+        """Indices grouped by PV scale (the batch engine needs one) in chunks of ``CHUNK_CONFIGS``."""
+        groups: Dict[float, List[int]] = {}
+        for index, cfg in enumerate(configs):
+            groups.setdefault(float(cfg.pv_scale), []).append(index)
+        return [
+            indices[lo:lo + CHUNK_CONFIGS]
+            for indices in groups.values()
+            for lo in range(0, len(indices), CHUNK_CONFIGS)
+        ]
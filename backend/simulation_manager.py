@@ -9,6 +9,12 @@ from uuid import uuid4
 
 import numpy as np
 
+from .dataset_registry import DatasetRegistry, SharedDataset
+from .live import LIVE_COLUMNS, LiveDataset
+from .result_cache import ResultCache
+from .sensitivity import SensitivityEngine
+from .surrogate import SurrogateEngine
+
 if TYPE_CHECKING:  # pragma: no cover
     from environment import RenewableMultiAgentEnv  # type: ignore
     from generator import MultiHorizonForecastGenerator  # type: ignore
@@ -20,10 +26,19 @@ class SimulationSettings:
     """Runtime configuration used when spawning environments."""
 
     data_path: Path = Path("trainingdata.csv")
+    dataset_id: Optional[str] = None
     investment_freq: int = 12
     enable_forecasts: bool = False
+    float32_columns: bool = False
+    scenario_key: Optional[str] = None
+    live: bool = False
     model_dir: Path = Path("saved_models")
     scaler_dir: Path = Path("saved_scalers")
+    dataset_dir: Path = Path("datasets")
+    # Optimizer result cache: in-memory budget and optional persistent tier.
+    result_cache_bytes: int = 256 * 2**20
+    result_cache_dir: Optional[Path] = None
+    result_cache_disk_bytes: int = 2 * 2**30
 
     def resolve(self, base_dir: Optional[Path] = None) -> "SimulationSettings":
         """Return a copy with absolute paths resolved."""
@@ -31,10 +46,18 @@ class SimulationSettings:
             base_dir = Path.cwd()
         resolved = SimulationSettings(
             data_path=(base_dir / self.data_path).resolve(),
+            dataset_id=self.dataset_id,
             investment_freq=self.investment_freq,
             enable_forecasts=self.enable_forecasts,
+            float32_columns=self.float32_columns,
+            scenario_key=self.scenario_key,
+            live=self.live,
             model_dir=(base_dir / self.model_dir).resolve(),
             scaler_dir=(base_dir / self.scaler_dir).resolve(),
+            dataset_dir=(base_dir / self.dataset_dir).resolve(),
+            result_cache_bytes=self.result_cache_bytes,
+            result_cache_dir=(base_dir / self.result_cache_dir).resolve() if self.result_cache_dir else None,
+            result_cache_disk_bytes=self.result_cache_disk_bytes,
         )
         return resolved
 
@@ -47,6 +70,9 @@ class SimulationSession:
     env: RenewableMultiAgentEnv
     wrapper: Optional[Any] = None
     forecast_generator: Optional[Any] = None
+    dataset: Optional[SharedDataset] = None
+    # Resumable optimizer state per resolution (see /runs/{id}/optimize).
+    dispatch: Dict[str, Any] = field(default_factory=dict)
     last_observation: Optional[Dict[str, Any]] = None
     last_info: Optional[Dict[str, Any]] = None
     steps_taken: int = 0
@@ -63,6 +89,14 @@ class SimulationManager:
     def __init__(self, settings: Optional[SimulationSettings] = None):
         self.settings = (settings or SimulationSettings()).resolve(Path.cwd())
         self._sessions: Dict[str, SimulationSession] = {}
+        self.datasets = DatasetRegistry()
+        self.results = ResultCache(
+            self.settings.result_cache_bytes,
+            self.settings.result_cache_dir,
+            self.settings.result_cache_disk_bytes,
+        )
+        self.sensitivity = SensitivityEngine()
+        self.surrogates = SurrogateEngine()
 
     # ------------------------------------------------------------------
     # Lifecycle helpers
@@ -85,6 +119,7 @@ class SimulationManager:
     def shutdown_global(cls) -> None:
         """Dispose of any active sessions and drop the global manager."""
         if cls._global_manager is not None:
+            cls._global_manager.sensitivity.shutdown()
             cls._global_manager.close_all()
             cls._global_manager = None
 
@@ -98,11 +133,9 @@ class SimulationManager:
 
         # Forecasting is optional; instantiate lazily to avoid heavy startup costs
         forecast_generator: Optional[Any] = None
-        wrapper: Optional[Any] = None
 
         if settings.enable_forecasts:
             from generator import MultiHorizonForecastGenerator  # type: ignore
-            from wrapper import MultiHorizonWrapperEnv  # type: ignore
 
             forecast_generator = MultiHorizonForecastGenerator(
                 model_dir=str(settings.model_dir),
@@ -110,7 +143,30 @@ class SimulationManager:
                 fallback_mode=True,
                 verbose=False,
             )
-        data = self._load_data(settings.data_path)
+        dataset = self.datasets.acquire(
+            settings.data_path,
+            float32=settings.float32_columns,
+            scenario_key=settings.scenario_key,
+            live=settings.live,
+        )
+        try:
+            session = self._build_session(settings, dataset, forecast_generator, config_overrides)
+        except Exception:
+            self.datasets.release(dataset.key)
+            raise
+        self._sessions[session.session_id] = session
+        return session
+
+    def _build_session(
+        self,
+        settings: SimulationSettings,
+        dataset: SharedDataset,
+        forecast_generator: Optional[Any],
+        config_overrides: Optional[Dict[str, Any]],
+    ) -> SimulationSession:
+        """Wire an environment around a borrowed dataset."""
+        wrapper: Optional[Any] = None
+        data = dataset.frame
 
         # Build EnhancedConfig and apply overrides if provided
         config_obj = None
@@ -139,9 +195,12 @@ class SimulationManager:
             env = _MinimalEnv(
                 data=data,
                 investment_freq=settings.investment_freq,
+                live=dataset.live,
             )
 
         if forecast_generator is not None:
+            from wrapper import MultiHorizonWrapperEnv  # type: ignore
+
             wrapper = MultiHorizonWrapperEnv(
                 env,
                 forecast_generator,
@@ -151,16 +210,15 @@ class SimulationManager:
 
         observations, info = self._reset_environment(env, wrapper)
 
-        session = SimulationSession(
+        return SimulationSession(
             session_id=str(uuid4()),
             env=env,
             wrapper=wrapper,
             forecast_generator=forecast_generator,
+            dataset=dataset,
             last_observation=observations,
             last_info=info,
         )
-        self._sessions[session.session_id] = session
-        return session
 
     def close_session(self, session_id: str) -> None:
         """Close and remove a session if it exists."""
@@ -168,11 +226,13 @@ class SimulationManager:
         if session is None:
             return
         self._safe_close(session)
+        self._release_dataset(session)
 
     def close_all(self) -> None:
         """Dispose of every tracked session."""
         for session in list(self._sessions.values()):
             self._safe_close(session)
+            self._release_dataset(session)
         self._sessions.clear()
 
     def get_session(self, session_id: str) -> SimulationSession:
@@ -234,10 +294,10 @@ class SimulationManager:
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
-    def _load_data(self, path: Path):
-        from .data_loader import load_energy_dataframe
-
-        return load_energy_dataframe(path)
+    def _release_dataset(self, session: SimulationSession) -> None:
+        if session.dataset is not None:
+            self.datasets.release(session.dataset.key)
+            session.dataset = None
 
     @staticmethod
     def _reset_environment(env: RenewableMultiAgentEnv, wrapper: Optional[Any]):
@@ -321,23 +381,58 @@ class _MinimalEnv:
     """Single-agent minimal env to keep API usable without external package.
 
     Exposes arrays and a simple step/reset so charts and PED endpoints work.
+    The arrays are zero-copy views of the (possibly memory-mapped) columns.
+    With a ``live`` dataset the arrays track its growth: stepping past the
+    last row polls the source file and holds at the end (instead of
+    terminating) until new rows arrive.
     """
 
-    def __init__(self, data, investment_freq: int = 12):
-        self.data = data
+    def __init__(self, data, investment_freq: int = 12, live: Optional[LiveDataset] = None):
+        self._data = data
+        self._live = live
         self.investment_freq = int(investment_freq)
         self.agents = ["manager"]
-        n = len(data)
-        self._wind = (data["wind"].to_numpy() if "wind" in data.columns else np.zeros(n))
-        self._solar = (data["solar"].to_numpy() if "solar" in data.columns else np.zeros(n))
-        self._hydro = (data["hydro"].to_numpy() if "hydro" in data.columns else np.zeros(n))
-        self._load = (data["load"].to_numpy() if "load" in data.columns else np.zeros(n))
-        self._price = (data["price"].to_numpy() if "price" in data.columns else np.zeros(n))
+        self._columns = {name: self._column(data, name) for name in LIVE_COLUMNS}
         self.t = 0
         self.equity = None
         self.budget = None
         self.last_revenue = 0.0
 
+    @staticmethod
+    def _column(data, name: str) -> np.ndarray:
+        if name in data.columns:
+            return data[name].to_numpy(copy=False)
+        return np.zeros(len(data))
+
+    def _series(self, name: str) -> np.ndarray:
+        if self._live is not None:
+            return self._live.column(name)
+        return self._columns[name]
+
+    @property
+    def data(self):
+        return self._live.frame() if self._live is not None else self._data
+
+    @property
+    def _wind(self) -> np.ndarray:
+        return self._series("wind")
+
+    @property
+    def _solar(self) -> np.ndarray:
+        return self._series("solar")
+
+    @property
+    def _hydro(self) -> np.ndarray:
+        return self._series("hydro")
+
+    @property
+    def _load(self) -> np.ndarray:
+        return self._series("load")
+
+    @property
+    def _price(self) -> np.ndarray:
+        return self._series("price")
+
     def action_space(self, agent):
         return _Space(shape=(1,), dtype=np.float32)
 
@@ -349,6 +444,13 @@ class _MinimalEnv:
 
     def step(self, actions):
         idx = self.t
+        if self._live is not None and idx >= self._live.rows:
+            self._live.poll()
+            if idx >= self._live.rows:
+                # Caught up with the live feed: hold position until rows arrive.
+                self.last_revenue = 0.0
+                obs = {"manager": self._build_obs(self.t)}
+                return obs, {"manager": 0.0}, {"manager": False}, {"manager": False}, {"waiting_for_data": True}
         pv = float(self._solar[idx] + self._wind[idx] + self._hydro[idx]) if idx < len(self._load) else 0.0
         load = float(self._load[idx]) if idx < len(self._load) else 0.0
         price = float(self._price[idx]) if idx < len(self._price) else 0.0
@@ -357,7 +459,7 @@ class _MinimalEnv:
 
         self.t = min(idx + 1, len(self._load))
 
-        term = {"manager": self.t >= len(self._load)}
+        term = {"manager": self._live is None and self.t >= len(self._load)}
         trunc = {"manager": False}
         rew = {"manager": float(self.last_revenue)}
         obs = {"manager": self._build_obs(self.t)}
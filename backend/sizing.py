@@ -0,0 +1,129 @@
+"""Smallest battery that meets a KPI target.
+
+The merit-order KPIs are monotone in battery energy (a larger store never
+imports more or exports more), so the smallest size that meets a target is
+found by bracketing (doubling from a small guess) followed by bisection,
+typically in 10-20 dispatch evaluations. Each evaluation is a
+single-configuration run of :class:`BatchMeritOrderOptimizer`.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .optimizer import KPI_NAMES, BatchMeritOrderOptimizer, MeritOrderConfig
+
+# Target name -> True when the KPI must reach at least the target value
+# (it rises with battery size), False when it must stay at or below it.
+SIZING_TARGETS: Dict[str, bool] = {
+    "self_sufficiency": True,
+    "grid_import_mwh": False,
+    "export_mwh": False,
+}
+
+
+@dataclass
+class SizingResult:
+    """Outcome of :func:`size_battery`; sizes in MWh."""
+
+    target: str
+    value: float
+    feasible: bool
+    battery_energy_mwh: Optional[float]
+    achieved: Optional[float]
+    lower_mwh: float
+    upper_mwh: float
+    max_useful_mwh: float
+    evaluations: List[Dict[str, float]] = field(default_factory=list)
+
+
+def _kpi(kpis: np.ndarray, name: str) -> float:
+    return float(kpis[KPI_NAMES.index(name)])
+
+
+def size_battery(
+    pv_mw: np.ndarray,
+    load_mw: np.ndarray,
+    base: MeritOrderConfig,
+    target: str,
+    value: float,
+    tolerance_mwh: Optional[float] = None,
+    max_battery_mwh: Optional[float] = None,
+    peak_load_mw: Optional[float] = None,
+    max_evaluations: int = 60,
+) -> SizingResult:
+    """Smallest ``battery_energy_mwh`` whose KPI ``target`` meets ``value``.
+
+    ``self_sufficiency`` is the dispatch KPI: the share of demand met on
+    site (0..1), neither imported nor left unserved. The answer is within
+    ``tolerance_mwh`` above the exact threshold (default: 0.1% of the
+    answer). Beyond the total PV surplus a bigger battery can
+    never fill further, so that size (or ``max_battery_mwh``) bounds the
+    search; if it still misses the target the result is infeasible and
+    reports the best achievable KPI.
+    """
+    if target not in SIZING_TARGETS:
+        raise ValueError(f"unknown target '{target}'; expected one of {', '.join(SIZING_TARGETS)}")
+    rising = SIZING_TARGETS[target]
+    pv_mw = np.asarray(pv_mw, dtype=np.float64)
+    load_mw = np.asarray(load_mw, dtype=np.float64)
+    if peak_load_mw is None:
+        peak_load_mw = float(np.max(load_mw)) if len(load_mw) else 0.0
+    dt = float(base.dt_hours)
+    evaluations: List[Dict[str, float]] = []
+
+    def evaluate(size: float) -> float:
+        if len(evaluations) >= max_evaluations:
+            raise RuntimeError(f"no convergence within {max_evaluations} evaluations")
+        cfg = replace(base, battery_energy_mwh=float(size))
+        kpis = BatchMeritOrderOptimizer([cfg]).run(pv_mw, load_mw, peak_load_mw=peak_load_mw)["kpis"][0]
+        achieved = _kpi(kpis, target)
+        evaluations.append({"battery_energy_mwh": float(size), target: achieved})
+        return achieved
+
+    def meets(achieved: float) -> bool:
+        return achieved >= value if rising else achieved <= value
+
+    surplus = float(np.sum(np.maximum(pv_mw * float(base.pv_scale) - load_mw, 0.0)) * dt)
+    upper = surplus * float(max(base.eta_charge, 0.0))
+    if max_battery_mwh is not None:
+        upper = min(upper, float(max_battery_mwh))
+    upper = max(upper, 0.0)
+
+    def tolerance(size: float) -> float:
+        return float(tolerance_mwh) if tolerance_mwh else max(size * 1e-3, 1e-6)
+
+    def result(size: Optional[float], achieved: Optional[float], lo: float, hi: float, feasible: bool) -> SizingResult:
+        return SizingResult(target, float(value), feasible, size, achieved, lo, hi, upper, evaluations)
+
+    achieved = evaluate(0.0)
+    if meets(achieved):
+        return result(0.0, achieved, 0.0, 0.0, True)
+
+    # Bracket: double from one hour of mean load until the target is met.
+    lo, hi = 0.0, min(upper, max(float(np.mean(np.abs(load_mw))) if len(load_mw) else 0.0, 1e-6))
+    while True:
+        if hi <= lo:
+            break
+        achieved_hi = evaluate(hi)
+        if meets(achieved_hi):
+            break
+        lo = hi
+        if hi >= upper:
+            return result(None, achieved_hi, lo, hi, False)
+        hi = min(hi * 2.0, upper)
+    if hi <= lo:
+        return result(None, achieved, lo, hi, False)
+
+    # Bisect: ``lo`` misses the target, ``hi`` meets it.
+    while hi - lo > tolerance(hi):
+        mid = 0.5 * (lo + hi)
+        achieved_mid = evaluate(mid)
+        if meets(achieved_mid):
+            hi, achieved_hi = mid, achieved_mid
+        else:
+            lo = mid
+    return result(hi, achieved_hi, lo, hi, True)
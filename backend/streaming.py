@@ -0,0 +1,190 @@
+"""Constant-memory merit-order dispatch of inputs that arrive in chunks.
+
+For horizons too long to hold in memory (multi-year, 1-minute data) the
+inputs are consumed chunk by chunk, from a generator or from slices of
+memory-mapped columns (``iter_chunks``). The carry state is that of
+:class:`~backend.optimizer.IncrementalMeritOrder` (storage levels, running
+KPI sums, grid statistics) without its series buffers, so memory is bounded
+by the chunk size. Each chunk's series are handed to a sink: any callable
+taking a :class:`StreamChunk`, such as :class:`BucketSink` (aggregates into
+fixed buckets) or :class:`NpySink` (appends to files on disk). A sink with
+a ``close`` method is closed when the stream ends.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+
+from .live import GrowableArray
+from .optimizer import IncrementalMeritOrder, MeritOrderConfig
+
+DEFAULT_CHUNK_STEPS = 65536
+
+
+@dataclass
+class StreamChunk:
+    """Series (MWh per step) of the steps ``[start, start + steps)``."""
+
+    start: int
+    steps: int
+    dt_hours: float
+    series: Dict[str, np.ndarray]
+
+
+Sink = Callable[[StreamChunk], Any]
+
+
+def iter_chunks(
+    pv_mw: np.ndarray,
+    load_mw: np.ndarray,
+    heat_mw: Optional[np.ndarray] = None,
+    chunk_steps: int = DEFAULT_CHUNK_STEPS,
+) -> Iterator[tuple]:
+    """``(pv, load[, heat])`` chunks of (possibly memory-mapped) arrays, copied to float64."""
+    for lo in range(0, len(pv_mw), chunk_steps):
+        hi = lo + chunk_steps
+        chunk = (np.array(pv_mw[lo:hi], dtype=np.float64), np.array(load_mw[lo:hi], dtype=np.float64))
+        yield chunk if heat_mw is None else (*chunk, np.array(heat_mw[lo:hi], dtype=np.float64))
+
+
+def series_peak(values: np.ndarray, chunk_steps: int = DEFAULT_CHUNK_STEPS) -> float:
+    """Maximum of a (memory-mapped) array, read chunk by chunk."""
+    peak = 0.0
+    for lo in range(0, len(values), chunk_steps):
+        peak = max(peak, float(np.max(values[lo:lo + chunk_steps])))
+    return peak
+
+
+class StreamingMeritOrder(IncrementalMeritOrder):
+    """Merit-order dispatch over a stream of chunks with bounded memory.
+
+    The DSM power limit is a share of the whole horizon's peak load, which a
+    stream cannot know in advance: pass ``peak_load_mw`` (``series_peak``
+    computes it for memory-mapped inputs) when the configuration has DSM.
+    Chunk boundaries do not change the result, which equals
+    ``MeritOrderOptimizer.run`` over the concatenated inputs.
+    """
+
+    def __init__(self, cfg: MeritOrderConfig, peak_load_mw: Optional[float] = None):
+        if peak_load_mw is None and cfg.flexible_load_share > 0:
+            raise ValueError("peak_load_mw is required for a configuration with DSM")
+        super().__init__(cfg, peak_load_mw or 0.0, keep_series=False)
+
+    def run(self, chunks: Iterable[Sequence[np.ndarray]], sink: Optional[Sink] = None) -> Dict[str, Any]:
+        """Dispatch ``(pv, load[, heat])`` chunks, feeding ``sink``; returns ``result()``."""
+        dt = float(self.cfg.dt_hours)
+        try:
+            for chunk in chunks:
+                start = self.steps
+                series = self.advance_chunk(*chunk)
+                if sink is not None and series:
+                    sink(StreamChunk(start, self.steps - start, dt, series))
+        finally:
+            close = getattr(sink, 'close', None)
+            if close is not None:
+                close()
+        return {**self.result(), 'steps': self.steps}
+
+
+class BucketSink:
+    """Aggregates streamed series into buckets of ``bucket_steps`` steps.
+
+    Energies are summed and storage levels (``*soc_mwh``) averaged; memory
+    grows with the number of buckets only.
+    """
+
+    def __init__(self, bucket_steps: int):
+        if bucket_steps < 1:
+            raise ValueError("bucket_steps must be positive")
+        self.bucket_steps = int(bucket_steps)
+        self._series: Dict[str, GrowableArray] = {}
+        self._counts = GrowableArray(np.int64)
+        self._open: Dict[str, float] = {}
+        self._open_steps = 0
+
+    def __call__(self, chunk: StreamChunk) -> None:
+        offset = chunk.start % self.bucket_steps
+        # Bucket of each step, relative to the bucket the chunk starts in.
+        ids = (np.arange(chunk.steps) + offset) // self.bucket_steps
+        counts = np.bincount(ids)
+        counts[0] += self._open_steps
+        for name, values in chunk.series.items():
+            sums = np.bincount(ids, weights=values, minlength=len(counts))
+            sums[0] += self._open.get(name, 0.0)
+            if name not in self._series:
+                self._series[name] = GrowableArray(np.float64)
+            self._series[name].append(sums[:-1])
+            self._open[name] = float(sums[-1])
+        self._counts.append(counts[:-1])
+        self._open_steps = int(counts[-1])
+        if self._open_steps == self.bucket_steps:
+            self._flush()
+
+    def _flush(self) -> None:
+        for name, total in self._open.items():
+            self._series[name].append([total])
+        self._counts.append([self._open_steps])
+        self._open = {name: 0.0 for name in self._open}
+        self._open_steps = 0
+
+    def close(self) -> None:
+        if self._open_steps:
+            self._flush()
+
+    @property
+    def bucket_counts(self) -> np.ndarray:
+        return self._counts.values
+
+    @property
+    def series(self) -> Dict[str, np.ndarray]:
+        """Completed buckets; storage levels averaged over their steps."""
+        counts = np.maximum(self.bucket_counts, 1)
+        return {
+            name: array.values / counts if name.endswith('soc_mwh') else array.values
+            for name, array in self._series.items()
+        }
+
+
+class NpySink:
+    """Appends streamed series to ``<directory>/<name>.npy``, one file per series.
+
+    Each file gets a ``.npy`` header for its final length when the stream is
+    closed, so the results can be read back with ``np.load(..., mmap_mode="r")``.
+    """
+
+    # Room for any shape in the header, so it can be rewritten in place.
+    _HEADER_BYTES = 128
+
+    def __init__(self, directory: Path, dtype: Any = np.float32):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self._files: Dict[str, IO[bytes]] = {}
+        self.steps = 0
+
+    def __call__(self, chunk: StreamChunk) -> None:
+        for name, values in chunk.series.items():
+            handle = self._files.get(name)
+            if handle is None:
+                handle = (self.directory / f"{name}.npy").open('wb')
+                handle.write(b'\0' * self._HEADER_BYTES)
+                self._files[name] = handle
+            handle.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.steps = chunk.start + chunk.steps
+
+    def close(self) -> None:
+        for handle in self._files.values():
+            handle.seek(0)
+            header = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': (self.steps,)}
+            text = repr(header).encode('latin1')
+            prefix = np.lib.format.MAGIC_PREFIX + bytes([1, 0])
+            size = self._HEADER_BYTES - len(prefix) - 2
+            handle.write(prefix + size.to_bytes(2, 'little') + text.ljust(size - 1) + b'\n')
+            handle.close()
+        (self.directory / 'stream.json').write_text(json.dumps({'steps': self.steps, 'series': sorted(self._files)}))
+        self._files = {}
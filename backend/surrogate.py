@@ -0,0 +1,329 @@
+"""Precomputed KPI surfaces for instant what-if queries.
+
+For a dataset and a base scenario, the KPIs are dispatched once on a grid
+of battery sizes x PV capacities with ``BatchMeritOrderOptimizer``, and
+queries are answered by bilinear interpolation on that grid (microseconds,
+no dispatch). Every grid cell carries an error estimate from the curvature
+of the KPIs around it (the bilinear error is about h**2/8 times the second
+derivative along each axis), relative to each KPI's range.
+PV capacities scale the series relative to the capacity it stands for
+(the scenario's own, see ``backend.sensitivity.pv_reference_mw``), so the
+scenario's own point dispatches the series as ``/optimize`` does.
+
+A query outside the grid, or in a cell whose estimate exceeds the
+tolerance, still gets the interpolated (or clamped) answer at once, and
+schedules a background refinement: the axis is extended past the query, or
+the cell is split at its midpoints. Only the new grid rows and columns are
+dispatched. The refined surface then replaces the old one.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .optimizer import KPI_NAMES, THERMAL_KPI_NAMES, BatchMeritOrderOptimizer
+from .sensitivity import CHUNK_CONFIGS, grid_configs
+
+logger = logging.getLogger(__name__)
+
+SURROGATE_AXES = ("owned_battery_capacity_mwh", "owned_solar_capacity_mw")
+DEFAULT_POINTS = 9
+DEFAULT_TOLERANCE = 0.01
+MAX_AXIS_POINTS = 65
+
+
+@dataclass
+class KpiSurface:
+    """KPIs on a grid: ``kpis[i, j]`` belongs to ``axes[0][i]`` x ``axes[1][j]``."""
+
+    axes: Tuple[np.ndarray, np.ndarray]
+    kpi_names: Sequence[str]
+    kpis: np.ndarray
+    cell_error: np.ndarray = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.cell_error = _cell_error(self.axes, self.kpis)
+
+    def locate(self, point: Sequence[float]) -> Tuple[List[int], List[float], bool]:
+        """Cell index and in-cell position per axis; ``False`` when ``point`` was clamped."""
+        cells, fractions, inside = [], [], True
+        for axis, value in zip(self.axes, point):
+            inside &= bool(axis[0] <= value <= axis[-1])
+            value = min(max(float(value), float(axis[0])), float(axis[-1]))
+            i = min(max(int(np.searchsorted(axis, value, side="right")) - 1, 0), len(axis) - 2)
+            cells.append(i)
+            fractions.append((value - axis[i]) / (axis[i + 1] - axis[i]))
+        return cells, fractions, inside
+
+    def interpolate(self, point: Sequence[float]) -> Tuple[np.ndarray, float, bool]:
+        """Bilinear KPIs at ``point``, the error estimate of its cell, and whether it is inside."""
+        (i, j), (u, v), inside = self.locate(point)
+        k = self.kpis
+        values = (
+            (1 - u) * (1 - v) * k[i, j]
+            + u * (1 - v) * k[i + 1, j]
+            + (1 - u) * v * k[i, j + 1]
+            + u * v * k[i + 1, j + 1]
+        )
+        return values, float(self.cell_error[i, j]), inside
+
+
+def _second_derivative(x: np.ndarray, f: np.ndarray) -> np.ndarray:
+    """|f''| along axis 0 at every node (edges copy their neighbour)."""
+    out = np.zeros_like(f)
+    if len(x) < 3:
+        return out
+    h = np.diff(x).reshape(-1, *([1] * (f.ndim - 1)))
+    slope = np.diff(f, axis=0) / h
+    out[1:-1] = np.abs(2.0 * np.diff(slope, axis=0) / (h[:-1] + h[1:]))
+    out[0], out[-1] = out[1], out[-2]
+    return out
+
+
+def _cell_error(axes: Tuple[np.ndarray, np.ndarray], kpis: np.ndarray) -> np.ndarray:
+    """Estimated interpolation error per cell: max over KPIs, relative to each KPI's range."""
+    x, y = axes
+    scale = np.ptp(kpis, axis=(0, 1))
+    scale = np.where(scale > 1e-12, scale, np.inf)
+    fxx = _second_derivative(x, kpis)
+    fyy = np.swapaxes(_second_derivative(y, np.swapaxes(kpis, 0, 1)), 0, 1)
+    hx = np.diff(x)[:, None, None]
+    hy = np.diff(y)[None, :, None]
+
+    def corners(values: np.ndarray) -> np.ndarray:
+        return np.maximum.reduce([values[:-1, :-1], values[1:, :-1], values[:-1, 1:], values[1:, 1:]])
+
+    error = (hx ** 2 / 8.0) * corners(fxx) + (hy ** 2 / 8.0) * corners(fyy)
+    return np.max(error / scale, axis=-1)
+
+
+def evaluate_grid(
+    pv_mw: np.ndarray,
+    load_mw: np.ndarray,
+    axes: Tuple[np.ndarray, np.ndarray],
+    base_overrides: Optional[Dict[str, Any]],
+    dt_hours: float,
+    solar_reference_mw: float,
+    peak_load_mw: float,
+) -> Tuple[np.ndarray, Sequence[str]]:
+    """KPIs (len(axes[0]), len(axes[1]), KPIs) from batched dispatch, grouped by PV scale."""
+    configs = grid_configs(dict(zip(SURROGATE_AXES, axes)), base_overrides, dt_hours, solar_reference_mw)
+    names = (*KPI_NAMES, *THERMAL_KPI_NAMES) if configs[0].thermal else KPI_NAMES
+    kpis = np.empty((len(configs), len(names)))
+    groups: Dict[float, List[int]] = {}
+    for index, cfg in enumerate(configs):
+        groups.setdefault(float(cfg.pv_scale), []).append(index)
+    for indices in groups.values():
+        for lo in range(0, len(indices), CHUNK_CONFIGS):
+            chunk = indices[lo:lo + CHUNK_CONFIGS]
+            batch = BatchMeritOrderOptimizer([configs[i] for i in chunk])
+            kpis[chunk] = batch.run(pv_mw, load_mw, peak_load_mw=peak_load_mw)["kpis"]
+    return kpis.reshape(len(axes[0]), len(axes[1]), len(names)), names
+
+
+def default_axes(
+    overrides: Optional[Dict[str, Any]], load_mw: np.ndarray, dt_hours: float, solar_reference_mw: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Battery 0 .. max(2 x scenario size, one mean day of load); PV 0 .. 2 x ``solar_reference_mw``.
+
+    The scenario's own battery size is added to its axis, and the PV
+    reference (the capacity the unscaled series stands for, see
+    ``backend.sensitivity.pv_reference_mw``) is the middle of the PV axis,
+    so the scenario's own point is a grid node and answers exactly.
+    """
+    overrides = overrides or {}
+    day_mwh = float(np.mean(load_mw)) * 24.0 if len(load_mw) else 1.0
+    own_battery = float(overrides.get("owned_battery_capacity_mwh") or 0.0)
+    battery = max(2.0 * own_battery, day_mwh, 1.0)
+    solar = 2.0 * float(solar_reference_mw) or 1.0
+    return np.union1d(np.linspace(0.0, battery, DEFAULT_POINTS), [own_battery]), np.linspace(0.0, solar, DEFAULT_POINTS)
+
+
+@dataclass
+class Surrogate:
+    """A KPI surface for one dataset and base scenario, refined in the background."""
+
+    key: str
+    pv_mw: np.ndarray = field(repr=False)
+    load_mw: np.ndarray = field(repr=False)
+    base_overrides: Optional[Dict[str, Any]]
+    dt_hours: float
+    solar_reference_mw: float
+    peak_load_mw: float
+    tolerance: float = DEFAULT_TOLERANCE
+    status: str = "pending"  # pending | building | ready | refining | failed
+    error: Optional[str] = None
+    surface: Optional[KpiSurface] = None
+    refinements: int = 0
+    build_s: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _pending: List[Tuple[np.ndarray, np.ndarray]] = field(default_factory=list, repr=False)
+    _worker: Optional[threading.Thread] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        surface = self.surface
+        return {
+            "key": self.key,
+            "status": self.status,
+            "error": self.error,
+            "parameters": list(SURROGATE_AXES),
+            "axes": {name: axis.tolist() for name, axis in zip(SURROGATE_AXES, surface.axes)} if surface else None,
+            "kpi_names": list(surface.kpi_names) if surface else None,
+            "tolerance": self.tolerance,
+            "max_cell_error": float(np.max(surface.cell_error)) if surface else None,
+            "refinements": self.refinements,
+            "build_s": round(self.build_s, 3),
+        }
+
+    def query(self, battery_mwh: float, solar_mw: float) -> Dict[str, Any]:
+        """Interpolated KPIs; schedules a refinement when outside the grid or tolerance."""
+        surface = self.surface
+        if surface is None:
+            raise LookupError(f"surrogate is {self.status}")
+        values, error, inside = surface.interpolate((battery_mwh, solar_mw))
+        refine = not inside or error > self.tolerance
+        if refine:
+            self._schedule(surface, (battery_mwh, solar_mw))
+        return {
+            "kpis": dict(zip(surface.kpi_names, values.tolist())),
+            "error_estimate": error,
+            "in_grid": inside,
+            "refining": refine and self.status in ("refining", "building"),
+            "status": self.status,
+        }
+
+    # ------------------------------------------------------------------
+    # Background work
+    # ------------------------------------------------------------------
+    def start(self, axes: Tuple[np.ndarray, np.ndarray]) -> None:
+        with self._lock:
+            self._pending.append(axes)
+            self._start_worker("building")
+
+    def _schedule(self, surface: KpiSurface, point: Tuple[float, float]) -> None:
+        (i, j), _, _ = surface.locate(point)
+        refined = []
+        for axis, cell, value in zip(surface.axes, (i, j), point):
+            if value > axis[-1]:
+                extra = [max(float(value) * 1.25, float(axis[-1]) + float(axis[-1] - axis[-2]))]
+            elif value < axis[0]:
+                extra = [float(value)] if value >= 0 else []
+            elif len(axis) < MAX_AXIS_POINTS:
+                extra = [0.5 * float(axis[cell] + axis[cell + 1])]
+            else:
+                extra = []
+            refined.append(np.union1d(axis, extra))
+        if all(len(new) == len(old) for new, old in zip(refined, surface.axes)):
+            return
+        with self._lock:
+            self._pending.append((refined[0], refined[1]))
+            self._start_worker("refining")
+
+    def _start_worker(self, status: str) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self.status = status
+        self._worker = threading.Thread(target=self._work, name=f"surrogate-{self.key[:8]}", daemon=True)
+        self._worker.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self.status = "ready" if self.surface is not None else self.status
+                    self._worker = None
+                    return
+                # Merge every queued refinement into one grid.
+                x = np.unique(np.concatenate([axes[0] for axes in self._pending]))
+                y = np.unique(np.concatenate([axes[1] for axes in self._pending]))
+                self._pending.clear()
+            try:
+                self._extend(x, y)
+            except Exception as exc:
+                logger.exception("Surrogate %s failed", self.key)
+                with self._lock:
+                    self.status = "failed"
+                    self.error = str(exc)
+                    self._pending.clear()
+                    self._worker = None
+                return
+
+    def _extend(self, x: np.ndarray, y: np.ndarray) -> None:
+        """Dispatch what the grid ``x`` x ``y`` adds to the current surface and swap it in."""
+        started = time.perf_counter()
+        old = self.surface
+        if old is not None:
+            x = np.union1d(old.axes[0], x)
+            y = np.union1d(old.axes[1], y)
+        args = (self.base_overrides, self.dt_hours, self.solar_reference_mw, self.peak_load_mw)
+        if old is None:
+            kpis, names = evaluate_grid(self.pv_mw, self.load_mw, (x, y), *args)
+        else:
+            names = old.kpi_names
+            kpis = np.empty((len(x), len(y), len(names)))
+            known_x = np.isin(x, old.axes[0])
+            known_y = np.isin(y, old.axes[1])
+            kpis[np.ix_(known_x, known_y)] = old.kpis
+            new_x, new_y = x[~known_x], y[~known_y]
+            if len(new_x):
+                kpis[~known_x] = evaluate_grid(self.pv_mw, self.load_mw, (new_x, y), *args)[0]
+            if len(new_y):
+                kpis[np.ix_(known_x, ~known_y)] = evaluate_grid(self.pv_mw, self.load_mw, (x[known_x], new_y), *args)[0]
+            self.refinements += 1
+        self.surface = KpiSurface((x, y), names, kpis)
+        self.build_s += time.perf_counter() - started
+
+
+class SurrogateEngine:
+    """Keeps one surrogate per key (dataset, base scenario, range, resolution)."""
+
+    def __init__(self, keep: int = 16) -> None:
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._surrogates: Dict[str, Surrogate] = {}
+
+    def get(self, key: str) -> Optional[Surrogate]:
+        with self._lock:
+            return self._surrogates.get(key)
+
+    def ensure(
+        self,
+        key: str,
+        pv_mw: np.ndarray,
+        load_mw: np.ndarray,
+        base_overrides: Optional[Dict[str, Any]],
+        dt_hours: float,
+        solar_reference_mw: float,
+        peak_load_mw: float,
+        axes: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        tolerance: Optional[float] = None,
+        initial_axes: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    ) -> Surrogate:
+        """The surrogate for ``key``, building it in the background on first use.
+
+        A new (or previously failed) surrogate starts on ``axes``, else on
+        ``initial_axes`` or ``default_axes``; ``axes`` given for an existing
+        one are merged into its grid.
+        """
+        with self._lock:
+            surrogate = self._surrogates.get(key)
+            if surrogate is None or surrogate.status == "failed":
+                start = axes or initial_axes or default_axes(base_overrides, load_mw, dt_hours, solar_reference_mw)
+                if any(len(np.unique(axis)) < 2 for axis in start):
+                    raise ValueError("each surrogate axis needs at least two distinct values")
+                surrogate = Surrogate(key, pv_mw, load_mw, base_overrides, dt_hours, solar_reference_mw, peak_load_mw)
+                self._surrogates[key] = surrogate
+                while len(self._surrogates) > self.keep:
+                    self._surrogates.pop(next(iter(self._surrogates)))
+                axes = start
+            if tolerance is not None:
+                surrogate.tolerance = float(tolerance)
+        if axes is not None:
+            surrogate.start((np.unique(axes[0]), np.unique(axes[1])))
+        return surrogate
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Compare a cold CSV parse with a warm load from the binary column cache.
+
+Usage:
+  python scripts/benchmark_data_loader.py [path/to/trainingdata.csv] [--repeat N]
+
+The cold timing always parses the CSV (``use_cache=False``); the warm timing
+loads from the sidecar cache, which is (re)built once before measuring.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    base_dir = Path(__file__).resolve().parents[1]
+    if str(base_dir) not in sys.path:
+        sys.path.insert(0, str(base_dir))
+
+    from backend.data_loader import load_energy_dataframe  # type: ignore
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=str(base_dir / "trainingdata.csv"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = Path(args.path).resolve()
+    repeat = max(1, args.repeat)
+
+    # Warm the cache (and the OS page cache for the CSV) before timing.
+    df = load_energy_dataframe(path)
+
+    cold = _best_of(lambda: load_energy_dataframe(path, use_cache=False), repeat)
+    warm = _best_of(lambda: load_energy_dataframe(path), repeat)
+
+    print(f"[bench] file: {path} ({path.stat().st_size / 1e6:.1f} MB, {len(df)} rows)")
+    print(f"[bench] cold CSV load : {cold * 1000:9.1f} ms")
+    print(f"[bench] warm cache load: {warm * 1000:9.1f} ms")
+    print(f"[bench] speedup       : {cold / max(warm, 1e-9):9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Compare the scalar merit-order loop with the batched optimizer on a sweep.
+
+Usage:
+  python scripts/benchmark_optimizer.py [path/to/trainingdata.csv] [--configs N] [--steps N] [--pv-scale X]
+
+Runs a battery-size sweep of ``--configs`` points through both engines on
+the dataset's generation (wind + solar + hydro, scaled by ``--pv-scale`` so
+surplus and deficit periods alternate) against its load, and reports the
+throughput ratio and the largest KPI difference.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+
+def main() -> int:
+    base_dir = Path(__file__).resolve().parents[1]
+    if str(base_dir) not in sys.path:
+        sys.path.insert(0, str(base_dir))
+
+    import numpy as np
+
+    from backend.data_loader import load_energy_dataframe  # type: ignore
+    from backend.optimizer import KPI_NAMES, BatchMeritOrderOptimizer, MeritOrderOptimizer  # type: ignore
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=str(base_dir / "trainingdata.csv"))
+    parser.add_argument("--configs", type=int, default=32)
+    parser.add_argument("--steps", type=int, default=100_000)
+    parser.add_argument("--pv-scale", type=float, default=1.7)
+    args = parser.parse_args()
+
+    df = load_energy_dataframe(Path(args.path).resolve(), mmap=True)
+    steps = min(max(1, args.steps), len(df))
+    pv = (df["wind"].to_numpy() + df["solar"].to_numpy() + df["hydro"].to_numpy())[:steps] * args.pv_scale
+    load = df["load"].to_numpy()[:steps]
+
+    batch = BatchMeritOrderOptimizer.from_arrays(
+        1.0 / 6.0,
+        battery_energy_mwh=np.linspace(0.0, 3000.0, max(1, args.configs)),
+        flexible_load_share=0.1,
+    )
+
+    start = time.perf_counter()
+    result = batch.run(pv, load)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scalar_kpis = []
+    for cfg in batch.configs:
+        kpis = MeritOrderOptimizer(cfg).run(pv, load)["kpis"]
+        scalar_kpis.append([kpis[name] for name in KPI_NAMES])
+    scalar = time.perf_counter() - start
+
+    reference = np.asarray(scalar_kpis)
+    error = float(np.max(np.abs(reference - result["kpis"]) / np.maximum(np.abs(reference), 1.0)))
+    print(f"[bench] {len(batch.configs)} configs x {steps} steps")
+    print(f"[bench] scalar loop : {scalar * 1000:9.1f} ms")
+    print(f"[bench] batched     : {batched * 1000:9.1f} ms")
+    print(f"[bench] speedup     : {scalar / max(batched, 1e-9):9.1f}x")
+    print(f"[bench] max KPI rel. difference: {error:.2e}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
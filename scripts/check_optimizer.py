@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Check the equality contracts between the merit-order dispatch paths.
+
+Usage:
+  python scripts/check_optimizer.py [--steps N] [--seed N]
+
+The scalar per-step loop in ``MeritOrderOptimizer._dispatch`` is the
+reference. On synthetic PV/load profiles this asserts that:
+
+- the vectorised storage-less path is bit-identical to the loop, including
+  NaN, negative and ``-0.0`` inputs;
+- ``IncrementalMeritOrder`` fed in uneven pieces and ``StreamingMeritOrder``
+  give bit-identical series to one ``run``, and KPIs equal to rounding;
+- the lean ``run`` modes (KPIs only, float32, buckets) give the same KPIs;
+- ``BatchMeritOrderOptimizer`` matches the scalar KPIs to ``1e-12`` relative.
+
+Exits non-zero (AssertionError) on the first broken contract.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+KPI_RTOL = 1e-12
+BATCH_RTOL = 1e-12
+
+
+def main() -> int:
+    base_dir = Path(__file__).resolve().parents[1]
+    if str(base_dir) not in sys.path:
+        sys.path.insert(0, str(base_dir))
+
+    import numpy as np
+
+    from backend.optimizer import (  # type: ignore
+        KPI_NAMES,
+        BatchMeritOrderOptimizer,
+        IncrementalMeritOrder,
+        MeritOrderConfig,
+        MeritOrderOptimizer,
+    )
+    from backend.streaming import StreamingMeritOrder, iter_chunks  # type: ignore
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    class LoopOnly(MeritOrderOptimizer):
+        """Always takes the per-step loop, the reference for every other path."""
+
+        @staticmethod
+        def _is_stateless(*_args) -> bool:
+            return False
+
+    rng = np.random.default_rng(args.seed)
+    n = max(2, args.steps)
+    hours = np.arange(n) / 6.0
+    pv = np.clip(np.sin((hours % 24.0 - 6.0) / 12.0 * np.pi), 0.0, None) * rng.uniform(0.0, 12.0, n)
+    load = rng.uniform(2.0, 6.0, n)
+
+    def same(a, b) -> bool:
+        """Bit-identical: equal values, NaN in the same places, same sign of zero."""
+        a, b = np.asarray(a), np.asarray(b)
+        return a.shape == b.shape and np.array_equal(a, b, equal_nan=True) and np.array_equal(np.signbit(a), np.signbit(b))
+
+    def same_series(got, ref, label: str) -> None:
+        assert set(got) == set(ref), f"{label}: series {sorted(got)} != {sorted(ref)}"
+        for name in ref:
+            assert same(got[name], ref[name]), f"{label}: series {name} differs"
+
+    def close_kpis(got, ref, label: str, rtol: float = KPI_RTOL) -> None:
+        for name, value in ref.items():
+            diff = abs(float(got[name]) - float(value))
+            assert diff <= rtol * max(abs(float(value)), 1.0), f"{label}: KPI {name} {got[name]!r} != {value!r}"
+
+    checks = 0
+
+    # 1) Storage-less configurations: vectorised path vs the loop, bit for bit.
+    odd_pv = pv.copy()
+    odd_load = load.copy()
+    odd = rng.choice(n, size=min(n, 64), replace=False)
+    odd_pv[odd[:16]] = np.nan
+    odd_load[odd[16:32]] = np.nan
+    odd_pv[odd[32:40]] = -1.5
+    odd_load[odd[40:48]] = -2.5
+    odd_pv[odd[48:56]] = -0.0
+    odd_load[odd[56:]] = -0.0
+    stateless = [
+        MeritOrderConfig(dt_hours=1 / 6),
+        MeritOrderConfig(dt_hours=1 / 6, grid_import_limit_mw=4.0, grid_export_limit_mw=2.0),
+        MeritOrderConfig(dt_hours=1 / 6, battery_energy_mwh=5.0, battery_c_rate=0.0),
+    ]
+    for cfg in stateless:
+        for p, l in ((pv, load), (odd_pv, odd_load)):
+            same_series(MeritOrderOptimizer(cfg).run(p, l)["series_mwh"], LoopOnly(cfg).run(p, l)["series_mwh"], "stateless")
+            checks += 1
+
+    # 2) Storage configurations: piecewise, streamed and lean runs vs one run.
+    storage = [
+        MeritOrderConfig(dt_hours=1 / 6, battery_energy_mwh=20.0),
+        MeritOrderConfig(dt_hours=1 / 6, battery_energy_mwh=20.0, flexible_load_share=0.2, max_shift_hours=3.0),
+        MeritOrderConfig(dt_hours=1 / 6, battery_energy_mwh=8.0, grid_import_limit_mw=4.0, grid_export_limit_mw=2.0),
+        MeritOrderConfig(dt_hours=1 / 6, battery_energy_mwh=8.0, pv_scale=1.5, hp_power_mw=1.0, tes_energy_mwh=6.0),
+    ]
+    for cfg in [*stateless, *storage]:
+        reference = MeritOrderOptimizer(cfg).run(pv, load)
+        peak = float(np.max(load))
+
+        incremental = IncrementalMeritOrder(cfg, peak)
+        cuts = np.unique(np.r_[0, np.sort(rng.integers(1, n, size=7)), n])
+        for lo, hi in zip(cuts[:-1], cuts[1:]):
+            incremental.advance(pv[lo:hi], load[lo:hi])
+        out = incremental.result()
+        same_series(out["series_mwh"], reference["series_mwh"], "incremental")
+        close_kpis(out["kpis"], reference["kpis"], "incremental")
+
+        parts = []
+        streamed = StreamingMeritOrder(cfg, peak).run(iter_chunks(pv, load, chunk_steps=4099), parts.append)
+        series = {name: np.concatenate([part.series[name] for part in parts]) for name in parts[0].series}
+        same_series(series, reference["series_mwh"], "streaming")
+        close_kpis(streamed["kpis"], reference["kpis"], "streaming")
+
+        for lean in ({"return_series": False}, {"series_dtype": np.float32}, {"points": 97}):
+            close_kpis(MeritOrderOptimizer(cfg).run(pv, load, **lean)["kpis"], reference["kpis"], f"run {lean}")
+        checks += 5
+
+    # 3) Batched engine vs scalar runs of the same configurations.
+    for group in ([*stateless, *storage[:3]], storage[3:]):
+        kpis = BatchMeritOrderOptimizer(group).run(pv, load)["kpis"]
+        for row, cfg in zip(kpis, group):
+            scalar = MeritOrderOptimizer(cfg).run(pv, load)["kpis"]
+            close_kpis(dict(zip(KPI_NAMES, row)), {name: scalar[name] for name in KPI_NAMES}, "batch", BATCH_RTOL)
+            checks += 1
+
+    print(f"[check] {checks} optimizer contracts hold on {n} steps")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())